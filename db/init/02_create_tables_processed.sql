@@ -1,16 +1,185 @@
--- Create table processed.metrics_long for normalized long-format metrics
-CREATE TABLE IF NOT EXISTS processed.metrics_long (
-    asset TEXT NOT NULL,
-    metric TEXT NOT NULL,
+-- Processed store for normalized long-format metrics.
+--
+-- Asset, metric, frequency and source endpoint names are dictionary-encoded:
+-- each lives once in a small dimension table and processed.metrics_fact
+-- stores integer ids instead of repeated text, which keeps the heap and
+-- the indexes leading with those columns narrow. processed.metrics_long is a view with the original
+-- column names for readers; writers go to processed.metrics_fact.
+
+CREATE TABLE IF NOT EXISTS processed.dim_asset (
+    id INT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+
+CREATE TABLE IF NOT EXISTS processed.dim_metric (
+    id INT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+
+CREATE TABLE IF NOT EXISTS processed.dim_freq (
+    id INT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+
+CREATE TABLE IF NOT EXISTS processed.dim_endpoint (
+    id INT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+
+-- Range-partitioned by ts, one partition per calendar year (UTC), so
+-- time-window scans prune to the years they touch and index maintenance
+-- stays per partition. Yearly partitions from 2009 (first CoinMetrics data)
+-- through two years ahead are created below, so loads normally never attach
+-- one. Rows outside every yearly partition land in the default partition;
+-- the load path creates a missing year on demand with
+-- processed.ensure_metrics_partition(year).
+CREATE TABLE IF NOT EXISTS processed.metrics_fact (
+    asset_id INT NOT NULL REFERENCES processed.dim_asset (id),
+    metric_id INT NOT NULL REFERENCES processed.dim_metric (id),
     ts TIMESTAMPTZ NOT NULL,
-    freq TEXT NOT NULL,
+    freq_id INT NOT NULL REFERENCES processed.dim_freq (id),
     value DOUBLE PRECISION,
     is_missing BOOLEAN NOT NULL DEFAULT FALSE,
-    source_endpoint TEXT,
+    endpoint_id INT REFERENCES processed.dim_endpoint (id),
     ingested_at TIMESTAMPTZ NOT NULL DEFAULT now(),
-    PRIMARY KEY (asset, metric, ts, freq)
+    PRIMARY KEY (asset_id, metric_id, ts, freq_id)
+) PARTITION BY RANGE (ts);
+
+CREATE TABLE IF NOT EXISTS processed.metrics_fact_default
+    PARTITION OF processed.metrics_fact DEFAULT;
+
+-- Indexes to support queries (created on every partition)
+CREATE INDEX IF NOT EXISTS processed_metric_ts_idx ON processed.metrics_fact (metric_id, ts);
+CREATE INDEX IF NOT EXISTS processed_asset_ts_idx ON processed.metrics_fact (asset_id, ts);
+
+-- Compatibility view: the original processed.metrics_long columns
+CREATE OR REPLACE VIEW processed.metrics_long AS
+SELECT
+  a.name AS asset,
+  m.name AS metric,
+  f.ts,
+  q.name AS freq,
+  f.value,
+  f.is_missing,
+  e.name AS source_endpoint,
+  f.ingested_at
+FROM processed.metrics_fact f
+JOIN processed.dim_asset a ON a.id = f.asset_id
+JOIN processed.dim_metric m ON m.id = f.metric_id
+JOIN processed.dim_freq q ON q.id = f.freq_id
+LEFT JOIN processed.dim_endpoint e ON e.id = f.endpoint_id;
+
+-- Create (if missing) the partition for one calendar year and return its name.
+-- Rows of that year already sitting in the default partition are moved into
+-- the new partition before it is attached. ATTACH PARTITION would otherwise
+-- scan both tables under an exclusive lock to prove the bounds; CHECK
+-- constraints matching the bound let it skip those scans. The one on the
+-- default partition is added NOT VALID and validated separately, a scan that
+-- only takes SHARE UPDATE EXCLUSIVE so reads and loads carry on meanwhile.
+-- Both constraints are dropped again once attached. Concurrent callers are
+-- serialized with an advisory lock.
+CREATE OR REPLACE FUNCTION processed.ensure_metrics_partition(p_year INT)
+RETURNS TEXT
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    part TEXT := format('metrics_fact_y%s', p_year);
+    lo TIMESTAMPTZ := make_timestamptz(p_year, 1, 1, 0, 0, 0, 'UTC');
+    hi TIMESTAMPTZ := make_timestamptz(p_year + 1, 1, 1, 0, 0, 0, 'UTC');
+BEGIN
+    IF to_regclass(format('processed.%I', part)) IS NOT NULL THEN
+        RETURN part;
+    END IF;
+    PERFORM pg_advisory_xact_lock(hashtext('processed.metrics_fact partitions'));
+    IF to_regclass(format('processed.%I', part)) IS NOT NULL THEN
+        RETURN part;
+    END IF;
+
+    EXECUTE format('CREATE TABLE processed.%I (LIKE processed.metrics_fact INCLUDING DEFAULTS INCLUDING CONSTRAINTS)', part);
+    EXECUTE format('ALTER TABLE processed.%I ADD CONSTRAINT %I CHECK (ts >= %L AND ts < %L)', part, part || '_bound', lo, hi);
+    EXECUTE format(
+        'WITH moved AS (DELETE FROM processed.metrics_fact_default WHERE ts >= $1 AND ts < $2 RETURNING *)'
+        ' INSERT INTO processed.%I SELECT * FROM moved', part
+    ) USING lo, hi;
+    EXECUTE format(
+        'ALTER TABLE processed.metrics_fact_default ADD CONSTRAINT %I CHECK (ts < %L OR ts >= %L) NOT VALID',
+        'default_not_' || part, lo, hi
+    );
+    EXECUTE format('ALTER TABLE processed.metrics_fact_default VALIDATE CONSTRAINT %I', 'default_not_' || part);
+    EXECUTE format(
+        'ALTER TABLE processed.metrics_fact ATTACH PARTITION processed.%I FOR VALUES FROM (%L) TO (%L)',
+        part, lo, hi
+    );
+    EXECUTE format('ALTER TABLE processed.metrics_fact_default DROP CONSTRAINT %I', 'default_not_' || part);
+    EXECUTE format('ALTER TABLE processed.%I DROP CONSTRAINT %I', part, part || '_bound');
+    RETURN part;
+END;
+$$;
+
+-- Pre-create the yearly partitions (no-op for years that already exist)
+SELECT processed.ensure_metrics_partition(y)
+FROM generate_series(2009, extract(year FROM now() AT TIME ZONE 'UTC')::int + 2) AS y;
+
+-- Per-series coverage summary behind analysis.metric_coverage. The load path
+-- keeps it current: every upsert into processed.metrics_fact adds its deltas
+-- (new points, change in missing points, ts range) in the same statement,
+-- so coverage reads cost O(series) instead of a GROUP BY over every row.
+-- Deletes are not tracked; processed.refresh_metrics_summary() rebuilds it.
+CREATE TABLE IF NOT EXISTS processed.metrics_summary (
+    asset_id INT NOT NULL REFERENCES processed.dim_asset (id),
+    metric_id INT NOT NULL REFERENCES processed.dim_metric (id),
+    freq_id INT NOT NULL REFERENCES processed.dim_freq (id),
+    n_points BIGINT NOT NULL,
+    n_missing BIGINT NOT NULL,
+    start_ts TIMESTAMPTZ,
+    end_ts TIMESTAMPTZ,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    PRIMARY KEY (asset_id, metric_id, freq_id)
 );
 
--- Indexes to support queries
-CREATE INDEX IF NOT EXISTS processed_metric_ts_idx ON processed.metrics_long (metric, ts);
-CREATE INDEX IF NOT EXISTS processed_asset_ts_idx ON processed.metrics_long (asset, ts);
+-- Recompute processed.metrics_summary from processed.metrics_fact and return
+-- the number of summary rows changed. Readers are never blocked: rows are
+-- upserted/deleted in place rather than truncated. Loads take the same
+-- advisory lock in shared mode, so a refresh never drops a concurrent delta.
+CREATE OR REPLACE FUNCTION processed.refresh_metrics_summary()
+RETURNS BIGINT
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    n BIGINT;
+BEGIN
+    PERFORM pg_advisory_xact_lock(hashtext('processed.metrics_summary'));
+    WITH agg AS (
+        SELECT asset_id, metric_id, freq_id,
+               count(*) AS n_points,
+               count(*) FILTER (WHERE is_missing) AS n_missing,
+               min(ts) AS start_ts,
+               max(ts) AS end_ts
+        FROM processed.metrics_fact
+        GROUP BY asset_id, metric_id, freq_id
+    ),
+    up AS (
+        INSERT INTO processed.metrics_summary AS t (asset_id, metric_id, freq_id, n_points, n_missing, start_ts, end_ts)
+        SELECT asset_id, metric_id, freq_id, n_points, n_missing, start_ts, end_ts FROM agg
+        ON CONFLICT (asset_id, metric_id, freq_id) DO UPDATE SET
+            n_points = EXCLUDED.n_points,
+            n_missing = EXCLUDED.n_missing,
+            start_ts = EXCLUDED.start_ts,
+            end_ts = EXCLUDED.end_ts,
+            updated_at = now()
+        WHERE (t.n_points, t.n_missing, t.start_ts, t.end_ts)
+            IS DISTINCT FROM (EXCLUDED.n_points, EXCLUDED.n_missing, EXCLUDED.start_ts, EXCLUDED.end_ts)
+        RETURNING 1
+    ),
+    gone AS (
+        DELETE FROM processed.metrics_summary t
+        WHERE NOT EXISTS (
+            SELECT 1 FROM agg
+            WHERE (agg.asset_id, agg.metric_id, agg.freq_id) = (t.asset_id, t.metric_id, t.freq_id)
+        )
+        RETURNING 1
+    )
+    SELECT (SELECT count(*) FROM up) + (SELECT count(*) FROM gone) INTO n;
+    RETURN n;
+END;
+$$;
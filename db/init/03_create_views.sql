@@ -1,16 +1,20 @@
 -- Create analysis views: metric_coverage and metric_missing_rate
--- metric_coverage: per asset x metric x freq coverage stats
+-- metric_coverage: per asset x metric x freq coverage stats, read from the
+-- incrementally maintained processed.metrics_summary (one row per series)
 CREATE OR REPLACE VIEW analysis.metric_coverage AS
 SELECT
-  asset,
-  metric,
-  freq,
-  MIN(ts) AS start_ts,
-  MAX(ts) AS end_ts,
-  COUNT(*) AS n_points,
-  SUM(CASE WHEN is_missing THEN 1 ELSE 0 END) AS n_missing
-FROM processed.metrics_long
-GROUP BY asset, metric, freq;
+  a.name AS asset,
+  m.name AS metric,
+  q.name AS freq,
+  s.start_ts,
+  s.end_ts,
+  s.n_points,
+  s.n_missing
+FROM processed.metrics_summary s
+JOIN processed.dim_asset a ON a.id = s.asset_id
+JOIN processed.dim_metric m ON m.id = s.metric_id
+JOIN processed.dim_freq q ON q.id = s.freq_id
+WHERE s.n_points > 0;
 
 -- metric_missing_rate: compute missing rate safely (avoid div by zero)
 CREATE OR REPLACE VIEW analysis.metric_missing_rate AS
@@ -18,3 +22,6 @@ SELECT
   mc.*,
   CASE WHEN mc.n_points = 0 THEN 0.0 ELSE (mc.n_missing::double precision / mc.n_points) END AS missing_rate
 FROM analysis.metric_coverage mc;
+
+-- Backfill the summary for rows loaded before it existed (no-op on a fresh database)
+SELECT processed.refresh_metrics_summary();
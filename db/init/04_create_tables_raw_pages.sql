@@ -0,0 +1,17 @@
+-- Create table raw.api_pages: each paginated API response stored once, compressed.
+-- Pages are content-addressed by the sha256 of their JSON bytes, so re-fetching
+-- an unchanged page does not store it again. A manifest row in raw.api_responses
+-- (payload {"storage": "pages", "page_ids": [...]}) lists the pages of one
+-- request in order.
+CREATE TABLE IF NOT EXISTS raw.api_pages (
+    id BIGSERIAL PRIMARY KEY,
+    sha256 TEXT NOT NULL UNIQUE,
+    encoding TEXT NOT NULL DEFAULT 'zlib+json',
+    n_items INT,
+    n_bytes INT,
+    body BYTEA NOT NULL,
+    fetched_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+-- Body is already compressed: store out of line without a second TOAST compression pass
+ALTER TABLE raw.api_pages ALTER COLUMN body SET STORAGE EXTERNAL;
@@ -0,0 +1,17 @@
+-- Create table raw.transform_ledger: which raw.api_responses rows have been
+-- transformed into processed.metrics_long. A worker claims an id by inserting
+-- its ledger row (status 'processing'); the primary key makes the claim
+-- atomic, so several workers never transform the same id. Claims are
+-- serialized and hand out one series (asset) at a time, so overlapping raw
+-- ids of a series are applied in id order (see src/etl/ledger.py).
+CREATE TABLE IF NOT EXISTS raw.transform_ledger (
+    raw_id BIGINT PRIMARY KEY REFERENCES raw.api_responses (id) ON DELETE CASCADE,
+    status TEXT NOT NULL DEFAULT 'processing' CHECK (status IN ('processing', 'done', 'failed')),
+    worker TEXT,
+    claimed_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    finished_at TIMESTAMPTZ,
+    n_rows INT,
+    error TEXT
+);
+
+CREATE INDEX IF NOT EXISTS transform_ledger_status_idx ON raw.transform_ledger (status);
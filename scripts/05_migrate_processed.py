@@ -0,0 +1,40 @@
+"""Upgrade an existing database to the current processed-store layout.
+
+`db/init/` only runs on a fresh Postgres volume. Run this once against a
+database created before processed.metrics_long became a view over the
+dictionary-encoded, partitioned processed.metrics_fact (or before the
+dimension ids were widened to INT); see `src.db.migrate`.
+
+Usage:
+    python scripts/05_migrate_processed.py [--keep-legacy]
+"""
+import argparse
+import pathlib
+import sys
+
+try:
+    import src  # type: ignore
+except ModuleNotFoundError:
+    root = pathlib.Path(__file__).resolve().parent.parent
+    if str(root) not in sys.path:
+        sys.path.insert(0, str(root))
+
+from src.db.engine import get_conn
+from src.db.migrate import LEGACY_TABLE, migrate_processed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Migrate the processed store to the current layout")
+    parser.add_argument("--keep-legacy", action="store_true", help=f"Keep the old table as processed.{LEGACY_TABLE}")
+    args = parser.parse_args(argv)
+    conn = get_conn()
+    try:
+        stats = migrate_processed(conn, keep_legacy=args.keep_legacy)
+    finally:
+        conn.close()
+    print(stats)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -17,50 +17,143 @@ except ModuleNotFoundError:
         sys.path.insert(0, str(root))
 
 from src.utils.logging import logger
-from src.etl.extract import run_extract
+from src.db.engine import pool_stats
+from src.etl.extract import run_extract, run_extract_all, run_extract_all_async
 
 
 def main(argv=None):
     parser = argparse.ArgumentParser(description="Run ETL stages")
     parser.add_argument("--stage", default="extract", choices=["extract", "transform", "load", "all"], help="Which stage to run")
+    parser.add_argument("--all-assets", action="store_true", help="Extract every asset in CM_ASSETS concurrently (one raw row per asset)")
+    parser.add_argument("--async", dest="use_async", action="store_true", help="With --all-assets: use the asyncio client (pooled connections, prefetched pages)")
+    parser.add_argument("--stream", action="store_true", help="Load each page into processed.metrics_long as it arrives (skips the separate transform/load)")
+    parser.add_argument("--incremental", action="store_true", help="Only request data after each series' high-water mark in processed.metrics_long")
+    parser.add_argument("--load-mode", default=None, choices=["row", "copy", "batch", "parallel"], help="How rows are upserted (default ETL_LOAD_MODE)")
+    parser.add_argument("--load-workers", type=int, default=None, help="Connections for --load-mode parallel (default ETL_LOAD_WORKERS)")
+    parser.add_argument("--rewrite-unchanged", action="store_true", help="Rewrite rows even when value/is_missing did not change (overrides ETL_LOAD_SKIP_UNCHANGED)")
+    parser.add_argument("--batch-size", type=int, default=None, help="Rows per committed batch with --load-mode batch (default ETL_BATCH_SIZE)")
+    parser.add_argument("--transform-engine", default=None, choices=["python", "columnar", "sql"], help="Row dicts streamed in batches of ETL_TRANSFORM_BATCH_ROWS, typed column arrays of the whole response loaded via COPY, or in-database unpivot (default ETL_TRANSFORM_ENGINE)")
+    parser.add_argument("--pending", action="store_true", help="Transform+load every raw response not yet in raw.transform_ledger, in parallel processes")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes for --pending (default ETL_TRANSFORM_WORKERS or one per CPU)")
+    parser.add_argument("--retry-failed", action="store_true", help="With --pending: also retry raw ids whose transform failed before")
+    parser.add_argument("--release-stale", default=None, metavar="INTERVAL", help="With --pending: release claims of dead workers older than a Postgres interval, e.g. '1 hour' (default ETL_TRANSFORM_STALE_AFTER)")
+    parser.add_argument("--batch-rows", type=int, default=None, help="Transform every raw response (not just the newest), loading batches of N rows (server-side cursor over raw responses)")
+    parser.add_argument("--raw-limit", type=int, default=None, help="With --batch-rows: only the N newest raw responses (default: all)")
+    parser.add_argument("--concurrency", type=int, default=None, help="Max assets extracted at once with --all-assets (default CM_EXTRACT_CONCURRENCY)")
     args = parser.parse_args(argv)
+    if args.pending and args.stage == "transform":
+        # Ledger workers always write processed rows; there is no transform-only variant
+        parser.error("--pending transforms and loads; use --stage load or --stage all")
 
     logger.info("Starting ETL stage=%s", args.stage)
 
     if args.stage in ("extract", "all"):
-        inserted = run_extract()
+        if args.all_assets and args.use_async:
+            inserted = run_extract_all_async(max_workers=args.concurrency, stream=args.stream, incremental=args.incremental)
+        elif args.all_assets:
+            inserted = run_extract_all(max_workers=args.concurrency, stream=args.stream, incremental=args.incremental)
+        else:
+            inserted = run_extract(stream=args.stream, incremental=args.incremental)
         print(inserted)
         logger.info("ETL extract completed, inserted id=%s", inserted)
         if args.stage == "extract":
             return 0
+        from src.config import COINMETRICS_API_KEY
+
+        if args.stream and COINMETRICS_API_KEY:
+            # Pages were already upserted during extract (stub payloads still go through transform/load)
+            logger.info("Stream mode: transform/load already done during extract")
+            return 0
 
     # Transform stage: parse raw -> rows
-    if args.stage in ("transform", "load", "all"):
-        from src.etl.transform import transform_latest_raw
+    if args.stage in ("transform", "load", "all") and args.pending:
+        from src.etl.transform import transform_pending
+
+        stats = transform_pending(
+            max_workers=args.workers,
+            engine=args.transform_engine,
+            load_mode=args.load_mode,
+            retry_failed=args.retry_failed,
+            stale_after=args.release_stale,
+        )
+        logger.info("Pending transform summary: %s", stats)
+        print(stats["rows"])
+        return 0
 
-        rows = transform_latest_raw(limit=50)
-        logger.info("Transformed rows count=%s", len(rows))
-        if args.stage == "transform":
-            # Print sample
-            if rows:
-                print("sample:", rows[0])
-            print(len(rows))
+    if args.stage in ("transform", "load", "all"):
+        from src.config import get_transform_config
+
+        engine = args.transform_engine or get_transform_config()["engine"]
+        if engine == "sql" and args.stage == "transform":
+            # The SQL engine writes processed rows directly; preview with the Python parser instead
+            logger.info("SQL engine transforms and loads in one statement; previewing with the python engine")
+            engine = "python"
+        if engine == "sql":
+            # Transform and load are one statement inside Postgres
+            from src.etl.transform import transform_latest_sql
+
+            affected = transform_latest_sql()
+            logger.info("SQL transform+load affected=%s", affected)
+            print(affected)
+            return 0
+        if engine == "columnar" and not args.batch_rows:
+            # Whole newest response as typed arrays (not streamed)
+            from src.etl.transform import transform_latest_columns
+
+            cols = transform_latest_columns(limit=50)
+            n = len(cols) if cols is not None else 0
+            logger.info("Transformed rows count=%s (columnar)", n)
+            if args.stage == "transform":
+                if n:
+                    print("sample:", next(cols.iter_rows()))
+                print(n)
+                return 0
+            from src.etl.load import load_columns
+
+            stats = load_columns(cols, skip_unchanged=False if args.rewrite_unchanged else None)
+            logger.info("Load summary: %s", stats)
+            print(stats["inserted"] + stats["updated"])
             return 0
 
-    # Load stage: upsert transformed rows
-    if args.stage in ("load", "all"):
-        from src.etl.load import upsert_metrics
-
-        # If we came from extract in 'all', rows variable may not be defined yet
+        # Constant memory: each batch is loaded before the next is transformed
+        from src.db.engine import get_conn
+        from src.etl.load import add_stats, load_metrics
+        from src.etl.transform import transform_iter, transform_latest_iter
+
+        if args.batch_rows:
+            batches = transform_iter(batch_size=args.batch_rows, limit=args.raw_limit)
+        else:
+            # Newest raw response only, in batches of ETL_TRANSFORM_BATCH_ROWS
+            batches = transform_latest_iter()
+        total = {}
+        n = 0
+        sample = None
+        conn = get_conn() if args.stage != "transform" else None
         try:
-            rows
-        except NameError:
-            from src.etl.transform import transform_latest_raw
-
-            rows = transform_latest_raw(limit=50)
-
-        affected = upsert_metrics(rows)
-        print(affected)
+            for batch in batches:
+                if sample is None:
+                    sample = batch[0]
+                n += len(batch)
+                if conn is not None:
+                    add_stats(total, load_metrics(
+                        batch,
+                        conn=conn,
+                        mode=args.load_mode,
+                        batch_size=args.batch_size,
+                        skip_unchanged=False if args.rewrite_unchanged else None,
+                        workers=args.load_workers,
+                    ))
+        finally:
+            if conn is not None:
+                conn.close()
+        logger.info("Transformed rows count=%s", n)
+        if args.stage == "transform":
+            if sample is not None:
+                print("sample:", sample)
+            print(n)
+            return 0
+        logger.info("Load summary: %s", total)
+        print(total.get("inserted", 0) + total.get("updated", 0))
         return 0
 
     logger.warning("Stage %s not implemented in this minimal runner", args.stage)
@@ -69,4 +162,7 @@ def main(argv=None):
 
 if __name__ == "__main__":
     code = main()
+    stats = pool_stats()
+    if stats:
+        logger.info("DB pool: %s", stats)
     sys.exit(code)
@@ -1,14 +1,25 @@
 """Run profiling and export CSVs + figures."""
+import argparse
 import sys
 from src.analysis.profiling import run_profiling
 
 
 def main(argv=None):
-    summary = run_profiling()
+    parser = argparse.ArgumentParser(description="Run profiling")
+    parser.add_argument(
+        "--refresh-summary",
+        action="store_true",
+        help="Rebuild processed.metrics_summary from the fact table before reading coverage",
+    )
+    parser.add_argument("--hist-bins", type=int, default=50, help="Bins per value histogram (computed in Postgres)")
+    args = parser.parse_args(argv)
+    summary = run_profiling(refresh=args.refresh_summary, hist_bins=args.hist_bins)
     print("Profiling summary:")
     print(f" coverage CSV: {summary.get('coverage_csv')} (rows={summary.get('rows_coverage')})")
     print(f" missing rate CSV: {summary.get('missing_rate_csv')} (rows={summary.get('rows_missing_rate')})")
     print(f" value histogram: {summary.get('value_hist')} (n_values={summary.get('n_values')})")
+    print(f" log value histogram: {summary.get('value_hist_log')}")
+    print(f" per-series histograms: {summary.get('value_hist_series_csv')}, {summary.get('value_hist_series_log_csv')}")
     # Generate final markdown report (Task 2 + Task 4 minimal evidence)
     try:
         from src.analysis.reporting import generate_final_report
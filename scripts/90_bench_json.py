@@ -0,0 +1,106 @@
+"""Micro-benchmark: bytes on the wire and JSON decode/encode time for asset-metrics pages.
+
+Builds a synthetic page shaped like `/timeseries/asset-metrics` (one item
+per time with string-valued metric columns) and reports:
+- raw / gzip / deflate sizes
+- decode time with stdlib json vs orjson (if installed)
+- JSONB encode time with stdlib json vs orjson
+
+With `--live` it also fetches one real page with and without
+`Accept-Encoding: gzip, deflate` and reports the transferred bytes.
+
+Usage:
+    python scripts/90_bench_json.py --rows 10000 --metrics 10
+"""
+import argparse
+import json
+import pathlib
+import sys
+import time
+import zlib
+import gzip
+
+try:
+    import src  # type: ignore
+except ModuleNotFoundError:
+    root = pathlib.Path(__file__).resolve().parent.parent
+    if str(root) not in sys.path:
+        sys.path.insert(0, str(root))
+
+from src.utils import jsonlib
+from bench_common import make_page
+
+
+def _best(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t)
+    return best
+
+
+def run_offline(rows: int, metrics: int, repeat: int) -> None:
+    page = make_page(rows, metrics)
+    raw = json.dumps(page).encode("utf-8")
+    gz = gzip.compress(raw, compresslevel=6)
+    df = zlib.compress(raw, 6)
+
+    print(f"page: rows={rows} metrics={metrics}")
+    print(f"  bytes raw     : {len(raw):>12,}")
+    print(f"  bytes gzip    : {len(gz):>12,}  ({len(gz) / len(raw):.1%})")
+    print(f"  bytes deflate : {len(df):>12,}  ({len(df) / len(raw):.1%})")
+
+    t_std = _best(lambda: json.loads(raw), repeat)
+    t_std_enc = _best(lambda: json.dumps(page), repeat)
+    print(f"  decode json   : {t_std * 1000:8.1f} ms")
+    print(f"  encode json   : {t_std_enc * 1000:8.1f} ms")
+    if jsonlib.BACKEND == "orjson":
+        t_fast = _best(lambda: jsonlib.loads(raw), repeat)
+        t_fast_enc = _best(lambda: jsonlib.dumps(page), repeat)
+        print(f"  decode orjson : {t_fast * 1000:8.1f} ms  ({t_std / t_fast:.1f}x)")
+        print(f"  encode orjson : {t_fast_enc * 1000:8.1f} ms  ({t_std_enc / t_fast_enc:.1f}x)")
+    else:
+        print("  orjson not installed: only stdlib timings shown")
+    t_gunzip = _best(lambda: gzip.decompress(gz), repeat)
+    print(f"  gunzip        : {t_gunzip * 1000:8.1f} ms")
+
+
+def run_live() -> None:
+    import requests
+
+    from src.config import COINMETRICS_API_KEY, get_cm_config
+
+    cm = get_cm_config()
+    params = {
+        "assets": cm["assets"].split(",")[0],
+        "metrics": cm["metrics"],
+        "frequency": cm["frequency"],
+        "start_time": cm["start_date"],
+        "end_time": cm["end_date"],
+        "page_size": 10000,
+    }
+    url = "https://community-api.coinmetrics.io/v4/timeseries/asset-metrics"
+    auth = {"Authorization": f"Bearer {COINMETRICS_API_KEY}"} if COINMETRICS_API_KEY else {}
+    for enc in ("identity", "gzip, deflate"):
+        resp = requests.get(url, params=params, headers=dict(auth, **{"Accept-Encoding": enc}), stream=True, timeout=60)
+        wire = len(resp.raw.read(decode_content=False))
+        print(f"live Accept-Encoding={enc!r}: status={resp.status_code} bytes_on_wire={wire:,} content-encoding={resp.headers.get('Content-Encoding')}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="JSON / compression micro-benchmark")
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--metrics", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--live", action="store_true", help="Also measure a real API page with/without compression")
+    args = parser.parse_args(argv)
+
+    run_offline(args.rows, args.metrics, args.repeat)
+    if args.live:
+        run_live()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
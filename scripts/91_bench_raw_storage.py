@@ -0,0 +1,98 @@
+"""Benchmark raw storage layouts: JSONB audit rows + merged row vs compressed pages + manifest.
+
+Runs against the configured Postgres using TEMP copies of `raw.api_responses`
+(with its GIN index) and `raw.api_pages`, so nothing persistent is written.
+For N synthetic pages it measures insert time and total relation size
+(heap + TOAST + indexes) of:
+
+- jsonb : one `(page)` JSONB row per page plus the merged JSONB row
+- pages : one compressed row per distinct page plus a small manifest row
+
+Usage:
+    python scripts/91_bench_raw_storage.py --pages 20 --rows 1000 --metrics 10
+"""
+import argparse
+import pathlib
+import sys
+import time
+
+try:
+    import src  # type: ignore
+except ModuleNotFoundError:
+    root = pathlib.Path(__file__).resolve().parent.parent
+    if str(root) not in sys.path:
+        sys.path.insert(0, str(root))
+
+import psycopg2
+
+from bench_common import make_page
+from src.db.engine import get_conn
+from src.etl.raw_store import encode_page, manifest_payload
+from src.utils import jsonlib
+
+
+def _size(cur, table: str) -> int:
+    cur.execute("SELECT pg_total_relation_size(%s::regclass)", (table,))
+    return int(cur.fetchone()[0])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Raw storage benchmark")
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--metrics", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    pages = [make_page(args.rows, args.metrics, seed=i, offset_days=i * args.rows) for i in range(args.pages)]
+
+    conn = get_conn()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("CREATE TEMP TABLE bench_responses (LIKE raw.api_responses INCLUDING ALL)")
+            cur.execute("CREATE TEMP TABLE bench_pages (LIKE raw.api_pages INCLUDING ALL)")
+            cur.execute("ALTER TABLE bench_pages ALTER COLUMN body SET STORAGE EXTERNAL")
+        conn.commit()
+
+        sql = "INSERT INTO bench_responses (endpoint, params, status_code, payload) VALUES (%s, %s, %s, %s)"
+        t = time.perf_counter()
+        with conn.cursor() as cur:
+            merged = []
+            for i, p in enumerate(pages):
+                cur.execute(sql, ("timeseries/asset-metrics(page)", jsonlib.pg_json({"page": i + 1}), 200, jsonlib.pg_json(p)))
+                merged.extend(p["data"])
+            cur.execute(sql, ("timeseries/asset-metrics", jsonlib.pg_json({}), 200, jsonlib.pg_json({"data": merged})))
+        conn.commit()
+        t_jsonb = time.perf_counter() - t
+
+        t = time.perf_counter()
+        with conn.cursor() as cur:
+            ids = []
+            for p in pages:
+                digest, n_bytes, body = encode_page(p)
+                cur.execute(
+                    "INSERT INTO bench_pages (sha256, encoding, n_items, n_bytes, body) VALUES (%s, 'zlib+json', %s, %s, %s)"
+                    " ON CONFLICT (sha256) DO NOTHING RETURNING id",
+                    (digest, len(p["data"]), n_bytes, psycopg2.Binary(body)),
+                )
+                ids.append(cur.fetchone()[0])
+            cur.execute(sql, ("timeseries/asset-metrics", jsonlib.pg_json({}), 200, jsonlib.pg_json(manifest_payload(ids, sum(len(p["data"]) for p in pages)))))
+        conn.commit()
+        t_pages = time.perf_counter() - t
+
+        with conn.cursor() as cur:
+            size_jsonb = _size(cur, "bench_responses")
+            cur.execute("TRUNCATE bench_responses")
+            cur.execute(sql, ("timeseries/asset-metrics", jsonlib.pg_json({}), 200, jsonlib.pg_json(manifest_payload(ids, 0))))
+            size_pages = _size(cur, "bench_pages") + _size(cur, "bench_responses")
+        conn.commit()
+    finally:
+        conn.close()
+
+    print(f"pages={args.pages} rows/page={args.rows} metrics={args.metrics}")
+    print(f"  jsonb : insert {t_jsonb:7.2f}s  size {size_jsonb:>12,} bytes")
+    print(f"  pages : insert {t_pages:7.2f}s  size {size_pages:>12,} bytes  ({size_pages / max(size_jsonb, 1):.1%} of jsonb)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
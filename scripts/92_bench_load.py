@@ -0,0 +1,93 @@
+"""Benchmark load modes for processed.metrics_long (rows/s).
+
+Generates synthetic rows for a dedicated asset (`--asset`, default
+`__bench__`), loads them with each requested mode three times (inserts,
+an identical re-run, and a pass with every value changed) and deletes the
+benchmark rows afterwards. `--skip-unchanged` makes the re-run leave
+identical rows untouched (see ETL_LOAD_SKIP_UNCHANGED).
+
+Usage:
+    python scripts/92_bench_load.py --rows 200000 --modes row,copy,batch,parallel
+"""
+import argparse
+import pathlib
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+try:
+    import src  # type: ignore
+except ModuleNotFoundError:
+    root = pathlib.Path(__file__).resolve().parent.parent
+    if str(root) not in sys.path:
+        sys.path.insert(0, str(root))
+
+from src.db.engine import get_conn
+from src.etl.load import load_metrics
+
+
+def make_rows(n: int, asset: str, n_metrics: int = 10):
+    t0 = datetime(2013, 1, 1, tzinfo=timezone.utc)
+    rows = []
+    for i in range(n):
+        metric = f"BenchMetric{i % n_metrics}"
+        ts = t0 + timedelta(hours=i // n_metrics)
+        value = None if i % 50 == 0 else float(i) * 1.5
+        rows.append({
+            "asset": asset,
+            "metric": metric,
+            "ts": ts,
+            "freq": "1h",
+            "value": value,
+            "is_missing": value is None,
+            "source_endpoint": "bench",
+        })
+    return rows
+
+
+def _cleanup(asset: str) -> None:
+    conn = get_conn()
+    try:
+        with conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    "DELETE FROM processed.metrics_fact WHERE asset_id = (SELECT id FROM processed.dim_asset WHERE name = %s)",
+                    (asset,),
+                )
+                # Deletes are not tracked by the incremental summary
+                cur.execute(
+                    "DELETE FROM processed.metrics_summary WHERE asset_id = (SELECT id FROM processed.dim_asset WHERE name = %s)",
+                    (asset,),
+                )
+    finally:
+        conn.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-mode benchmark")
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--modes", default="row,copy,batch,parallel")
+    parser.add_argument("--asset", default="__bench__")
+    parser.add_argument("--skip-unchanged", action="store_true")
+    args = parser.parse_args(argv)
+
+    rows = make_rows(args.rows, args.asset)
+    changed = [dict(r, value=None if r["value"] is None else r["value"] + 1.0) for r in rows]
+    skip = True if args.skip_unchanged else None
+    modes = [m.strip() for m in args.modes.split(",") if m.strip()]
+    print(f"rows={len(rows)}")
+    try:
+        for mode in modes:
+            _cleanup(args.asset)
+            for label, batch in (("insert", rows), ("rerun", rows), ("update", changed)):
+                t = time.perf_counter()
+                result = load_metrics(batch, mode=mode, skip_unchanged=skip)
+                dt = time.perf_counter() - t
+                print(f"  {mode:>6} {label}: {dt:8.2f}s  {len(rows) / dt:12,.0f} rows/s  result={result}")
+    finally:
+        _cleanup(args.asset)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
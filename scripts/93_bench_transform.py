@@ -0,0 +1,58 @@
+"""Micro-benchmark: row-dict transform vs columnar transform of asset-metrics payloads.
+
+Builds a synthetic multi-year payload and times `rows_from_payload`
+(one dict per cell) against `columns_from_payload` (typed arrays), with
+the peak Python memory of each (tracemalloc).
+
+Usage:
+    python scripts/93_bench_transform.py --rows 4400 --metrics 10
+"""
+import argparse
+import pathlib
+import sys
+import time
+import tracemalloc
+
+try:
+    import src  # type: ignore
+except ModuleNotFoundError:
+    root = pathlib.Path(__file__).resolve().parent.parent
+    if str(root) not in sys.path:
+        sys.path.insert(0, str(root))
+
+from src.etl.columnar import columns_from_payload
+from src.etl.transform import rows_from_payload
+from bench_common import make_page
+
+
+def _measure(fn):
+    tracemalloc.start()
+    t = time.perf_counter()
+    out = fn()
+    dt = time.perf_counter() - t
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return out, dt, peak
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Row vs columnar transform benchmark")
+    parser.add_argument("--rows", type=int, default=4400, help="Items (days) in the payload; 4400 ~ 12 years daily")
+    parser.add_argument("--metrics", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    page = make_page(args.rows, args.metrics)
+    params = {"assets": "btc", "frequency": "1d"}
+
+    rows, t_rows, m_rows = _measure(lambda: rows_from_payload(page, params, "timeseries/asset-metrics"))
+    cols, t_cols, m_cols = _measure(lambda: columns_from_payload(page, params, "timeseries/asset-metrics"))
+
+    print(f"payload: items={args.rows} metrics={args.metrics} cells={len(rows):,}")
+    print(f"  rows    : {t_rows * 1000:8.1f} ms  peak {m_rows / 1e6:8.1f} MB")
+    print(f"  columnar: {t_cols * 1000:8.1f} ms  peak {m_cols / 1e6:8.1f} MB  ({t_rows / t_cols:.1f}x faster)")
+    assert len(cols) == len(rows)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,21 @@
+"""Shared helpers for the benchmark scripts (synthetic CoinMetrics-shaped data)."""
+import random
+from datetime import datetime, timedelta, timezone
+
+
+def make_page(n_rows: int, n_metrics: int, seed: int = 0, offset_days: int = 0) -> dict:
+    """One `/timeseries/asset-metrics` page: `n_rows` daily items with `n_metrics` string-valued columns."""
+    rng = random.Random(seed)
+    metrics = ["PriceUSD", "TxCnt", "AdrActCnt", "CapMrktCurUSD", "HashRate", "FeeTotUSD", "SplyCur", "TxTfrValAdjUSD", "BlkCnt", "NVTAdj"]
+    while len(metrics) < n_metrics:
+        metrics.append(f"Metric{len(metrics)}")
+    metrics = metrics[:n_metrics]
+    t0 = datetime(2013, 1, 1, tzinfo=timezone.utc)
+    data = []
+    for i in range(n_rows):
+        item = {"asset": "btc", "time": (t0 + timedelta(days=offset_days + i)).strftime("%Y-%m-%dT%H:%M:%S.000000000Z")}
+        for m in metrics:
+            # CoinMetrics returns numbers as strings; some cells are missing
+            item[m] = None if rng.random() < 0.02 else f"{rng.uniform(0, 1e9):.10f}"
+        data.append(item)
+    return {"data": data, "next_page_token": "0.MjAxNS0wMS0wMVQwMDowMDowMFo", "next_page_url": "https://community-api.coinmetrics.io/v4/timeseries/asset-metrics?next_page_token=x"}
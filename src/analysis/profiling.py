@@ -1,8 +1,11 @@
 """Minimal profiling: export coverage/missing_rate tables and a histogram.
 
 This module reads the `analysis.metric_coverage` and
-`analysis.metric_missing_rate` views and writes CSVs plus a histogram
-of non-null `value` observations from `processed.metrics_long`.
+`analysis.metric_missing_rate` views and writes CSVs plus histograms
+of non-null `value` observations (binned in Postgres, globally and per
+series, on linear and log10 scales). Both
+views read the per-series summary maintained by the load path (see
+`src.db.summary`).
 """
 from __future__ import annotations
 
@@ -13,7 +16,8 @@ from typing import Dict, Any
 import pandas as pd
 import matplotlib.pyplot as plt
 
-from src.db.engine import get_conn
+from src.db.engine import connection
+from src.db.summary import ensure_summary, refresh_summary
 from src.utils.logging import logger
 
 
@@ -21,7 +25,7 @@ def _ensure_dir(p: Path) -> None:
     p.mkdir(parents=True, exist_ok=True)
 
 
-def run_profiling(output_dir: str = "reports/profiling") -> Dict[str, Any]:
+def run_profiling(output_dir: str = "reports/profiling", refresh: bool = False, hist_bins: int = 50) -> Dict[str, Any]:
     out = {}
     out_dir = Path(output_dir)
     tables_dir = out_dir / "tables"
@@ -30,8 +34,14 @@ def run_profiling(output_dir: str = "reports/profiling") -> Dict[str, Any]:
     _ensure_dir(tables_dir)
     _ensure_dir(figures_dir)
 
-    conn = get_conn()
-    try:
+    with connection() as conn:
+        # Coverage comes from processed.metrics_summary; rebuild it on request
+        # (e.g. after deleting facts) or when it was never populated
+        if refresh:
+            refresh_summary(conn)
+        else:
+            ensure_summary(conn)
+
         # Read coverage view with proper column names
         with conn.cursor() as cur:
             cur.execute("SELECT * FROM analysis.metric_coverage ORDER BY asset, metric, freq")
@@ -95,41 +105,20 @@ def run_profiling(output_dir: str = "reports/profiling") -> Dict[str, Any]:
             except Exception:
                 logger.warning("Could not remove temporary file %s", tmp_file)
 
-        # Read values and plot histogram
-        with conn.cursor() as cur:
-            cur.execute("SELECT value FROM processed.metrics_long WHERE value IS NOT NULL")
-            value_rows = cur.fetchall()
-
-        # value_rows is list of tuples like [(val,), (val,), ...]
-        values = [r[0] for r in value_rows if r and r[0] is not None]
-        n_values = len(values)
-        fig_path = figures_dir / "value_hist.png"
-
-        if n_values > 0:
-            plt.figure()
-            plt.hist(values)
-            plt.xlabel("value")
-            plt.ylabel("count")
-            plt.title("Histogram of metric values")
-            plt.tight_layout()
-            plt.savefig(fig_path)
-            plt.close()
-        else:
-            # create an empty placeholder image
-            plt.figure()
-            plt.text(0.5, 0.5, "no values", ha="center", va="center")
-            plt.axis("off")
-            plt.savefig(fig_path)
-            plt.close()
-
-        out["value_hist"] = str(fig_path)
-        out["n_values"] = n_values
-
-    finally:
-        try:
-            conn.close()
-        except Exception:
-            pass
+        # Histograms: Postgres bins the values (width_bucket), only bin counts come back
+        for scale in ("linear", "log"):
+            suffix = "" if scale == "linear" else "_log"
+            df_hist = compute_value_histogram(conn, bins=hist_bins, scale=scale)
+            fig_path = figures_dir / f"value_hist{suffix}.png"
+            _plot_histogram(df_hist, fig_path, scale)
+            out[f"value_hist{suffix}"] = str(fig_path)
+            if scale == "linear":
+                out["n_values"] = int(df_hist["count"].sum())
+
+            df_series_hist = compute_value_histogram(conn, bins=hist_bins, scale=scale, per_series=True)
+            hist_path = tables_dir / f"value_hist_series{suffix}.csv"
+            df_series_hist.to_csv(hist_path, index=False, header=True)
+            out[f"value_hist_series{suffix}_csv"] = str(hist_path)
 
     logger.info("Profiling outputs: %s", out)
     return out
@@ -207,127 +196,184 @@ def compute_coverage_structure(conn) -> pd.DataFrame:
     return df[out_cols]
 
 
+# One row per series, aggregated server-side on the dictionary-encoded fact
+# table (names are joined on the aggregated rows only). NaN is excluded like
+# pandas' skipna; std is the sample standard deviation (pandas' default).
+METRIC_SCALE_SQL = (
+    "WITH agg AS ("
+    " SELECT asset_id, metric_id, freq_id,"
+    " count(*) AS n_values, min(value) AS min_value, max(value) AS max_value,"
+    " avg(value) AS mean_value, stddev_samp(value) AS std_value"
+    " FROM processed.metrics_fact"
+    " WHERE value IS NOT NULL AND value <> 'NaN'::float8"
+    " GROUP BY asset_id, metric_id, freq_id)"
+    " SELECT a.name AS asset, m.name AS metric, q.name AS freq,"
+    " agg.n_values, agg.min_value, agg.max_value, agg.mean_value, agg.std_value,"
+    # floor(log10(max |value|)); NULL for all-zero or infinite series
+    " CASE WHEN x.max_abs > 0 AND x.max_abs < 'Infinity'::float8 THEN floor(log(x.max_abs))::int END AS magnitude_order,"
+    " agg.std_value / NULLIF(agg.mean_value, 0) AS coefficient_of_variation"
+    " FROM agg"
+    " CROSS JOIN LATERAL (SELECT greatest(abs(agg.min_value), abs(agg.max_value)) AS max_abs) x"
+    " JOIN processed.dim_asset a ON a.id = agg.asset_id"
+    " JOIN processed.dim_metric m ON m.id = agg.metric_id"
+    " JOIN processed.dim_freq q ON q.id = agg.freq_id"
+    " ORDER BY asset, metric, freq"
+)
+
+
 def compute_metric_scale(conn) -> pd.DataFrame:
-    """Compute scale statistics per (asset, metric, freq) from processed.metrics_long.
+    """Compute scale statistics per (asset, metric, freq) inside Postgres.
+
+    Only one row per series is transferred, so memory does not grow with the
+    number of data points.
 
     Returns DataFrame with columns:
       asset, metric, freq, n_values, min_value, max_value, mean_value, std_value,
       magnitude_order, coefficient_of_variation
     """
+    out_cols = ["asset", "metric", "freq", "n_values", "min_value", "max_value", "mean_value", "std_value", "magnitude_order", "coefficient_of_variation"]
     with conn.cursor() as cur:
-        cur.execute(
-            "SELECT asset, metric, freq, value FROM processed.metrics_long WHERE value IS NOT NULL"
-        )
+        cur.execute(METRIC_SCALE_SQL)
         rows = cur.fetchall()
-        cols = [d[0] for d in cur.description] if cur.description else None
 
-    df = pd.DataFrame(rows, columns=cols if cols is not None else ["asset", "metric", "freq", "value"])
+    df = pd.DataFrame(rows, columns=out_cols)
+    df["magnitude_order"] = df["magnitude_order"].astype("Int64")
+    return df
+
+
+# Consecutive-ts gaps per series via lag(), summarised server-side. The
+# expected spacing comes from the freq name ("1d" -> 86400 s, "1h", "5m",
+# "10s", ...); frequencies without a fixed spacing (e.g. "1b", per block)
+# get NULL for n_non_1d / gap_ratio.
+TIME_REGULARITY_SQL = (
+    "WITH gaps AS ("
+    " SELECT asset_id, metric_id, freq_id,"
+    " extract(epoch FROM ts - lag(ts) OVER (PARTITION BY asset_id, metric_id, freq_id ORDER BY ts)) AS gap_s"
+    " FROM processed.metrics_fact),"
+    " freqs AS ("
+    " SELECT id, substring(name FROM '^([0-9]+)[smhd]')::bigint"
+    " * CASE substring(name FROM '^[0-9]+([smhd])') WHEN 's' THEN 1 WHEN 'm' THEN 60 WHEN 'h' THEN 3600 WHEN 'd' THEN 86400 END"
+    " AS expected_s"
+    " FROM processed.dim_freq),"
+    " agg AS ("
+    " SELECT g.asset_id, g.metric_id, g.freq_id, f.expected_s,"
+    " count(g.gap_s) AS n_intervals,"
+    " count(*) FILTER (WHERE g.gap_s <> f.expected_s) AS n_irregular,"
+    " max(g.gap_s) AS max_gap_s"
+    " FROM gaps g JOIN freqs f ON f.id = g.freq_id"
+    " GROUP BY g.asset_id, g.metric_id, g.freq_id, f.expected_s)"
+    " SELECT a.name AS asset, m.name AS metric, q.name AS freq,"
+    " agg.n_intervals,"
+    " CASE WHEN agg.expected_s IS NOT NULL THEN agg.n_irregular END AS n_non_1d,"
+    " COALESCE(agg.max_gap_s / 86400, 0)::float8 AS max_gap_days,"
+    " CASE WHEN agg.expected_s IS NOT NULL AND agg.n_intervals > 0"
+    " THEN agg.n_irregular::float8 / agg.n_intervals END AS gap_ratio,"
+    " (agg.expected_s / 86400.0)::float8 AS expected_gap_days"
+    " FROM agg"
+    " JOIN processed.dim_asset a ON a.id = agg.asset_id"
+    " JOIN processed.dim_metric m ON m.id = agg.metric_id"
+    " JOIN processed.dim_freq q ON q.id = agg.freq_id"
+    " ORDER BY asset, metric, freq"
+)
 
-    if df.empty:
-        # return empty structured df
-        out_cols = ["asset", "metric", "freq", "n_values", "min_value", "max_value", "mean_value", "std_value", "magnitude_order", "coefficient_of_variation"]
-        return pd.DataFrame(columns=out_cols)
-
-    # Ensure numeric
-    df["value"] = pd.to_numeric(df["value"], errors="coerce")
-    # Group and aggregate
-    agg = df.groupby(["asset", "metric", "freq"])["value"].agg(["count", "min", "max", "mean", "std"]).reset_index()
-    agg = agg.rename(columns={"count": "n_values", "min": "min_value", "max": "max_value", "mean": "mean_value", "std": "std_value"})
-
-    # magnitude_order: floor(log10(max(abs(min), abs(max)))) when max_abs > 0
-    def _mag_order(row):
-        try:
-            minv = row["min_value"]
-            maxv = row["max_value"]
-            max_abs = max(abs(minv) if pd.notna(minv) else 0, abs(maxv) if pd.notna(maxv) else 0)
-            if max_abs is None or max_abs == 0:
-                return None
-            import math
 
-            return int(math.floor(math.log10(max_abs)))
-        except Exception:
-            return None
+def compute_time_regularity(conn) -> pd.DataFrame:
+    """Analyze time interval regularity per (asset, metric, freq) inside Postgres.
 
-    agg["magnitude_order"] = agg.apply(_mag_order, axis=1)
+    Gaps between consecutive timestamps are computed with `lag()` and only
+    the per-series summary is transferred. `n_non_1d` counts intervals that
+    differ from the spacing implied by `freq` (1 day for "1d"; the column
+    name is kept for existing reports), `max_gap_days` is the largest gap in
+    (fractional) days.
 
-    # coefficient_of_variation: std / mean when mean != 0
-    def _cv(row):
-        try:
-            mean = row["mean_value"]
-            std = row["std_value"]
-            if pd.isna(mean) or mean == 0 or pd.isna(std):
-                return None
-            return float(std) / float(mean)
-        except Exception:
-            return None
+    Returns DataFrame with columns:
+      asset, metric, freq, n_intervals, n_non_1d, max_gap_days, gap_ratio,
+      expected_gap_days
+    """
+    out_cols = ["asset", "metric", "freq", "n_intervals", "n_non_1d", "max_gap_days", "gap_ratio", "expected_gap_days"]
+    with conn.cursor() as cur:
+        cur.execute(TIME_REGULARITY_SQL)
+        rows = cur.fetchall()
 
-    agg["coefficient_of_variation"] = agg.apply(_cv, axis=1)
+    df = pd.DataFrame(rows, columns=out_cols)
+    df["n_non_1d"] = df["n_non_1d"].astype("Int64")
+    return df
 
-    # Reorder columns
-    out_cols = ["asset", "metric", "freq", "n_values", "min_value", "max_value", "mean_value", "std_value", "magnitude_order", "coefficient_of_variation"]
-    for c in out_cols:
-        if c not in agg.columns:
-            agg[c] = None
 
-    return agg[out_cols]
+_SERIES_KEYS = ("asset_id", "metric_id", "freq_id")
 
 
-def compute_time_regularity(conn) -> pd.DataFrame:
-    """Analyze time interval regularity per (asset, metric, freq).
+def _histogram_sql(log: bool, per_series: bool) -> str:
+    """Bin counts of finite values with width_bucket over [min, max] (per series or global).
+
+    Bin edges are equal-width in value (or log10(value) for positive values
+    when `log`); the maximum falls in the last bin. Empty bins are omitted.
+    """
+    x = "log(value)" if log else "value"
+    where = "value > 0 AND value < 'Infinity'::float8" if log else "value > '-Infinity'::float8 AND value < 'Infinity'::float8"
+    keys = ", ".join(_SERIES_KEYS) if per_series else ""
+    sel = keys + ", " if per_series else ""
+    join = "JOIN b USING (" + keys + ")" if per_series else "CROSS JOIN b"
+    group = " GROUP BY " + keys if per_series else ""
+    edge = "power(10, {e})" if log else "{e}"
+    lo_edge = edge.format(e="b.lo + (b.hi - b.lo) * (h.bin - 1) / %(bins)s")
+    hi_edge = edge.format(e="CASE WHEN b.hi > b.lo THEN b.lo + (b.hi - b.lo) * h.bin / %(bins)s ELSE b.hi END")
+    sql = (
+        f"WITH v AS (SELECT {sel}{x} AS x FROM processed.metrics_fact WHERE {where}),"
+        f" b AS (SELECT {sel}min(x) AS lo, max(x) AS hi FROM v{group}),"
+        f" h AS (SELECT {sel}CASE WHEN b.hi > b.lo THEN LEAST(width_bucket(v.x, b.lo, b.hi, %(bins)s), %(bins)s) ELSE 1 END AS bin,"
+        f" count(*) AS n FROM v {join}"
+        f" GROUP BY {sel}bin)"
+    )
+    if per_series:
+        return sql + (
+            " SELECT a.name AS asset, m.name AS metric, q.name AS freq, h.bin,"
+            f" {lo_edge} AS bin_lo, {hi_edge} AS bin_hi, h.n AS count"
+            " FROM h JOIN b USING (" + keys + ")"
+            " JOIN processed.dim_asset a ON a.id = h.asset_id"
+            " JOIN processed.dim_metric m ON m.id = h.metric_id"
+            " JOIN processed.dim_freq q ON q.id = h.freq_id"
+            " ORDER BY asset, metric, freq, h.bin"
+        )
+    return sql + f" SELECT h.bin, {lo_edge} AS bin_lo, {hi_edge} AS bin_hi, h.n AS count FROM h CROSS JOIN b ORDER BY h.bin"
+
+
+def compute_value_histogram(conn, bins: int = 50, scale: str = "linear", per_series: bool = False) -> pd.DataFrame:
+    """Histogram of non-null finite values computed in Postgres with width_bucket.
+
+    `scale="log"` bins log10(value) of the positive values (edges are
+    returned in value units). With `per_series`, each (asset, metric, freq)
+    gets its own [min, max] range. Only non-empty bins are returned.
 
     Returns DataFrame with columns:
-      asset, metric, freq, n_intervals, n_non_1d, max_gap_days, gap_ratio
+      [asset, metric, freq,] bin, bin_lo, bin_hi, count
     """
+    if scale not in ("linear", "log"):
+        raise ValueError(f"unknown histogram scale {scale!r} (expected 'linear' or 'log')")
+    if bins < 1:
+        raise ValueError("bins must be >= 1")
+    cols = (["asset", "metric", "freq"] if per_series else []) + ["bin", "bin_lo", "bin_hi", "count"]
     with conn.cursor() as cur:
-        cur.execute(
-            "SELECT asset, metric, freq, ts FROM processed.metrics_long WHERE ts IS NOT NULL ORDER BY asset, metric, freq, ts"
-        )
+        cur.execute(_histogram_sql(scale == "log", per_series), {"bins": int(bins)})
         rows = cur.fetchall()
-        cols = [d[0] for d in cur.description] if cur.description else None
+    return pd.DataFrame(rows, columns=cols)
 
-    df = pd.DataFrame(rows, columns=cols if cols is not None else ["asset", "metric", "freq", "ts"])
-    if df.empty:
-        out_cols = ["asset", "metric", "freq", "n_intervals", "n_non_1d", "max_gap_days", "gap_ratio"]
-        return pd.DataFrame(columns=out_cols)
-
-    # parse ts
-    df["ts"] = pd.to_datetime(df["ts"], utc=True)
-
-    # compute deltas per group
-    results = []
-    grouped = df.groupby(["asset", "metric", "freq"], sort=True)
-    for (asset, metric, freq), g in grouped:
-        g = g.sort_values("ts")
-        # compute differences in days between consecutive timestamps
-        diffs = g["ts"].diff().dropna()
-        if diffs.empty:
-            n_intervals = 0
-            n_non_1d = 0
-            max_gap = 0
-            gap_ratio = None
-        else:
-            # delta_days as integer days (floor)
-            delta_days = diffs.dt.total_seconds().div(86400).apply(lambda x: int(x) if pd.notna(x) else None)
-            n_intervals = int(len(delta_days))
-            n_non_1d = int((delta_days != 1).sum())
-            max_gap = int(delta_days.max()) if not delta_days.empty else 0
-            gap_ratio = float(n_non_1d) / float(n_intervals) if n_intervals > 0 else None
-
-        results.append({
-            "asset": asset,
-            "metric": metric,
-            "freq": freq,
-            "n_intervals": n_intervals,
-            "n_non_1d": n_non_1d,
-            "max_gap_days": max_gap,
-            "gap_ratio": gap_ratio,
-        })
-
-    out_df = pd.DataFrame(results)
-    # Ensure column order
-    out_cols = ["asset", "metric", "freq", "n_intervals", "n_non_1d", "max_gap_days", "gap_ratio"]
-    for c in out_cols:
-        if c not in out_df.columns:
-            out_df[c] = None
 
-    return out_df[out_cols]
+def _plot_histogram(df: pd.DataFrame, fig_path: Path, scale: str = "linear") -> None:
+    """Plot precomputed bins (bin_lo, bin_hi, count) as a bar chart."""
+    plt.figure()
+    if df.empty:
+        # create an empty placeholder image
+        plt.text(0.5, 0.5, "no values", ha="center", va="center")
+        plt.axis("off")
+    else:
+        widths = (df["bin_hi"] - df["bin_lo"]).where(lambda w: w > 0, 1.0)
+        plt.bar(df["bin_lo"], df["count"], width=widths, align="edge")
+        if scale == "log":
+            plt.xscale("log")
+        plt.xlabel("value" if scale == "linear" else "value (log scale)")
+        plt.ylabel("count")
+        plt.title("Histogram of metric values" + ("" if scale == "linear" else " (log10 bins)"))
+        plt.tight_layout()
+    plt.savefig(fig_path)
+    plt.close()
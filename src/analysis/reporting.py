@@ -7,7 +7,7 @@ from typing import Optional
 import pandas as pd
 
 from src.utils.logging import logger
-from src.db.engine import get_conn
+from src.db.engine import connection
 
 
 def generate_final_report(
@@ -76,8 +76,7 @@ def generate_final_report(
     # Determine whether real CoinMetrics timeseries and processed rows exist
     real_data = False
     try:
-        conn = get_conn()
-        with conn.cursor() as cur:
+        with connection() as conn, conn.cursor() as cur:
             cur.execute(
                 "SELECT count(*) FROM raw.api_responses WHERE endpoint=%s AND status_code=200",
                 ("timeseries/asset-metrics",),
@@ -91,11 +90,6 @@ def generate_final_report(
             real_data = True
     except Exception as exc:
         logger.warning("Could not determine data source counts: %s", exc)
-    finally:
-        try:
-            conn.close()
-        except Exception:
-            pass
 
     if real_data:
         lines.append(
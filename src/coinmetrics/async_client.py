@@ -0,0 +1,219 @@
+"""Asyncio variant of `CoinMetricsClient` built on aiohttp.
+
+One `AsyncCoinMetricsClient` owns a single `aiohttp.ClientSession`, so every
+request made through it shares one keep-alive connection pool. The pool
+size is bounded overall (`max_connections`) and per host
+(`max_connections_per_host`).
+
+`iter_pages` pipelines pagination: the request for `next_page_url` is
+started before the current page is handed to the caller, so network
+latency overlaps with whatever the caller does with the page (parsing,
+DB writes). Consume it inside `contextlib.aclosing` so the prefetch is
+cancelled as soon as the loop exits, also when its body raises.
+
+The on-disk response cache does blocking file I/O (gzip, fsync, eviction
+scans); it is read and written in a worker thread with `asyncio.to_thread`
+so a cache hit or write never stalls the event loop.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import aiohttp
+
+from src.coinmetrics.cache import ResponseCache, get_shared_cache, make_key
+from src.coinmetrics.client import CoinMetricsError, asset_metrics_cache_ttl, asset_metrics_params
+from src.coinmetrics.ratelimit import (
+    RequestStats,
+    RetryPolicy,
+    TokenBucket,
+    client_tier,
+    get_shared_limiter,
+    parse_retry_after,
+    retry_policy_from_config,
+)
+from src.config import get_cache_config
+from src.utils import jsonlib
+from src.utils.logging import logger
+
+
+class AsyncCoinMetricsClient:
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        base_url: str = "https://community-api.coinmetrics.io/v4",
+        timeout: int = 30,
+        max_connections: int = 100,
+        max_connections_per_host: int = 10,
+        keepalive_timeout: float = 30.0,
+        rate_limiter: Optional[TokenBucket] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        stats: Optional[RequestStats] = None,
+        cache: Optional[ResponseCache] = None,
+        use_cache: bool = True,
+    ):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.max_connections_per_host = max_connections_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self._session: Optional[aiohttp.ClientSession] = None
+        tier = client_tier(api_key, self.base_url)
+        self.rate_limiter = rate_limiter or get_shared_limiter(tier)
+        self.retry_policy = retry_policy or retry_policy_from_config(tier)
+        self.stats = stats or RequestStats()
+        self.cache = cache if cache is not None else (get_shared_cache() if use_cache else None)
+
+    async def __aenter__(self) -> "AsyncCoinMetricsClient":
+        self._ensure_session()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self.close()
+
+    def _ensure_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.max_connections,
+                limit_per_host=self.max_connections_per_host,
+                keepalive_timeout=self.keepalive_timeout,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            )
+        return self._session
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    def _build_headers(self) -> Dict[str, str]:
+        headers: Dict[str, str] = {"Accept": "application/json", "Accept-Encoding": "gzip, deflate"}
+        if self.api_key:
+            headers["Authorization"] = f"Bearer {self.api_key}"
+        return headers
+
+    async def request_json(self, path: str, params: Optional[Dict[str, Any]] = None, cache_ttl: Optional[float] = None) -> Dict[str, Any]:
+        """GET `path` (relative to base_url, or a full URL) and return parsed JSON.
+
+        Same cache, rate-limit and retry behaviour as
+        `CoinMetricsClient.request_json` (token bucket, jittered backoff
+        honoring `Retry-After`). Raises CoinMetricsError on non-retryable or
+        exhausted non-200 responses.
+        """
+        if path.startswith("http://") or path.startswith("https://"):
+            url = path
+            log_path = path.split("?")[0]
+        else:
+            if not path.startswith("/"):
+                path = "/" + path
+            url = self.base_url + path
+            log_path = path
+
+        cache_key = None
+        if self.cache is not None and cache_ttl:
+            cache_key = make_key(url, params)
+            cached = await asyncio.to_thread(self.cache.get, cache_key)
+            if cached is not None:
+                self.stats.incr("cache_hits")
+                logger.info("CoinMetrics async request: GET %s -> cache hit", log_path)
+                return cached
+
+        session = self._ensure_session()
+        attempt = 0
+        while True:
+            wait = self.rate_limiter.reserve()
+            if wait > 0:
+                self.stats.add_wait(wait)
+                await asyncio.sleep(wait)
+            self.stats.incr("requests")
+            try:
+                async with session.get(url, params=params, headers=self._build_headers()) as resp:
+                    status = resp.status
+                    logger.info("CoinMetrics async request: GET %s -> %s", log_path, status)
+                    if status == 200:
+                        body = jsonlib.loads(await resp.read())
+                        if cache_key is not None:
+                            try:
+                                await asyncio.to_thread(self.cache.put, cache_key, body, cache_ttl)
+                            except Exception as exc:
+                                logger.warning("Could not write response cache entry for %s: %s", log_path, exc)
+                        return body
+                    text = await resp.text()
+                    retry_after = parse_retry_after(resp.headers.get("Retry-After"))
+            except (aiohttp.ClientError, asyncio.TimeoutError) as exc:
+                if not self.retry_policy.should_retry(None, attempt):
+                    self.stats.incr("failed")
+                    raise
+                delay = self.retry_policy.delay(attempt)
+                logger.warning("CoinMetrics async request: GET %s failed (%s), retry %s in %.1fs", log_path, exc, attempt + 1, delay)
+                self.stats.incr("retried")
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+
+            if status == 429:
+                self.stats.incr("throttled")
+            if self.retry_policy.should_retry(status, attempt):
+                if retry_after:
+                    self.rate_limiter.pause(retry_after)
+                delay = self.retry_policy.delay(attempt, retry_after)
+                logger.warning("CoinMetrics async request: GET %s -> %s, retry %s in %.1fs", log_path, status, attempt + 1, delay)
+                self.stats.incr("retried")
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+
+            self.stats.incr("failed")
+            err_payload: Any
+            try:
+                err_payload = json.loads(text)
+                s = json.dumps(err_payload, ensure_ascii=False)
+                if len(s) > 2000:
+                    err_payload = s[:2000]
+            except Exception:
+                err_payload = (text or "")[:2000]
+            raise CoinMetricsError(status, log_path, err_payload)
+
+    async def get_catalog_assets(self) -> Dict[str, Any]:
+        return await self.request_json("/catalog/assets", params=None, cache_ttl=float(get_cache_config()["catalog_ttl"]))
+
+    async def get_asset_metrics(self, asset: str, metrics: List[str], start: str, end: str, frequency: str = "1d", page_size: Optional[int] = None) -> Dict[str, Any]:
+        params = asset_metrics_params(asset, metrics, start, end, frequency, page_size)
+        return await self.request_json("/timeseries/asset-metrics", params=params, cache_ttl=asset_metrics_cache_ttl(params))
+
+    async def iter_pages(self, path: str, params: Optional[Dict[str, Any]] = None, cache_ttl: Optional[float] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Yield every page of a paginated endpoint, prefetching the next one.
+
+        While the caller processes page N, the request for page N+1 is
+        already in flight. When the generator is closed early (the caller
+        broke out of its loop, or the loop body raised and `aclosing` closed
+        it) the pending request is cancelled and awaited before returning.
+        """
+        page = await self.request_json(path, params=params, cache_ttl=cache_ttl)
+        pending: Optional[asyncio.Future] = None
+        try:
+            while True:
+                next_url = page.get("next_page_url") if isinstance(page, dict) else None
+                pending = asyncio.ensure_future(self.request_json(next_url, cache_ttl=cache_ttl)) if next_url else None
+                yield page
+                if pending is None:
+                    return
+                page = await pending
+        finally:
+            if pending is not None and not pending.done():
+                pending.cancel()
+                # Wait for the cancellation so no request outlives the generator
+                await asyncio.gather(pending, return_exceptions=True)
+
+    def iter_asset_metrics_pages(self, asset: str, metrics: List[str], start: str, end: str, frequency: str = "1d", page_size: Optional[int] = None) -> AsyncIterator[Dict[str, Any]]:
+        params = asset_metrics_params(asset, metrics, start, end, frequency, page_size)
+        return self.iter_pages("/timeseries/asset-metrics", params=params, cache_ttl=asset_metrics_cache_ttl(params))
+
+
+__all__ = ["AsyncCoinMetricsClient"]
@@ -0,0 +1,188 @@
+"""On-disk response cache for CoinMetrics API calls.
+
+Entries are keyed by a SHA-256 of the endpoint and its normalized params
+(sorted keys), stored gzip-compressed under `<root>/<key[:2]>/<key>.json.gz`
+and written atomically, so several threads/processes can share one cache
+directory.
+
+Each entry has a TTL: a number of seconds, or `IMMUTABLE` for responses
+that can never change (closed historical windows). When the directory
+grows past `max_bytes`, least-recently-used entries are evicted (reads
+refresh an entry's mtime).
+"""
+from __future__ import annotations
+
+import gzip
+import hashlib
+import math
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from src.config import get_cache_config
+from src.utils import jsonlib
+from src.utils.logging import logger
+
+
+IMMUTABLE = math.inf
+
+
+def make_key(endpoint: str, params: Optional[Dict[str, Any]] = None) -> str:
+    """Content address for a request: sha256 over endpoint + sorted params."""
+    norm = {str(k): str(v) for k, v in (params or {}).items() if v is not None}
+    ident = endpoint + "?" + "&".join(f"{k}={norm[k]}" for k in sorted(norm))
+    return hashlib.sha256(ident.encode("utf-8")).hexdigest()
+
+
+def is_closed_window(end_time: Optional[str], closed_after: timedelta, now: Optional[datetime] = None) -> bool:
+    """True when `end_time` is older than `now - closed_after` (data will not change)."""
+    if not end_time:
+        return False
+    from src.utils.time import parse_utc
+
+    try:
+        end_dt = parse_utc(end_time)
+    except ValueError:
+        return False
+    now = now or datetime.now(timezone.utc)
+    return end_dt <= now - closed_after
+
+
+class ResponseCache:
+    def __init__(self, root: str, max_bytes: int = 512 * 1024 * 1024, clock=time.time):
+        self.root = Path(root)
+        self.max_bytes = int(max_bytes)
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._total_bytes = sum(p.stat().st_size for p in self._entries())
+
+    def _entries(self):
+        return self.root.glob("*/*.json.gz")
+
+    def _path(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}.json.gz"
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return the cached body, or None if absent, expired or unreadable."""
+        path = self._path(key)
+        try:
+            with gzip.open(path, "rb") as fh:
+                entry = jsonlib.loads(fh.read())
+        except FileNotFoundError:
+            return None
+        except Exception as exc:
+            logger.warning("Dropping unreadable cache entry %s: %s", path, exc)
+            self._remove(path)
+            return None
+
+        expires_at = entry.get("expires_at")
+        if expires_at is not None and expires_at <= self._clock():
+            self._remove(path)
+            return None
+        try:
+            os.utime(path)  # LRU bookkeeping
+        except OSError:
+            pass
+        return entry.get("body")
+
+    def put(self, key: str, body: Any, ttl: float) -> None:
+        """Store `body` for `ttl` seconds (`IMMUTABLE` = never expires)."""
+        if ttl is None or ttl <= 0:
+            return
+        entry = {
+            "stored_at": self._clock(),
+            "expires_at": None if ttl == IMMUTABLE else self._clock() + ttl,
+            "body": body,
+        }
+        data = gzip.compress(jsonlib.dumps_bytes(entry), compresslevel=5)
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        old_size = path.stat().st_size if path.exists() else 0
+
+        fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as fh:
+                fh.write(data)
+            os.replace(tmp, path)
+        except Exception:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+
+        with self._lock:
+            self._total_bytes += len(data) - old_size
+            over = self._total_bytes > self.max_bytes
+        if over:
+            self.evict()
+
+    def _remove(self, path: Path) -> None:
+        try:
+            size = path.stat().st_size
+            path.unlink()
+        except OSError:
+            return
+        with self._lock:
+            self._total_bytes -= size
+
+    def evict(self) -> int:
+        """Delete least-recently-used entries until the cache fits `max_bytes`.
+
+        Returns the number of entries removed.
+        """
+        files = []
+        for p in self._entries():
+            try:
+                st = p.stat()
+            except OSError:
+                continue
+            files.append((st.st_mtime, st.st_size, p))
+        files.sort()
+        total = sum(f[1] for f in files)
+        removed = 0
+        # Evict down to 90% to avoid evicting on every put
+        target = int(self.max_bytes * 0.9)
+        for _, size, p in files:
+            if total <= target:
+                break
+            try:
+                p.unlink()
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        with self._lock:
+            self._total_bytes = total
+        if removed:
+            logger.info("Response cache evicted %s entries (size now %s bytes)", removed, total)
+        return removed
+
+    @property
+    def size_bytes(self) -> int:
+        with self._lock:
+            return self._total_bytes
+
+
+_shared_cache: Optional[ResponseCache] = None
+_shared_lock = threading.Lock()
+
+
+def get_shared_cache() -> Optional[ResponseCache]:
+    """Return the process-wide cache from config, or None when `CM_CACHE_DIR` is empty."""
+    global _shared_cache
+    cfg = get_cache_config()
+    if not cfg["dir"]:
+        return None
+    with _shared_lock:
+        if _shared_cache is None or str(_shared_cache.root) != str(Path(cfg["dir"])):
+            _shared_cache = ResponseCache(cfg["dir"], max_bytes=int(float(cfg["max_mb"]) * 1024 * 1024))
+        return _shared_cache
+
+
+__all__ = ["IMMUTABLE", "ResponseCache", "get_shared_cache", "is_closed_window", "make_key"]
@@ -0,0 +1,96 @@
+"""Availability index built from the `/catalog/assets` response.
+
+The catalog lists, per asset, every metric with the frequencies it is
+published at and the first/last available time. `build_availability_index`
+flattens that into
+
+    {asset: {metric: {frequency: (min_time, max_time)}}}
+
+and `plan_asset_request` uses it to drop metrics an asset does not publish
+at the requested frequency and to move the start of the request window
+up to the first time the remaining metrics cover. The end is never
+clamped: the catalog is cached (`CM_CACHE_CATALOG_TTL`), so its max_time
+lags the API and clamping to it would silently drop the newest points.
+"""
+from __future__ import annotations
+
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.utils.logging import logger
+from src.utils.time import format_utc, parse_utc
+
+
+AvailabilityIndex = Dict[str, Dict[str, Dict[str, Tuple[Optional[str], Optional[str]]]]]
+
+
+def build_availability_index(catalog_json: Any) -> AvailabilityIndex:
+    """Parse a catalog/assets payload into asset -> metric -> frequency -> (min_time, max_time)."""
+    index: AvailabilityIndex = {}
+    data = catalog_json.get("data") if isinstance(catalog_json, dict) else None
+    if not isinstance(data, list):
+        return index
+
+    for item in data:
+        if not isinstance(item, dict) or not item.get("asset"):
+            continue
+        metrics: Dict[str, Dict[str, Tuple[Optional[str], Optional[str]]]] = {}
+        for m in item.get("metrics") or []:
+            if not isinstance(m, dict) or not m.get("metric"):
+                continue
+            freqs = {}
+            for f in m.get("frequencies") or []:
+                if isinstance(f, dict) and f.get("frequency"):
+                    freqs[f["frequency"]] = (f.get("min_time"), f.get("max_time"))
+            if freqs:
+                metrics[m["metric"]] = freqs
+        index[str(item["asset"]).lower()] = metrics
+    return index
+
+
+def plan_asset_request(
+    index: AvailabilityIndex,
+    asset: str,
+    metrics: List[str],
+    frequency: str,
+    start: str,
+    end: str,
+) -> Optional[Tuple[List[str], str, str]]:
+    """Prune one asset-metrics request and clamp its start using the availability index.
+
+    Returns (metrics, start, end) to request (end unchanged), or None when
+    nothing the asset publishes overlaps the request. An empty index means "unknown"
+    and leaves the request unchanged.
+    """
+    if not index:
+        return metrics, start, end
+
+    asset_metrics = index.get(asset.lower())
+    if asset_metrics is None:
+        logger.warning("Catalog has no asset %s; skipping request", asset)
+        return None
+
+    kept: List[str] = []
+    ranges = []
+    for m in metrics:
+        rng = asset_metrics.get(m, {}).get(frequency)
+        if rng is None:
+            logger.warning("Catalog: %s does not publish %s at frequency %s; pruned", asset, m, frequency)
+            continue
+        kept.append(m)
+        ranges.append(rng)
+    if not kept:
+        return None
+
+    start_dt = parse_utc(start)
+    end_dt = parse_utc(end)
+    mins = [parse_utc(r[0]) for r in ranges if r[0]]
+    # Only clamp when every kept metric has a known bound, otherwise data could be cut off
+    if mins and len(mins) == len(ranges):
+        start_dt = max(start_dt, min(mins))
+    if start_dt > end_dt:
+        logger.info("Catalog: %s %s has no data in the requested window; skipped", asset, ",".join(kept))
+        return None
+    return kept, format_utc(start_dt), format_utc(end_dt)
+
+
+__all__ = ["AvailabilityIndex", "build_availability_index", "plan_asset_request"]
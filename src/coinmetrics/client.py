@@ -5,10 +5,23 @@ provides helper methods to call a couple of endpoints used in the course.
 """
 from __future__ import annotations
 
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, Iterator, List, Optional
 import json
+import time
 import requests
 
+from src.coinmetrics.cache import IMMUTABLE, ResponseCache, get_shared_cache, is_closed_window, make_key
+from src.coinmetrics.ratelimit import (
+    RequestStats,
+    RetryPolicy,
+    TokenBucket,
+    client_tier,
+    get_shared_limiter,
+    parse_retry_after,
+    retry_policy_from_config,
+)
+from src.config import get_cache_config
+from src.utils import jsonlib
 from src.utils.logging import logger
 
 
@@ -40,33 +53,110 @@ class CoinMetricsError(RuntimeError):
 
 
 class CoinMetricsClient:
-    def __init__(self, api_key: Optional[str] = None, base_url: str = "https://community-api.coinmetrics.io/v4", timeout: int = 30):
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        base_url: str = "https://community-api.coinmetrics.io/v4",
+        timeout: int = 30,
+        rate_limiter: Optional[TokenBucket] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        stats: Optional[RequestStats] = None,
+        cache: Optional[ResponseCache] = None,
+        use_cache: bool = True,
+    ):
         self.api_key = api_key
         self.base_url = base_url.rstrip("/")
         self.timeout = timeout
         self.session = requests.Session()
+        # On-disk response cache (shared per process, from CM_CACHE_DIR) unless disabled
+        self.cache = cache if cache is not None else (get_shared_cache() if use_cache else None)
+        # Limiter is shared per tier across clients in this process unless one is passed in
+        tier = client_tier(api_key, self.base_url)
+        self.rate_limiter = rate_limiter or get_shared_limiter(tier)
+        self.retry_policy = retry_policy or retry_policy_from_config(tier)
+        self.stats = stats or RequestStats()
 
     def _build_headers(self) -> Dict[str, str]:
-        headers: Dict[str, str] = {"Accept": "application/json"}
+        # Ask for compressed bodies explicitly; requests decompresses transparently
+        headers: Dict[str, str] = {"Accept": "application/json", "Accept-Encoding": "gzip, deflate"}
         if self.api_key:
             headers["Authorization"] = f"Bearer {self.api_key}"
         return headers
 
-    def request_json(self, path: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
-        """Perform GET request to the given path and return parsed JSON.
-
-        Raises RuntimeError on non-200 responses. Logs method/path/status.
-        """
+    def _url_for(self, path: str):
+        """Return (url, log_path) for a relative API path or a full URL (e.g. next_page_url)."""
+        if path.startswith("http://") or path.startswith("https://"):
+            return path, path.split("?")[0]
         if not path.startswith("/"):
             path = "/" + path
-        url = self.base_url + path
+        return self.base_url + path, path
+
+    def request_json(self, path: str, params: Optional[Dict[str, Any]] = None, cache_ttl: Optional[float] = None) -> Dict[str, Any]:
+        """Perform GET request to the given path (or full URL) and return parsed JSON.
+
+        With a cache configured and `cache_ttl` set (seconds, or
+        `cache.IMMUTABLE`), a fresh cached body is returned without a
+        request and successful responses are stored.
+        Every attempt first takes a token from the rate limiter. 429 and 5xx
+        responses and transport errors are retried with jittered exponential
+        backoff, honoring `Retry-After`. Raises CoinMetricsError once retries
+        are exhausted or on other non-200 responses. Logs method/path/status.
+        """
+        url, log_path = self._url_for(path)
         headers = self._build_headers()
 
-        resp = self.session.get(url, params=params, headers=headers, timeout=self.timeout)
-        status = resp.status_code
-        logger.info("CoinMetrics request: GET %s -> %s", path, status)
-
-        if status != 200:
+        cache_key = None
+        if self.cache is not None and cache_ttl:
+            cache_key = make_key(url, params)
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                self.stats.incr("cache_hits")
+                logger.info("CoinMetrics request: GET %s -> cache hit", log_path)
+                return cached
+
+        attempt = 0
+        while True:
+            self.stats.add_wait(self.rate_limiter.acquire())
+            self.stats.incr("requests")
+            try:
+                resp = self.session.get(url, params=params, headers=headers, timeout=self.timeout)
+            except requests.RequestException as exc:
+                if not self.retry_policy.should_retry(None, attempt):
+                    self.stats.incr("failed")
+                    raise
+                delay = self.retry_policy.delay(attempt)
+                logger.warning("CoinMetrics request: GET %s failed (%s), retry %s in %.1fs", log_path, exc, attempt + 1, delay)
+                self.stats.incr("retried")
+                time.sleep(delay)
+                attempt += 1
+                continue
+
+            status = resp.status_code
+            logger.info("CoinMetrics request: GET %s -> %s", log_path, status)
+            if status == 200:
+                body = jsonlib.loads(resp.content)
+                if cache_key is not None:
+                    try:
+                        self.cache.put(cache_key, body, cache_ttl)
+                    except Exception as exc:
+                        logger.warning("Could not write response cache entry for %s: %s", log_path, exc)
+                return body
+
+            if status == 429:
+                self.stats.incr("throttled")
+            if self.retry_policy.should_retry(status, attempt):
+                retry_after = parse_retry_after(resp.headers.get("Retry-After"))
+                if retry_after:
+                    # Server asked everybody sharing this limiter to back off
+                    self.rate_limiter.pause(retry_after)
+                delay = self.retry_policy.delay(attempt, retry_after)
+                logger.warning("CoinMetrics request: GET %s -> %s, retry %s in %.1fs", log_path, status, attempt + 1, delay)
+                self.stats.incr("retried")
+                time.sleep(delay)
+                attempt += 1
+                continue
+
+            self.stats.incr("failed")
             # Try to parse JSON error payload, otherwise use text. Truncate to 2000 chars if needed.
             err_payload: Any
             try:
@@ -79,33 +169,71 @@ class CoinMetricsClient:
                 text = resp.text or ""
                 err_payload = text[:2000]
 
-            raise CoinMetricsError(status, path, err_payload)
-
-        return resp.json()
+            raise CoinMetricsError(status, log_path, err_payload)
 
     def get_catalog_assets(self) -> Dict[str, Any]:
         # Do not send 'limit' by default; pagination can be added later.
-        return self.request_json("/catalog/assets", params=None)
-
-    def get_asset_metrics(self, asset: str, metrics: List[str], start: str, end: str, frequency: str = "1d") -> Dict[str, Any]:
-        # Normalize time parameters to ISO8601 UTC so API honors the window
-        try:
-            start_t = normalize_time(start)
-        except Exception:
-            start_t = start
-        try:
-            end_t = normalize_time(end)
-        except Exception:
-            end_t = end
-
-        params = {
-            "assets": asset,
-            "metrics": ",".join(metrics) if isinstance(metrics, (list, tuple)) else metrics,
-            "frequency": frequency,
-            "start_time": start_t,
-            "end_time": end_t,
-        }
-        return self.request_json("/timeseries/asset-metrics", params=params)
+        # The catalog changes rarely: cache it for a short TTL.
+        return self.request_json("/catalog/assets", params=None, cache_ttl=float(get_cache_config()["catalog_ttl"]))
+
+    def get_asset_metrics(self, asset: str, metrics: List[str], start: str, end: str, frequency: str = "1d", page_size: Optional[int] = None) -> Dict[str, Any]:
+        params = asset_metrics_params(asset, metrics, start, end, frequency, page_size)
+        return self.request_json("/timeseries/asset-metrics", params=params, cache_ttl=asset_metrics_cache_ttl(params))
+
+    def iter_pages(self, path: str, params: Optional[Dict[str, Any]] = None, cache_ttl: Optional[float] = None) -> Iterator[Dict[str, Any]]:
+        """Yield every page of a paginated endpoint, following `next_page_url`.
+
+        `cache_ttl` applies to every page (see `request_json`).
+        """
+        page = self.request_json(path, params=params, cache_ttl=cache_ttl)
+        while True:
+            yield page
+            next_url = page.get("next_page_url") if isinstance(page, dict) else None
+            if not next_url:
+                return
+            page = self.request_json(next_url, cache_ttl=cache_ttl)
+
+    def iter_asset_metrics_pages(self, asset: str, metrics: List[str], start: str, end: str, frequency: str = "1d", page_size: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        params = asset_metrics_params(asset, metrics, start, end, frequency, page_size)
+        return self.iter_pages("/timeseries/asset-metrics", params=params, cache_ttl=asset_metrics_cache_ttl(params))
+
+
+def asset_metrics_cache_ttl(params: Dict[str, Any]) -> Optional[float]:
+    """Cache TTL for an asset-metrics request: immutable for closed windows, else no caching."""
+    from src.utils.time import span_to_timedelta
+
+    try:
+        closed_after = span_to_timedelta(get_cache_config()["closed_after"])
+    except ValueError:
+        return None
+    return IMMUTABLE if is_closed_window(params.get("end_time"), closed_after) else None
+
+
+def asset_metrics_params(asset: str, metrics: List[str], start: str, end: str, frequency: str = "1d", page_size: Optional[int] = None) -> Dict[str, Any]:
+    """Build `/timeseries/asset-metrics` query params.
+
+    Times are normalized to ISO8601 UTC so the API honors the window;
+    `page_size` is only sent when given.
+    """
+    try:
+        start_t = normalize_time(start)
+    except Exception:
+        start_t = start
+    try:
+        end_t = normalize_time(end)
+    except Exception:
+        end_t = end
+
+    params: Dict[str, Any] = {
+        "assets": asset,
+        "metrics": ",".join(metrics) if isinstance(metrics, (list, tuple)) else metrics,
+        "frequency": frequency,
+        "start_time": start_t,
+        "end_time": end_t,
+    }
+    if page_size:
+        params["page_size"] = int(page_size)
+    return params
 
 
 __all__ = ["CoinMetricsClient"]
@@ -1,6 +1,6 @@
 """Thin endpoint wrappers around `CoinMetricsClient` for convenience."""
 
-from typing import List, Any, Dict
+from typing import List, Any, Dict, Optional
 
 from src.coinmetrics.client import CoinMetricsClient
 
@@ -9,8 +9,8 @@ def fetch_assets(client: CoinMetricsClient) -> Dict[str, Any]:
     return client.get_catalog_assets()
 
 
-def fetch_asset_metrics(client: CoinMetricsClient, asset: str, metrics: List[str], start: str, end: str, frequency: str = "1d") -> Dict[str, Any]:
-    return client.get_asset_metrics(asset=asset, metrics=metrics, start=start, end=end, frequency=frequency)
+def fetch_asset_metrics(client: CoinMetricsClient, asset: str, metrics: List[str], start: str, end: str, frequency: str = "1d", page_size: Optional[int] = None) -> Dict[str, Any]:
+    return client.get_asset_metrics(asset=asset, metrics=metrics, start=start, end=end, frequency=frequency, page_size=page_size)
 
 
 __all__ = ["fetch_assets", "fetch_asset_metrics"]
@@ -0,0 +1,222 @@
+"""Client-side rate limiting and retry helpers for the CoinMetrics clients.
+
+- `TokenBucket`: thread-safe token bucket. `reserve()` takes a token and
+  returns how long the caller must wait, so the same bucket serves the sync
+  client (`time.sleep`) and the async client (`asyncio.sleep`).
+- `RetryPolicy`: jittered exponential backoff that honors `Retry-After`.
+- `RequestStats`: thread-safe per-client counters.
+
+Limiters are shared per API tier (`get_shared_limiter`) so that several
+clients in one process (e.g. one per extract worker) stay under a single
+rate ceiling.
+"""
+from __future__ import annotations
+
+import os
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from src.config import get_api_config
+
+
+class TokenBucket:
+    """Token bucket refilled at `rate` tokens/second, holding at most `capacity`."""
+
+    def __init__(self, rate: float, capacity: float, clock: Callable[[], float] = time.monotonic):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = float(rate)
+        self.capacity = max(1.0, float(capacity))
+        self._clock = clock
+        self._tokens = self.capacity
+        self._updated = clock()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self._updated
+        if elapsed > 0:
+            self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+            self._updated = now
+
+    def reserve(self, n: float = 1.0) -> float:
+        """Take `n` tokens and return the seconds to wait before using them.
+
+        Tokens may go negative; later callers then queue behind earlier ones,
+        which keeps concurrent callers fair without holding the lock while
+        sleeping.
+        """
+        with self._lock:
+            now = self._clock()
+            self._refill(now)
+            self._tokens -= n
+            wait = 0.0
+            if self._tokens < 0:
+                wait = -self._tokens / self.rate
+            if self._blocked_until > now:
+                wait = max(wait, self._blocked_until - now)
+            return wait
+
+    def acquire(self, n: float = 1.0) -> float:
+        """Blocking variant of `reserve`; returns the seconds slept."""
+        wait = self.reserve(n)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def pause(self, seconds: float) -> None:
+        """Hold every caller for `seconds` (used when the server asks us to back off)."""
+        if seconds <= 0:
+            return
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, self._clock() + seconds)
+
+
+def parse_retry_after(value: Optional[str], now: Optional[datetime] = None) -> Optional[float]:
+    """Parse a `Retry-After` header (delta-seconds or HTTP-date) into seconds."""
+    if value is None:
+        return None
+    value = str(value).strip()
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when is None:
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    now = now or datetime.now(timezone.utc)
+    return max(0.0, (when - now).total_seconds())
+
+
+class RetryPolicy:
+    """Jittered exponential backoff for retryable HTTP statuses."""
+
+    def __init__(
+        self,
+        max_retries: int = 5,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0,
+        retry_statuses: Iterable[int] = (429, 500, 502, 503, 504),
+        rng: Optional[random.Random] = None,
+    ):
+        self.max_retries = max(0, int(max_retries))
+        self.base_delay = float(base_delay)
+        self.max_delay = float(max_delay)
+        self.retry_statuses = frozenset(retry_statuses)
+        self._rng = rng or random.Random()
+
+    def should_retry(self, status: Optional[int], attempt: int) -> bool:
+        """`status=None` means a transport error (timeout, reset connection)."""
+        if attempt >= self.max_retries:
+            return False
+        return status is None or status in self.retry_statuses
+
+    def delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """Seconds to sleep before retry number `attempt + 1`.
+
+        Full jitter over `base * 2**attempt` (capped at `max_delay`); a
+        server-provided `Retry-After` is a lower bound.
+        """
+        cap = min(self.max_delay, self.base_delay * (2 ** attempt))
+        d = self._rng.uniform(0, cap)
+        if retry_after is not None:
+            d = max(d, retry_after)
+        return d
+
+
+class RequestStats:
+    """Thread-safe request counters.
+
+    - requests: HTTP attempts sent (including retries)
+    - throttled: 429 responses received
+    - limited: attempts delayed by the local token bucket
+    - retried: attempts that were retried
+    - failed: requests that gave up with an error
+    - cache_hits: requests answered from the on-disk response cache
+    """
+
+    FIELDS = ("requests", "throttled", "limited", "retried", "failed", "cache_hits")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts: Dict[str, int] = {f: 0 for f in self.FIELDS}
+        self.wait_seconds = 0.0
+
+    def incr(self, field: str, n: int = 1) -> None:
+        with self._lock:
+            self._counts[field] = self._counts.get(field, 0) + n
+
+    def add_wait(self, seconds: float) -> None:
+        if seconds <= 0:
+            return
+        with self._lock:
+            self._counts["limited"] += 1
+            self.wait_seconds += seconds
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            out: Dict[str, Any] = dict(self._counts)
+            out["wait_seconds"] = round(self.wait_seconds, 3)
+            return out
+
+
+_shared_limiters: Dict[str, TokenBucket] = {}
+_shared_lock = threading.Lock()
+
+
+def client_tier(api_key: Optional[str] = None, base_url: Optional[str] = None) -> str:
+    """API tier a client should be budgeted as.
+
+    `CM_API_TIER` wins when set. Otherwise the host decides: requests to the
+    community API get the community budget even when a key is configured, and
+    the key budget applies only with a key on any other host.
+    """
+    tier = os.getenv("CM_API_TIER")
+    if tier:
+        return tier
+    if not api_key or (base_url and "community-api." in base_url):
+        return "community"
+    return "key"
+
+
+def get_shared_limiter(tier: Optional[str] = None) -> TokenBucket:
+    """Return the process-wide token bucket for an API tier (created on first use)."""
+    cfg = get_api_config(tier)
+    key = cfg["tier"]
+    with _shared_lock:
+        bucket = _shared_limiters.get(key)
+        if bucket is None:
+            bucket = TokenBucket(rate=float(cfg["rate_per_sec"]), capacity=float(cfg["burst"]))
+            _shared_limiters[key] = bucket
+        return bucket
+
+
+def retry_policy_from_config(tier: Optional[str] = None) -> RetryPolicy:
+    cfg = get_api_config(tier)
+    return RetryPolicy(
+        max_retries=int(cfg["max_retries"]),
+        base_delay=float(cfg["backoff_base"]),
+        max_delay=float(cfg["backoff_max"]),
+    )
+
+
+__all__ = [
+    "TokenBucket",
+    "RetryPolicy",
+    "RequestStats",
+    "parse_retry_after",
+    "client_tier",
+    "get_shared_limiter",
+    "retry_policy_from_config",
+]
@@ -4,7 +4,7 @@ This module exposes simple helpers used by the minimal ETL.
 """
 import os
 
-from typing import Dict
+from typing import Dict, Optional
 
 
 COINMETRICS_API_KEY = os.getenv("COINMETRICS_API_KEY", "")
@@ -28,6 +28,21 @@ def get_db_dsn() -> str:
 	return f"host={p['host']} port={p['port']} dbname={p['dbname']} user={p['user']} password={p['password']}"
 
 
+def get_db_pool_config() -> Dict[str, str]:
+	"""Return settings for the process-wide connection pool (src.db.engine)."""
+	return {
+		# "0" opens a fresh connection for every get_conn() call
+		"enabled": os.getenv("DB_POOL_ENABLED", "1"),
+		"min": os.getenv("DB_POOL_MIN", "1"),
+		# "" = sized from extract/window/load concurrency (src.db.engine.default_pool_max)
+		"max": os.getenv("DB_POOL_MAX", ""),
+		# Seconds to wait for a free connection before raising PoolTimeout
+		"timeout": os.getenv("DB_POOL_TIMEOUT", "30"),
+		# Ping connections that sat idle longer than this many seconds
+		"check_after": os.getenv("DB_POOL_CHECK_AFTER", "30"),
+	}
+
+
 def get_cm_config() -> Dict[str, str]:
 	"""Return simple CoinMetrics-related defaults from env (used for params)."""
 	return {
@@ -36,4 +51,94 @@ def get_cm_config() -> Dict[str, str]:
 		"start_date": os.getenv("CM_START_DATE", "2013-01-01"),
 		"end_date": os.getenv("CM_END_DATE", "2015-12-31"),
 		"frequency": os.getenv("CM_FREQUENCY", "1d"),
+		# Max number of assets fetched at the same time by `run_extract_all`
+		"concurrency": os.getenv("CM_EXTRACT_CONCURRENCY", "4"),
+		# Keep-alive pool bound for AsyncCoinMetricsClient
+		"max_connections_per_host": os.getenv("CM_HTTP_MAX_CONNECTIONS_PER_HOST", "10"),
+		# Split long ranges into sub-windows fetched concurrently (e.g. "1y", "90d"; empty = off)
+		"window_span": os.getenv("CM_WINDOW_SPAN", ""),
+		"window_concurrency": os.getenv("CM_WINDOW_CONCURRENCY", "4"),
+		# Explicit page_size for asset-metrics requests (empty = API default)
+		"page_size": os.getenv("CM_PAGE_SIZE", ""),
+		# Incremental extract: refetch this much before each series' max(ts) for late revisions
+		"incremental_overlap": os.getenv("CM_INCREMENTAL_OVERLAP", "3d"),
+		# Prune/clamp requests with the catalog availability index ("0" disables)
+		"use_catalog_index": os.getenv("CM_USE_CATALOG_INDEX", "1"),
+		# Raw storage: "jsonb" (audit row per page + merged row) or "pages" (compressed, de-duplicated + manifest)
+		"raw_storage": os.getenv("CM_RAW_STORAGE", "jsonb"),
+	}
+
+
+# Default request budgets per CoinMetrics API tier. Community: 10 requests
+# per 6 seconds per IP; key (Pro): 6000 requests per 20 seconds.
+_API_TIER_DEFAULTS = {
+	"community": {"rate_per_sec": "1.6", "burst": "10"},
+	"key": {"rate_per_sec": "300", "burst": "300"},
+}
+
+
+def get_api_config(tier: Optional[str] = None) -> Dict[str, str]:
+	"""Return rate-limit/retry settings for the given API tier.
+
+	The tier defaults to `CM_API_TIER`, else "key" when an API key is set and
+	"community" otherwise. `CM_RATE_LIMIT_PER_SEC` / `CM_RATE_LIMIT_BURST`
+	override the tier budget.
+	"""
+	if not tier:
+		tier = os.getenv("CM_API_TIER") or ("key" if COINMETRICS_API_KEY else "community")
+	defaults = _API_TIER_DEFAULTS.get(tier, _API_TIER_DEFAULTS["community"])
+	return {
+		"tier": tier,
+		"rate_per_sec": os.getenv("CM_RATE_LIMIT_PER_SEC", defaults["rate_per_sec"]),
+		"burst": os.getenv("CM_RATE_LIMIT_BURST", defaults["burst"]),
+		"max_retries": os.getenv("CM_MAX_RETRIES", "5"),
+		"backoff_base": os.getenv("CM_BACKOFF_BASE", "1.0"),
+		"backoff_max": os.getenv("CM_BACKOFF_MAX", "60"),
+	}
+
+
+def get_cache_config() -> Dict[str, str]:
+	"""Return on-disk API response cache settings.
+
+	An empty `CM_CACHE_DIR` disables the cache. Time windows whose end is
+	older than `CM_CACHE_CLOSED_AFTER` are cached forever; the catalog is
+	cached for `CM_CACHE_CATALOG_TTL` seconds.
+	"""
+	return {
+		"dir": os.getenv("CM_CACHE_DIR", ".cache/coinmetrics"),
+		"max_mb": os.getenv("CM_CACHE_MAX_MB", "512"),
+		"catalog_ttl": os.getenv("CM_CACHE_CATALOG_TTL", "3600"),
+		"closed_after": os.getenv("CM_CACHE_CLOSED_AFTER", "2d"),
+	}
+
+
+def get_load_config() -> Dict[str, str]:
+	"""Return settings for loading rows into processed.metrics_long."""
+	return {
+		# "row" (one statement per row), "copy" (COPY into staging + one merge),
+		# "batch" (multi-row VALUES, committed per batch) or "parallel"
+		# (copy over several connections, sharded by asset/metric)
+		"mode": os.getenv("ETL_LOAD_MODE", "row"),
+		"batch_size": os.getenv("ETL_BATCH_SIZE", "5000"),
+		"workers": os.getenv("ETL_LOAD_WORKERS", "4"),
+		# Opt-in: only rewrite existing rows whose value/is_missing changed
+		# (unchanged rows keep their ingested_at and are not counted as affected)
+		"skip_unchanged": os.getenv("ETL_LOAD_SKIP_UNCHANGED", "0"),
+	}
+
+
+def get_transform_config() -> Dict[str, str]:
+	"""Return settings for the raw -> processed transform."""
+	return {
+		# "python" (row dicts), "columnar" (numpy/pandas arrays loaded via COPY)
+		# or "sql" (payload unpivoted inside Postgres, no rows cross the wire)
+		"engine": os.getenv("ETL_TRANSFORM_ENGINE", "python"),
+		# transform_pending: worker processes ("" = one per CPU) and ids claimed at a time
+		"workers": os.getenv("ETL_TRANSFORM_WORKERS", ""),
+		"claim_size": os.getenv("ETL_TRANSFORM_CLAIM_SIZE", "2"),
+		# Release 'processing' claims older than this Postgres interval ("" = never)
+		"stale_after": os.getenv("ETL_TRANSFORM_STALE_AFTER", ""),
+		# transform_iter: rows per yielded batch and raw payloads per cursor fetch
+		"batch_rows": os.getenv("ETL_TRANSFORM_BATCH_ROWS", "50000"),
+		"fetch_payloads": os.getenv("ETL_TRANSFORM_FETCH_PAYLOADS", "2"),
 	}
@@ -0,0 +1,117 @@
+"""Dimension ids for the processed store (dictionary encoding).
+
+`processed.metrics_fact` stores integer ids instead of repeating asset,
+metric, freq and source endpoint names on every row; the names live in
+`processed.dim_asset`, `dim_metric`, `dim_freq` and `dim_endpoint`.
+
+`resolve_ids` maps names to ids through a process-wide cache: only names
+not seen before cost a round-trip (one SELECT per dimension and batch, plus
+an INSERT for names the table does not have yet), so encoding a batch adds
+no per-row database lookups. Existing names are looked up before
+inserting because `INSERT ... ON CONFLICT DO NOTHING` consumes an identity
+value even when the name already exists.
+
+New names are always committed before their ids are cached. When the
+caller's connection is inside an open transaction, that transaction is left
+alone and the names are written over a separate pooled connection instead:
+committing it would commit the caller's pending work, and caching ids of an
+uncommitted insert would poison the cache if the caller rolled back.
+"""
+from __future__ import annotations
+
+import threading
+from typing import Any, Dict, Iterable, List, Optional
+
+import psycopg2.extensions
+
+from src.db.engine import get_conn
+
+DIMENSIONS = {
+    "asset": "processed.dim_asset",
+    "metric": "processed.dim_metric",
+    "freq": "processed.dim_freq",
+    "endpoint": "processed.dim_endpoint",
+}
+
+_cache: Dict[str, Dict[str, int]] = {kind: {} for kind in DIMENSIONS}
+_lock = threading.Lock()
+
+
+def _in_transaction(conn) -> bool:
+    """True when `conn` has a transaction open (anything but TRANSACTION_STATUS_IDLE)."""
+    return conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE
+
+
+def _fetch_or_create(conn, table: str, names: List[str]) -> Dict[str, int]:
+    """Look up `names` in `table`, insert the missing ones and commit; returns {name: id}."""
+    with conn:
+        with conn.cursor() as cur:
+            cur.execute(f"SELECT name, id FROM {table} WHERE name = ANY(%s)", (names,))
+            found = dict(cur.fetchall())
+            new = [n for n in names if n not in found]
+            if new:
+                cur.execute(f"INSERT INTO {table} (name) SELECT unnest(%s::text[]) ON CONFLICT (name) DO NOTHING", (new,))
+                cur.execute(f"SELECT name, id FROM {table} WHERE name = ANY(%s)", (new,))
+                found.update(cur.fetchall())
+    return found
+
+
+def resolve_ids(conn, kind: str, names: Iterable[Optional[str]]) -> Dict[str, int]:
+    """Return {name: id} for `names` of dimension `kind`, creating missing entries.
+
+    None is ignored. New names are committed in their own transaction and
+    inserted in sorted order, so concurrent loaders cannot deadlock on them.
+    `conn` is used when it is idle; if it has a transaction open, a separate
+    pooled connection is used so that transaction is neither committed nor
+    rolled back here.
+    """
+    table = DIMENSIONS[kind]
+    wanted = {str(n) for n in names if n is not None}
+    with _lock:
+        known = _cache[kind]
+        missing = sorted(wanted - known.keys())
+    if missing:
+        if _in_transaction(conn):
+            own = get_conn()
+            try:
+                found = _fetch_or_create(own, table, missing)
+            finally:
+                own.close()
+        else:
+            found = _fetch_or_create(conn, table, missing)
+        with _lock:
+            _cache[kind].update(found)
+    with _lock:
+        known = _cache[kind]
+        return {n: known[n] for n in wanted}
+
+
+def encode_rows(conn, rows: List[Dict[str, Any]]) -> List[tuple]:
+    """Row dicts -> processed.metrics_fact tuples
+    (asset_id, metric_id, ts, freq_id, value, is_missing, endpoint_id)."""
+    assets = resolve_ids(conn, "asset", (r.get("asset") for r in rows))
+    metrics = resolve_ids(conn, "metric", (r.get("metric") for r in rows))
+    freqs = resolve_ids(conn, "freq", (r.get("freq") for r in rows))
+    endpoints = resolve_ids(conn, "endpoint", (r.get("source_endpoint") for r in rows))
+    return [
+        (
+            assets.get(r.get("asset")),
+            metrics.get(r.get("metric")),
+            r.get("ts"),
+            freqs.get(r.get("freq")),
+            r.get("value"),
+            r.get("is_missing", False),
+            endpoints.get(r.get("source_endpoint")),
+        )
+        for r in rows
+    ]
+
+
+def reset_cache() -> None:
+    """Forget cached ids (e.g. after the dimension tables were rebuilt)."""
+    with _lock:
+        for kind in _cache:
+            _cache[kind].clear()
+
+
+__all__ = ["DIMENSIONS", "encode_rows", "reset_cache", "resolve_ids"]
@@ -1,23 +1,344 @@
 """Database engine helpers using psycopg2.
 
-This module provides a minimal connection helper and an `execute` helper
-used by the ETL placeholder.
+Connections come from a process-wide `ConnectionPool` (see `get_pool`):
+`with connection() as conn:` borrows one for a block, and `get_conn()`
+keeps its old contract (caller closes) but `close()` hands the connection
+back to the pool instead of tearing it down. Set `DB_POOL_ENABLED=0` to
+get a fresh connection per call as before.
 """
+import collections
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional, Sequence
+
 import psycopg2
+import psycopg2.extensions
 import psycopg2.extras
-from typing import Any, Optional, Sequence
 
-from src.config import get_db_dsn
+from src.config import get_cm_config, get_db_dsn, get_db_pool_config, get_load_config
+from src.utils import jsonlib
+from src.utils.logging import logger
+
+
+def _connect():
+    """Open a new psycopg2 connection (autocommit disabled)."""
+    conn = psycopg2.connect(get_db_dsn())
+    # Decode JSONB columns with the same (fast) backend used for API responses
+    psycopg2.extras.register_default_jsonb(conn_or_curs=conn, loads=jsonlib.loads)
+    return conn
+
+
+class PoolTimeout(Exception):
+    """No connection became available within the pool timeout."""
+
+
+class ConnectionPool:
+    """Thread-safe pool of psycopg2 connections.
+
+    At most `maxconn` connections are checked out at once; `acquire` blocks
+    up to `timeout` seconds for one to be returned. `minconn` connections are
+    opened up front and kept idle. A connection idle for longer than
+    `check_after` seconds is pinged (`SELECT 1`) before being handed out and
+    replaced if it is dead. Returned connections are rolled back if they
+    were left inside a transaction.
+    """
+
+    def __init__(self, minconn: int = 1, maxconn: int = 10, timeout: float = 30.0, check_after: float = 30.0, connect=_connect):
+        if maxconn < 1 or minconn < 0 or minconn > maxconn:
+            raise ValueError(f"invalid pool size min={minconn} max={maxconn}")
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.check_after = check_after
+        self._connect = connect
+        self._idle: "collections.deque" = collections.deque()  # (conn, returned_at)
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._lock = threading.Lock()
+        self._closed = False
+        self._stats = {
+            "created": 0,
+            "acquired": 0,
+            "in_use": 0,
+            "peak_in_use": 0,
+            "waits": 0,
+            "wait_seconds": 0.0,
+            "timeouts": 0,
+            "health_checks": 0,
+            "health_failures": 0,
+            "discarded": 0,
+        }
+        for _ in range(minconn):
+            self._idle.append((self._new_conn(), time.monotonic()))
+
+    def _new_conn(self):
+        conn = self._connect()
+        with self._lock:
+            self._stats["created"] += 1
+        return conn
+
+    def _discard(self, conn) -> None:
+        with self._lock:
+            self._stats["discarded"] += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _healthy(self, conn) -> bool:
+        with self._lock:
+            self._stats["health_checks"] += 1
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            with self._lock:
+                self._stats["health_failures"] += 1
+            return False
+
+    def acquire(self):
+        """Check out a connection (blocks up to `timeout` seconds)."""
+        if self._closed:
+            raise RuntimeError("connection pool is closed")
+        t0 = time.monotonic()
+        if not self._slots.acquire(blocking=False):
+            if not self._slots.acquire(timeout=self.timeout):
+                with self._lock:
+                    self._stats["timeouts"] += 1
+                raise PoolTimeout(f"no database connection available after {self.timeout}s (max={self.maxconn})")
+            with self._lock:
+                self._stats["waits"] += 1
+                self._stats["wait_seconds"] += time.monotonic() - t0
+        try:
+            conn = None
+            while conn is None:
+                with self._lock:
+                    item = self._idle.popleft() if self._idle else None
+                if item is None:
+                    conn = self._new_conn()
+                    break
+                candidate, returned_at = item
+                if candidate.closed:
+                    self._discard(candidate)
+                elif time.monotonic() - returned_at > self.check_after and not self._healthy(candidate):
+                    self._discard(candidate)
+                else:
+                    conn = candidate
+        except BaseException:
+            self._slots.release()
+            raise
+        with self._lock:
+            self._stats["acquired"] += 1
+            self._stats["in_use"] += 1
+            self._stats["peak_in_use"] = max(self._stats["peak_in_use"], self._stats["in_use"])
+        return conn
+
+    def release(self, conn) -> None:
+        """Return a connection checked out with `acquire`."""
+        keep = not conn.closed and not self._closed
+        if keep:
+            try:
+                if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+                if conn.autocommit:
+                    conn.autocommit = False
+            except psycopg2.Error:
+                keep = False
+        if keep:
+            with self._lock:
+                self._idle.append((conn, time.monotonic()))
+        else:
+            self._discard(conn)
+        with self._lock:
+            self._stats["in_use"] -= 1
+        self._slots.release()
+
+    @contextmanager
+    def connection(self) -> Iterator[Any]:
+        """Borrow a connection for the duration of a `with` block."""
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def stats(self) -> Dict[str, Any]:
+        """Usage counters plus current idle/in-use sizes."""
+        with self._lock:
+            out = dict(self._stats)
+            out["idle"] = len(self._idle)
+        out["min"], out["max"] = self.minconn, self.maxconn
+        out["wait_seconds"] = round(out["wait_seconds"], 3)
+        return out
+
+    def close(self) -> None:
+        """Close idle connections; connections still checked out are closed on release."""
+        self._closed = True
+        with self._lock:
+            idle, self._idle = list(self._idle), collections.deque()
+        for conn, _ in idle:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+
+class PooledConnection:
+    """A pooled psycopg2 connection whose `close()` returns it to the pool.
+
+    Everything else (cursor, commit, `with conn:` transactions, ...) is
+    delegated to the underlying connection.
+    """
+
+    def __init__(self, pool: ConnectionPool, conn):
+        self._pool = pool
+        self._conn = conn
+
+    def __getattr__(self, name):
+        conn = self.__dict__.get("_conn")
+        if conn is None:
+            raise psycopg2.InterfaceError("connection already returned to the pool")
+        return getattr(conn, name)
+
+    def __setattr__(self, name, value):
+        if name in ("_pool", "_conn"):
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self._conn, name, value)
+
+    def __enter__(self):
+        self._conn.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        return self._conn.__exit__(*exc)
+
+    @property
+    def closed(self) -> int:
+        return 1 if self._conn is None else self._conn.closed
+
+    def close(self) -> None:
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            self._pool.release(conn)
+
+
+_POOL: Optional[ConnectionPool] = None
+_POOL_PID: Optional[int] = None
+_POOL_LOCK = threading.Lock()
+# Pools inherited across fork(): kept referenced so their connections are
+# never finalized in the child (that would terminate the parent's sessions)
+_INHERITED_POOLS = []
+
+
+def _pool_enabled() -> bool:
+    return get_db_pool_config().get("enabled", "1").strip().lower() not in ("0", "false", "no", "off")
+
+
+def _int_setting(value: Optional[str], default: int) -> int:
+    try:
+        return int(value) if value not in (None, "") else default
+    except ValueError:
+        return default
+
+
+def default_pool_max(extract_concurrency: Optional[int] = None) -> int:
+    """Pool size that covers the nested borrowers of one extract run (DB_POOL_MAX unset).
+
+    Every extract worker holds a connection while, in stream mode, each of
+    its `CM_WINDOW_CONCURRENCY` window workers holds another, and with
+    `ETL_LOAD_MODE=parallel` every page load borrows `ETL_LOAD_WORKERS` more
+    while its caller's connection stays checked out. Never below 20.
+    """
+    cm = get_cm_config()
+    load = get_load_config()
+    if extract_concurrency is None:
+        extract_concurrency = _int_setting(cm.get("concurrency"), 4)
+    loaders = _int_setting(load.get("workers"), 4) if load.get("mode") == "parallel" else 0
+    windows = _int_setting(cm.get("window_concurrency"), 4) if cm.get("window_span") else 0
+    per_asset = 1 + (windows * (1 + loaders) if windows else loaders)
+    # +1 for a connection the caller itself keeps open (e.g. the runner's load connection)
+    return max(20, max(1, extract_concurrency) * per_asset + 1)
+
+
+def check_pool_size(extract_concurrency: int) -> None:
+    """Warn when the pool is smaller than `default_pool_max(extract_concurrency)`."""
+    if not _pool_enabled():
+        return
+    need = default_pool_max(extract_concurrency)
+    pool = get_pool()
+    if pool.maxconn < need:
+        logger.warning(
+            "DB pool max=%s is below the %s connections extract concurrency=%s can hold at once; expect PoolTimeout (raise DB_POOL_MAX)",
+            pool.maxconn, need, extract_concurrency,
+        )
+
+
+def get_pool() -> ConnectionPool:
+    """Return the process-wide pool, creating it from `get_db_pool_config`.
+
+    The pool is per process: a forked worker gets its own instead of sharing
+    the parent's sockets.
+    """
+    global _POOL, _POOL_PID
+    pid = os.getpid()
+    with _POOL_LOCK:
+        if _POOL is None or _POOL_PID != pid:
+            if _POOL is not None:
+                _INHERITED_POOLS.append(_POOL)
+            cfg = get_db_pool_config()
+            maxconn = int(cfg["max"]) if cfg["max"].strip() else default_pool_max()
+            _POOL = ConnectionPool(
+                minconn=int(cfg["min"]),
+                maxconn=maxconn,
+                timeout=float(cfg["timeout"]),
+                check_after=float(cfg["check_after"]),
+            )
+            _POOL_PID = pid
+            logger.debug("Created DB connection pool min=%s max=%s (pid=%s)", cfg["min"], maxconn, pid)
+        return _POOL
+
+
+def pool_stats() -> Optional[Dict[str, Any]]:
+    """Stats of this process' pool, or None if it was never used."""
+    with _POOL_LOCK:
+        pool = _POOL if _POOL_PID == os.getpid() else None
+    return pool.stats() if pool is not None else None
+
+
+def close_pool() -> None:
+    """Close this process' pool (a new one is created on next use)."""
+    global _POOL, _POOL_PID
+    with _POOL_LOCK:
+        pool, pid = _POOL, _POOL_PID
+        _POOL, _POOL_PID = None, None
+    if pool is not None and pid == os.getpid():
+        pool.close()
 
 
 def get_conn():
-    """Return a new psycopg2 connection (caller should close it).
+    """Return a psycopg2 connection (caller should close it).
 
-    Connection has autocommit disabled so callers can commit/rollback.
+    Connection has autocommit disabled so callers can commit/rollback. With
+    pooling enabled, `close()` returns it to the pool.
     """
-    dsn = get_db_dsn()
-    conn = psycopg2.connect(dsn)
-    return conn
+    if not _pool_enabled():
+        return _connect()
+    pool = get_pool()
+    return PooledConnection(pool, pool.acquire())
+
+
+@contextmanager
+def connection() -> Iterator[Any]:
+    """Borrow a connection for a `with` block (pooled unless DB_POOL_ENABLED=0)."""
+    conn = get_conn()
+    try:
+        yield conn
+    finally:
+        conn.close()
 
 
 def execute(conn, sql: str, params: Optional[Sequence[Any]] = None, fetch: bool = False):
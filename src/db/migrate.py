@@ -0,0 +1,137 @@
+"""Upgrade an existing database to the dictionary-encoded processed store.
+
+`db/init/*.sql` only runs when the Postgres volume is first created, so a
+database initialised with an older layout keeps it:
+
+- baseline: `processed.metrics_long` is a plain table with text columns;
+- yearly partitions: `processed.metrics_long` is a partitioned table;
+- SMALLINT ids: dims, `processed.metrics_fact` and `processed.metrics_summary`
+  exist but their id columns are SMALLINT.
+
+`migrate_processed` brings any of these to the current DDL in one
+transaction: the old table is renamed out of the way, the processed/analysis
+DDL is (re)applied, names are copied into the dimension tables, rows into
+`processed.metrics_fact` (yearly partitions created first), SMALLINT id
+columns are widened to INT and the series summary is rebuilt. Running it on
+an up-to-date database only re-applies the idempotent DDL, which also
+pre-creates the yearly partitions up to two years ahead.
+"""
+from __future__ import annotations
+
+import pathlib
+from typing import Dict, List
+
+from src.utils.logging import logger
+
+
+INIT_DIR = pathlib.Path(__file__).resolve().parents[2] / "db" / "init"
+DDL_FILES = ("02_create_tables_processed.sql", "03_create_views.sql")
+LEGACY_TABLE = "metrics_long_legacy"
+
+# Views that depend on processed.metrics_long or the id columns; the DDL files recreate them
+VIEWS = ("analysis.metric_missing_rate", "analysis.metric_coverage")
+
+# Legacy index names that the new DDL reuses for processed.metrics_fact
+LEGACY_INDEXES = ("processed.processed_metric_ts_idx", "processed.processed_asset_ts_idx")
+
+ID_TABLES = ("dim_asset", "dim_metric", "dim_freq", "dim_endpoint", "metrics_fact", "metrics_summary")
+
+RELKIND_SQL = (
+    "SELECT c.relkind FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace"
+    " WHERE n.nspname = 'processed' AND c.relname = %s"
+)
+
+SMALLINT_SQL = (
+    "SELECT table_name, column_name FROM information_schema.columns"
+    " WHERE table_schema = 'processed' AND table_name = ANY(%s) AND data_type = 'smallint'"
+    " AND (column_name = 'id' OR column_name LIKE '%%\\_id')"
+    " ORDER BY table_name LIKE 'dim\\_%%', table_name, column_name"
+)
+
+# (dimension table, legacy column)
+DIMS = (("dim_asset", "asset"), ("dim_metric", "metric"), ("dim_freq", "freq"), ("dim_endpoint", "source_endpoint"))
+
+DIM_FILL_SQL = (
+    "INSERT INTO processed.{dim} (name)"
+    " SELECT DISTINCT l.{col} FROM processed.{legacy} l"
+    " WHERE l.{col} IS NOT NULL"
+    " AND NOT EXISTS (SELECT 1 FROM processed.{dim} d WHERE d.name = l.{col})"
+    " ORDER BY 1"
+)
+
+YEARS_SQL = "SELECT DISTINCT extract(year FROM ts AT TIME ZONE 'UTC')::int FROM processed.{legacy} ORDER BY 1"
+
+FACT_COPY_SQL = (
+    "INSERT INTO processed.metrics_fact (asset_id, metric_id, ts, freq_id, value, is_missing, endpoint_id, ingested_at)"
+    " SELECT a.id, m.id, l.ts, q.id, l.value, l.is_missing, e.id, l.ingested_at"
+    " FROM processed.{legacy} l"
+    " JOIN processed.dim_asset a ON a.name = l.asset"
+    " JOIN processed.dim_metric m ON m.name = l.metric"
+    " JOIN processed.dim_freq q ON q.name = l.freq"
+    " LEFT JOIN processed.dim_endpoint e ON e.name = l.source_endpoint"
+    " ON CONFLICT (asset_id, metric_id, ts, freq_id) DO NOTHING"
+)
+
+
+def _relkind(cur, name: str):
+    cur.execute(RELKIND_SQL, (name,))
+    row = cur.fetchone()
+    return row[0] if row else None
+
+
+def _widen_ids(cur) -> List[str]:
+    """ALTER SMALLINT id columns (and identity sequences) to INT; returns the columns changed."""
+    cur.execute(SMALLINT_SQL, (list(ID_TABLES),))
+    columns = cur.fetchall()
+    for table, column in columns:
+        cur.execute(f"ALTER TABLE processed.{table} ALTER COLUMN {column} TYPE INT")
+        if column == "id":
+            cur.execute("SELECT pg_get_serial_sequence(%s, 'id')", (f"processed.{table}",))
+            seq = cur.fetchone()[0]
+            if seq:
+                cur.execute(f"ALTER SEQUENCE {seq} AS INT")
+    return [f"{table}.{column}" for table, column in columns]
+
+
+def migrate_processed(conn, keep_legacy: bool = False) -> Dict[str, object]:
+    """Upgrade the processed store in place (one transaction) and return what was done.
+
+    With `keep_legacy` the renamed old table stays as processed.metrics_long_legacy.
+    """
+    stats: Dict[str, object] = {"legacy": None, "widened": [], "rows": 0, "years": []}
+    with conn:
+        with conn.cursor() as cur:
+            kind = _relkind(cur, "metrics_long")
+            for view in VIEWS:
+                cur.execute(f"DROP VIEW IF EXISTS {view}")
+            if kind == "v":
+                cur.execute("DROP VIEW processed.metrics_long")
+            elif kind in ("r", "p"):
+                if _relkind(cur, LEGACY_TABLE) is not None:
+                    raise RuntimeError(f"processed.{LEGACY_TABLE} already exists; drop or rename it first")
+                cur.execute(f"ALTER TABLE processed.metrics_long RENAME TO {LEGACY_TABLE}")
+                for index in LEGACY_INDEXES:
+                    cur.execute(f"DROP INDEX IF EXISTS {index}")
+                stats["legacy"] = "partitioned" if kind == "p" else "table"
+
+            stats["widened"] = _widen_ids(cur)
+            for name in DDL_FILES:
+                cur.execute((INIT_DIR / name).read_text(encoding="utf-8"))
+
+            if stats["legacy"]:
+                for dim, col in DIMS:
+                    cur.execute(DIM_FILL_SQL.format(dim=dim, col=col, legacy=LEGACY_TABLE))
+                cur.execute(YEARS_SQL.format(legacy=LEGACY_TABLE))
+                stats["years"] = [row[0] for row in cur.fetchall()]
+                for year in stats["years"]:
+                    cur.execute("SELECT processed.ensure_metrics_partition(%s)", (year,))
+                cur.execute(FACT_COPY_SQL.format(legacy=LEGACY_TABLE))
+                stats["rows"] = cur.rowcount
+                cur.execute("SELECT processed.refresh_metrics_summary()")
+                if not keep_legacy:
+                    cur.execute(f"DROP TABLE processed.{LEGACY_TABLE}")
+    logger.info("Migrated processed store: %s", stats)
+    return stats
+
+
+__all__ = ["migrate_processed"]
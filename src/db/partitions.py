@@ -0,0 +1,80 @@
+"""Yearly partitions of processed.metrics_fact (behind the processed.metrics_long view).
+
+The table is range-partitioned on ts by calendar year (see
+db/init/02_create_tables_processed.sql). The DDL pre-creates the years from
+2009 through two years ahead, so attaching a partition (which locks the
+default partition) stays off the load path; re-running
+scripts/05_migrate_processed.py tops the range up. Loaders still call
+`ensure_partitions` with the years present in a batch before writing it,
+for years outside that range; partitions already seen in this process are
+skipped without a round-trip. A database
+initialised with an older processed layout has no processed.metrics_fact
+and must be upgraded once with scripts/05_migrate_processed.py before
+loading; `db/init/` is not re-run on an existing volume.
+"""
+from __future__ import annotations
+
+import threading
+from datetime import datetime, timezone
+from typing import Iterable, Optional, Set
+
+from src.utils.logging import logger
+
+
+_known_years: Set[int] = set()
+_supported: Optional[bool] = None
+_lock = threading.Lock()
+
+
+def years_of(timestamps: Iterable[Optional[datetime]]) -> Set[int]:
+    """Distinct UTC calendar years of aware datetimes (None ignored)."""
+    years = set()
+    for ts in timestamps:
+        if ts is None:
+            continue
+        if ts.tzinfo is not None:
+            ts = ts.astimezone(timezone.utc)
+        years.add(ts.year)
+    return years
+
+
+def _is_supported(conn) -> bool:
+    global _supported
+    if _supported is None:
+        with conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT to_regprocedure('processed.ensure_metrics_partition(integer)') IS NOT NULL")
+                _supported = bool(cur.fetchone()[0])
+        if not _supported:
+            logger.info("processed.metrics_fact is not partitioned; partition management disabled")
+    return _supported
+
+
+def ensure_partitions(conn, years: Iterable[int]) -> int:
+    """Create the yearly partitions for `years` that do not exist yet (own transaction).
+
+    Returns the number of years checked against the database.
+    """
+    with _lock:
+        missing = sorted(set(int(y) for y in years) - _known_years)
+    if not missing or not _is_supported(conn):
+        return 0
+    with conn:
+        with conn.cursor() as cur:
+            for year in missing:
+                cur.execute("SELECT processed.ensure_metrics_partition(%s)", (year,))
+                logger.debug("Partition ready: processed.%s", cur.fetchone()[0])
+    with _lock:
+        _known_years.update(missing)
+    return len(missing)
+
+
+def reset_cache() -> None:
+    """Forget known partitions (e.g. after dropping them)."""
+    global _supported
+    with _lock:
+        _known_years.clear()
+        _supported = None
+
+
+__all__ = ["ensure_partitions", "reset_cache", "years_of"]
@@ -1,4 +1,24 @@
-"""Predefined DB queries (placeholder)."""
+"""Predefined DB queries shared by the ETL steps."""
+from datetime import datetime
+from typing import Dict, Sequence, Tuple
+
 
 def sample_query():
     return "SELECT 1"
+
+
+HIGH_WATER_MARKS_SQL = (
+    "SELECT asset, metric, max(ts) FROM processed.metrics_long"
+    " WHERE freq = %s AND asset = ANY(%s) AND metric = ANY(%s)"
+    " GROUP BY asset, metric"
+)
+
+
+def get_high_water_marks(conn, assets: Sequence[str], metrics: Sequence[str], freq: str) -> Dict[Tuple[str, str], datetime]:
+    """Return {(asset, metric): max(ts)} for series already in processed.metrics_long.
+
+    Series that have never been loaded are absent from the result.
+    """
+    with conn.cursor() as cur:
+        cur.execute(HIGH_WATER_MARKS_SQL, (freq, list(assets), list(metrics)))
+        return {(r[0], r[1]): r[2] for r in cur.fetchall()}
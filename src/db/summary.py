@@ -0,0 +1,46 @@
+"""Per-series coverage summary (processed.metrics_summary).
+
+Every upsert issued by `src.etl.load` adds its per-series deltas to the
+summary in the same statement (see `src.etl.load.SUMMARY_SQL`), so
+`analysis.metric_coverage` / `analysis.metric_missing_rate` read one row
+per (asset, metric, freq) instead of aggregating processed.metrics_long.
+
+Rows deleted from the fact table are not tracked. `refresh_summary`
+rebuilds the summary with `processed.refresh_metrics_summary()`, which
+updates rows in place so readers are never blocked; `ensure_summary` does
+so only when the summary is empty but the fact table is not (data loaded
+before the summary existed).
+"""
+from __future__ import annotations
+
+from src.utils.logging import logger
+
+
+def refresh_summary(conn) -> int:
+    """Recompute processed.metrics_summary from the fact table (own transaction).
+
+    Returns the number of summary rows changed.
+    """
+    with conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT processed.refresh_metrics_summary()")
+            changed = int(cur.fetchone()[0])
+    logger.info("Refreshed processed.metrics_summary: %s series changed", changed)
+    return changed
+
+
+def ensure_summary(conn) -> bool:
+    """Backfill the summary if it is empty while facts exist; returns True if refreshed."""
+    with conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                "SELECT NOT EXISTS (SELECT 1 FROM processed.metrics_summary)"
+                " AND EXISTS (SELECT 1 FROM processed.metrics_fact)"
+            )
+            stale = bool(cur.fetchone()[0])
+    if stale:
+        refresh_summary(conn)
+    return stale
+
+
+__all__ = ["ensure_summary", "refresh_summary"]
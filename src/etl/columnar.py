@@ -0,0 +1,180 @@
+"""Columnar transform for CoinMetrics v4 asset-metrics payloads.
+
+`rows_from_payload` builds one dict per (item, metric) and parses every
+timestamp and value in Python. `columns_from_payload` instead unpivots
+`payload["data"]` into typed arrays in one pass:
+
+- ts:         datetime64[ns] (UTC)
+- value:      float64 (NaN where missing or not numeric)
+- is_missing: bool (the API returned null, or the metric was absent)
+- asset / metric: pandas Categoricals (small integer codes + categories)
+
+`MetricColumns` goes straight to `src.etl.load.load_columns`, which COPYs
+the arrays without building per-row Python objects. Note that a metric
+absent from an item is recorded as missing, same as an explicit null.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from src.config import get_cm_config
+from src.utils.logging import logger
+
+
+_NON_METRIC_KEYS = ("time", "timestamp", "asset")
+
+
+@dataclass
+class MetricColumns:
+    """Column arrays for rows of processed.metrics_long (all the same length)."""
+
+    asset: pd.Categorical
+    metric: pd.Categorical
+    ts: np.ndarray
+    value: np.ndarray
+    is_missing: np.ndarray
+    freq: str
+    source_endpoint: str
+
+    def __len__(self) -> int:
+        return len(self.ts)
+
+    def to_frame(self) -> pd.DataFrame:
+        """DataFrame in `src.etl.load.COLUMNS` order (ts is tz-aware UTC)."""
+        n = len(self)
+        return pd.DataFrame(
+            {
+                "asset": self.asset,
+                "metric": self.metric,
+                "ts": pd.DatetimeIndex(self.ts).tz_localize("UTC"),
+                "freq": pd.Categorical.from_codes(np.zeros(n, dtype=np.int8), [self.freq]),
+                "value": self.value,
+                "is_missing": self.is_missing,
+                "source_endpoint": pd.Categorical.from_codes(np.zeros(n, dtype=np.int8), [self.source_endpoint]),
+            }
+        )
+
+    def iter_rows(self) -> Iterator[Dict[str, Any]]:
+        """Row dicts as produced by `rows_from_payload` (for the row/batch loaders)."""
+        ts = pd.DatetimeIndex(self.ts).tz_localize("UTC").to_pydatetime()
+        assets = np.asarray(self.asset, dtype=object)
+        metrics = np.asarray(self.metric, dtype=object)
+        for i in range(len(self)):
+            v = self.value[i]
+            yield {
+                "asset": assets[i],
+                "metric": metrics[i],
+                "ts": ts[i],
+                "freq": self.freq,
+                "value": None if np.isnan(v) else float(v),
+                "is_missing": bool(self.is_missing[i]),
+                "source_endpoint": self.source_endpoint,
+            }
+
+
+def _default_asset(params: Any) -> Optional[str]:
+    if isinstance(params, dict):
+        assets_param = params.get("assets") or params.get("asset")
+        if isinstance(assets_param, str) and assets_param:
+            return assets_param.split(",")[0].strip()
+    return None
+
+
+def _parse_times(times: List[Any]) -> np.ndarray:
+    """ISO8601 strings -> datetime64[ns] UTC (NaT where missing or invalid)."""
+    try:
+        # Fast path for CoinMetrics' "...T00:00:00.000000000Z" (numpy parses it natively)
+        return np.array([t[:-1] if t.endswith("Z") else t for t in times], dtype="datetime64[ns]")
+    except (TypeError, ValueError, AttributeError):
+        ts = pd.to_datetime(pd.Series(times, dtype=object), utc=True, errors="coerce", format="ISO8601")
+        return ts.dt.tz_localize(None).to_numpy(dtype="datetime64[ns]")
+
+
+def _parse_values(flat: List[Any]) -> np.ndarray:
+    """Cells -> float64 (NaN for null and non-numeric cells)."""
+    nan = np.nan
+    try:
+        return np.fromiter((nan if v is None else float(v) for v in flat), dtype=np.float64, count=len(flat))
+    except (TypeError, ValueError):
+        return pd.to_numeric(pd.Series(flat, dtype=object), errors="coerce").to_numpy(dtype=np.float64)
+
+
+def columns_from_payload(
+    payload: Any,
+    params: Any,
+    endpoint: str,
+    rid: Any = None,
+    default_freq: Optional[str] = None,
+) -> Optional[MetricColumns]:
+    """Unpivot a v4 payload (one item per time, metric columns) into `MetricColumns`.
+
+    Returns None when the payload is empty or in the stub format (one item
+    per asset/metric/time); callers then fall back to `rows_from_payload`.
+    Items without a parseable time are dropped.
+    """
+    data_list = payload.get("data") if isinstance(payload, dict) else None
+    if not data_list or not isinstance(data_list, list):
+        return None
+    first = data_list[0]
+    if not isinstance(first, dict) or ("metric" in first and "value" in first):
+        return None
+
+    params = params or {}
+    freq = None
+    if isinstance(params, dict):
+        freq = params.get("frequency") or params.get("freq")
+    freq = freq or default_freq or get_cm_config().get("frequency", "1d")
+
+    items = [item for item in data_list if isinstance(item, dict)]
+    ts = _parse_times([item.get("time") or item.get("timestamp") for item in items])
+    ok = ~np.isnat(ts)
+    if not ok.all():
+        logger.error("Dropping %s items with missing/invalid time in raw id=%s", int((~ok).sum()), rid)
+        items = [item for item, keep in zip(items, ok) if keep]
+        ts = ts[ok]
+
+    # Metric columns in order of first appearance (items may not all carry every metric)
+    metric_names: List[str] = [k for k in dict.fromkeys(k for item in items for k in item) if k not in _NON_METRIC_KEYS]
+    n_items, n_metrics = len(items), len(metric_names)
+    if n_items == 0 or n_metrics == 0:
+        return None
+
+    # Row-major unpivot: item 0 metric 0, item 0 metric 1, ... (same order as rows_from_payload)
+    flat = [item.get(m) for item in items for m in metric_names]
+    missing = np.fromiter((v is None for v in flat), dtype=bool, count=len(flat))
+    values = _parse_values(flat)
+
+    default_asset = _default_asset(params)
+    asset_cat = pd.Categorical([item.get("asset") or default_asset for item in items])
+
+    return MetricColumns(
+        asset=pd.Categorical.from_codes(np.repeat(asset_cat.codes, n_metrics), asset_cat.categories),
+        metric=pd.Categorical.from_codes(np.tile(np.arange(n_metrics, dtype=np.int32), n_items), metric_names),
+        ts=np.repeat(ts, n_metrics),
+        value=values,
+        is_missing=missing,
+        freq=str(freq),
+        source_endpoint=endpoint,
+    )
+
+
+def columns_from_rows(rows: List[Dict[str, Any]], freq: Optional[str] = None, endpoint: Optional[str] = None) -> MetricColumns:
+    """Build `MetricColumns` from row dicts (used for stub payloads)."""
+    df = pd.DataFrame.from_records(rows, columns=["asset", "metric", "ts", "freq", "value", "is_missing", "source_endpoint"])
+    ts = pd.to_datetime(df["ts"], utc=True)
+    return MetricColumns(
+        asset=pd.Categorical(df["asset"]),
+        metric=pd.Categorical(df["metric"]),
+        ts=ts.dt.tz_localize(None).to_numpy(dtype="datetime64[ns]"),
+        value=pd.to_numeric(df["value"], errors="coerce").to_numpy(dtype=np.float64),
+        is_missing=df["is_missing"].fillna(False).to_numpy(dtype=bool),
+        freq=freq or (str(df["freq"].iloc[0]) if len(df) else "1d"),
+        source_endpoint=endpoint or (str(df["source_endpoint"].iloc[0]) if len(df) else ""),
+    )
+
+
+__all__ = ["MetricColumns", "columns_from_payload", "columns_from_rows"]
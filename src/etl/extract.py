@@ -1,251 +1,909 @@
-"""ETL extract step: minimal implementation that writes a simulated
-CoinMetrics API response into `raw.api_responses`.
+"""ETL extract step: write CoinMetrics API responses into `raw.api_responses`.
 
-This module intentionally implements only the `extract` (raw write)
-functionality for course delivery. It does not call the real API.
+With `COINMETRICS_API_KEY` set, the catalog and the asset-metrics timeseries
+are fetched from the real API (following `next_page_url`). Without a key a
+simulated stub payload is written instead.
+
+`run_extract` keeps the original single-asset behaviour; `run_extract_all`
+fans out over every asset in `CM_ASSETS` with a bounded thread pool and
+writes one raw row per asset. `run_extract_all_async` does the same on
+asyncio with a pooled `AsyncCoinMetricsClient` and prefetched pages.
+
+With `CM_RAW_STORAGE=pages` pages are stored once, compressed, in
+`raw.api_pages` and the timeseries row is a manifest (see `raw_store`).
 """
+import asyncio
+import contextlib
 import json
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
 
 from src.config import get_cm_config
-from src.db.engine import get_conn
+from src.db.engine import check_pool_size, get_conn
+from src.etl.raw_store import manifest_payload, raw_storage_mode, store_page
+from src.utils import jsonlib
 from src.utils.logging import logger
-import psycopg2.extras
 
 
-def run_extract() -> int:
-    """Construct a simulated payload and insert into raw.api_responses.
+RAW_INSERT_SQL = (
+    "INSERT INTO raw.api_responses (endpoint, params, status_code, payload)"
+    " VALUES (%s, %s, %s, %s) RETURNING id"
+)
+
+
+def _normalize_csv(value):
+    """Normalize comma-separated params (also accepts lists and ';')."""
+    if value is None:
+        return None
+    if isinstance(value, (list, tuple)):
+        return ",".join([str(v).strip() for v in value if v is not None])
+    s = str(value)
+    # replace semicolons with commas, remove extra spaces
+    s = s.replace(";", ",")
+    parts = [p.strip() for p in s.split(",") if p.strip()]
+    return ",".join(parts)
+
+
+def _insert_raw(conn, endpoint: str, params, status: int, payload) -> int:
+    """Insert one raw.api_responses row in its own transaction and return its id."""
+    with conn:
+        with conn.cursor() as cur:
+            cur.execute(RAW_INSERT_SQL, (endpoint, jsonlib.pg_json(params), status, jsonlib.pg_json(payload)))
+            return cur.fetchone()[0]
+
+
+def _error_status_payload(exc: Exception):
+    """Return (status, error_payload) for an exception, using CoinMetricsError details if present."""
+    from src.coinmetrics.client import CoinMetricsError
+
+    if isinstance(exc, CoinMetricsError):
+        return getattr(exc, "status_code", None) or 500, getattr(exc, "error_payload", str(exc))
+    return 500, str(exc)
+
+
+def _store_catalog(client, conn):
+    """Fetch catalog/assets and store it (or the error) in raw.api_responses.
+
+    Returns (raw id, catalog payload or None on error).
+    """
+    from src.coinmetrics.endpoints import fetch_assets
+
+    # Fetch and store catalog/assets (no 'limit' param sent)
+    try:
+        catalog_json = fetch_assets(client)
+        cid = _insert_raw(conn, "catalog/assets", {}, 200, catalog_json)
+        logger.info("Inserted catalog raw response id=%s status=%s", cid, 200)
+        return cid, catalog_json
+    except Exception as exc:
+        # Capture structured error if available
+        status, err_payload = _error_status_payload(exc)
+        cid = _insert_raw(conn, "catalog/assets", {}, status, {"error": err_payload})
+        logger.info("Inserted catalog error raw response id=%s status=%s", cid, status)
+        return cid, None
+
+
+def _availability_index(conn, catalog_json):
+    """Build the catalog availability index (empty = no pruning).
+
+    Falls back to the newest successful catalog row in raw.api_responses
+    when this run's catalog fetch failed.
+    """
+    from src.coinmetrics.catalog import build_availability_index
+
+    if str(get_cm_config().get("use_catalog_index", "1")).lower() in ("0", "false", "no", ""):
+        return {}
+    if catalog_json is None:
+        try:
+            with conn.cursor() as cur:
+                cur.execute(
+                    "SELECT payload FROM raw.api_responses WHERE endpoint=%s AND status_code=200 ORDER BY id DESC LIMIT 1",
+                    ("catalog/assets",),
+                )
+                found = cur.fetchone()
+            conn.rollback()
+            catalog_json = found[0] if found else None
+        except Exception as exc:
+            logger.warning("Could not load stored catalog: %s", exc)
+            catalog_json = None
+    index = build_availability_index(catalog_json) if catalog_json else {}
+    logger.info("Catalog availability index: %s assets", len(index))
+    return index
+
+
+def _timeseries_window(cm: Dict[str, str]):
+    """Return (start_t, end_t, freq) from config, normalized to ISO8601 UTC."""
+    from src.coinmetrics.client import normalize_time
+
+    start = cm.get("start_date")
+    end = cm.get("end_date")
+    # Normalize times for request params (convert YYYY-MM-DD -> ISO8601 UTC)
+    try:
+        start_t = normalize_time(start)
+    except Exception:
+        start_t = start
+    try:
+        end_t = normalize_time(end)
+    except Exception:
+        end_t = end
+    return start_t, end_t, cm.get("frequency")
+
+
+def _page_data(j) -> List[dict]:
+    """Return the `data` list of a page payload (empty list if absent)."""
+    if not isinstance(j, dict):
+        return []
+    d = j.get("data")
+    return d if isinstance(d, list) else []
+
+
+def _asset_ts_params(asset: str, metrics_str: str, start_t: str, end_t: str, freq: str) -> Dict[str, str]:
+    return {
+        "assets": asset,
+        "metrics": metrics_str,
+        "frequency": freq,
+        "start_time": start_t,
+        "end_time": end_t,
+    }
+
+
+def _record_page(conn, asset: str, ts_params: Dict[str, str], page_index: int, page_json, page_ids: Optional[List[int]] = None) -> List[dict]:
+    """Log one fetched page, store it and return its data list.
+
+    With `page_ids` (raw storage mode "pages") the page is stored once,
+    compressed, in raw.api_pages and its id appended to `page_ids`;
+    otherwise a JSONB audit row is written to raw.api_responses.
+    """
+    page_data = _page_data(page_json)
+    n_rows = len(page_data)
+    first_time = None
+    last_time = None
+    if n_rows:
+        first_time = page_data[0].get("time") or page_data[0].get("timestamp")
+        last_time = page_data[-1].get("time") or page_data[-1].get("timestamp")
+
+    logger.info("asset-metrics asset=%s page=%s, n_rows=%s, first_time=%s, last_time=%s", asset, page_index, n_rows, first_time, last_time)
+
+    if page_ids is not None:
+        page_ids.append(store_page(conn, page_json))
+        return page_data
+
+    # Optional audit insert per page
+    try:
+        audit_params = dict(ts_params)
+        audit_params["page"] = page_index
+        _insert_raw(conn, "timeseries/asset-metrics(page)", audit_params, 200, page_json)
+    except Exception:
+        logger.debug("Failed to write per-page audit row for asset %s page %s", asset, page_index)
+    return page_data
+
+
+def _store_merged(conn, asset: str, ts_params: Dict[str, str], first_page, all_data: List[dict], total_pages: int) -> int:
+    """Write the merged payload of all pages as the official timeseries row."""
+    merged = dict(first_page) if isinstance(first_page, dict) else {"data": []}
+    merged["data"] = all_data
+    # clear pagination marker to indicate merged completeness
+    merged["next_page_url"] = ""
+    merged["next_page_token"] = None
+
+    logger.info("asset-metrics completed: asset=%s total_pages=%s, total_rows=%s", asset, total_pages, len(all_data))
+
+    inserted = _insert_raw(conn, "timeseries/asset-metrics", ts_params, 200, merged)
+    logger.info("Inserted merged timeseries raw response id=%s asset=%s (pages=%s rows=%s)", inserted, asset, total_pages, len(all_data))
+    return inserted
+
+
+def _store_manifest(conn, asset: str, ts_params: Dict[str, str], page_ids: List[int], total_rows: int) -> int:
+    """Write the manifest row (ordered page ids) as the official timeseries row."""
+    logger.info("asset-metrics completed: asset=%s total_pages=%s, total_rows=%s (stored %s distinct pages)", asset, len(page_ids), total_rows, len(set(page_ids)))
+    inserted = _insert_raw(conn, "timeseries/asset-metrics", ts_params, 200, manifest_payload(page_ids, total_rows))
+    logger.info("Inserted timeseries manifest raw response id=%s asset=%s", inserted, asset)
+    return inserted
+
+
+def _ingest_page(conn, asset: str, ts_params: Dict[str, str], page_index: int, page_json) -> int:
+    """Stream mode: parse one page and upsert it into processed.metrics_long right away.
+
+    Returns the number of metric rows upserted.
+    """
+    from src.config import get_transform_config
+    from src.etl.load import upsert_metrics
+    from src.etl.transform import rows_from_payload
+
+    rid = f"{asset}:page{page_index}"
+    if get_transform_config()["engine"] == "columnar":
+        from src.etl.columnar import columns_from_payload
+        from src.etl.load import load_columns
+
+        cols = columns_from_payload(page_json, ts_params, "timeseries/asset-metrics", rid=rid)
+        if cols is not None:
+            stats = load_columns(cols, conn=conn)
+            return stats["inserted"] + stats["updated"]
+
+    rows = rows_from_payload(page_json, ts_params, "timeseries/asset-metrics", rid=rid)
+    return upsert_metrics(rows, conn=conn) if rows else 0
+
+
+def _store_stream_summary(conn, asset: str, ts_params: Dict[str, str], total_pages: int, total_items: int, total_points: int, page_ids: Optional[List[int]] = None) -> int:
+    """Stream mode: record a small summary row instead of the merged payload."""
+    logger.info("asset-metrics streamed: asset=%s total_pages=%s, total_rows=%s, points=%s", asset, total_pages, total_items, total_points)
+    summary = {"pages": total_pages, "rows": total_items, "points_upserted": total_points}
+    if page_ids is not None:
+        summary["page_ids"] = page_ids
+    inserted = _insert_raw(conn, "timeseries/asset-metrics(stream)", ts_params, 200, summary)
+    logger.info("Inserted stream summary raw response id=%s asset=%s", inserted, asset)
+    return inserted
+
+
+def _store_timeseries_error(conn, asset: str, ts_params: Dict[str, str], exc: Exception) -> int:
+    """Write the error payload into raw.api_responses for diagnostics."""
+    from src.coinmetrics.client import CoinMetricsError
+
+    if not isinstance(exc, CoinMetricsError):
+        logger.error("Unexpected error calling timeseries pagination for asset %s: %s", asset, exc)
+    status, err_payload = _error_status_payload(exc)
+    inserted = _insert_raw(conn, "timeseries/asset-metrics", ts_params, status, {"error": err_payload})
+    logger.info("Inserted timeseries error raw response id=%s asset=%s status=%s", inserted, asset, status)
+    return inserted
+
+
+def _int_or_none(value) -> Optional[int]:
+    try:
+        return int(value) if value not in (None, "") else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _window_client(client):
+    """New sync client for a window worker: same key/limiter/stats, own HTTP session."""
+    from src.coinmetrics.client import CoinMetricsClient
+
+    return CoinMetricsClient(
+        api_key=client.api_key,
+        base_url=client.base_url,
+        timeout=client.timeout,
+        rate_limiter=client.rate_limiter,
+        retry_policy=client.retry_policy,
+        stats=client.stats,
+        cache=client.cache,
+    )
+
+
+def _fetch_window_pages(client, asset: str, metrics: List[str], w_start: str, w_end: str, freq: str, page_size: Optional[int]) -> List[dict]:
+    """Fetch every page of one sub-window (runs in a worker thread)."""
+    wclient = _window_client(client)
+    try:
+        return list(wclient.iter_asset_metrics_pages(asset, metrics, w_start, w_end, freq, page_size=page_size))
+    finally:
+        wclient.session.close()
+
+
+def _ingest_window(client, asset: str, ts_params: Dict[str, str], metrics: List[str], w_index: int, w_start: str, w_end: str, freq: str, page_size: Optional[int]):
+    """Stream mode worker: fetch one sub-window and upsert each page with its own connection.
+
+    Returns (pages, items, points, page_ids or None).
+    """
+    wclient = _window_client(client)
+    conn = get_conn()
+    pages = items = points = 0
+    page_ids = [] if raw_storage_mode() == "pages" else None
+    try:
+        w_params = dict(ts_params, window=w_index, window_start=w_start, window_end=w_end)
+        for page_json in wclient.iter_asset_metrics_pages(asset, metrics, w_start, w_end, freq, page_size=page_size):
+            pages += 1
+            items += len(_record_page(conn, asset, w_params, pages, page_json, page_ids))
+            points += _ingest_page(conn, asset, w_params, pages, page_json)
+        return pages, items, points, page_ids
+    finally:
+        try:
+            conn.close()
+        except Exception:
+            pass
+        wclient.session.close()
+
+
+def _stitch_window_data(window_pages: List[List[dict]]) -> List[dict]:
+    """Concatenate window pages in window order, dropping repeated (asset, time) items.
+
+    Adjacent windows share their boundary timestamp, so the first
+    occurrence is kept and the copy from the next window is dropped.
+    """
+    seen = set()
+    out: List[dict] = []
+    for pages in window_pages:
+        for page in pages:
+            for item in _page_data(page):
+                if isinstance(item, dict):
+                    key = (item.get("asset"), item.get("metric"), item.get("time") or item.get("timestamp"))
+                    if key in seen:
+                        continue
+                    seen.add(key)
+                out.append(item)
+    return out
+
+
+def _extract_asset_metrics_sharded(client, conn, asset: str, metrics_str: str, start_t: str, end_t: str, freq: str, windows, page_size: Optional[int], max_workers: int, stream: bool = False) -> int:
+    """Fetch one asset over several sub-windows concurrently and store the result.
+
+    Without `stream` the pages are written as audit rows and stitched into
+    one merged row in window order (deterministic regardless of which
+    window finished first). With `stream` each window worker upserts its
+    pages directly and a summary row is written.
+    """
+    ts_params = _asset_ts_params(asset, metrics_str, start_t, end_t, freq)
+    ts_params["windows"] = len(windows)
+    metrics = [m.strip() for m in metrics_str.split(",") if m.strip()]
+    max_workers = max(1, min(max_workers, len(windows)))
+    logger.info("asset-metrics asset=%s split into %s windows (workers=%s, page_size=%s)", asset, len(windows), max_workers, page_size)
+
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"window-{asset}") as pool:
+            if stream:
+                futures = [
+                    pool.submit(_ingest_window, client, asset, ts_params, metrics, i, w_start, w_end, freq, page_size)
+                    for i, (w_start, w_end) in enumerate(windows)
+                ]
+                totals = [f.result() for f in futures]
+                return _store_stream_summary(
+                    conn,
+                    asset,
+                    ts_params,
+                    sum(t[0] for t in totals),
+                    sum(t[1] for t in totals),
+                    sum(t[2] for t in totals),
+                    page_ids=[pid for t in totals for pid in t[3]] if raw_storage_mode() == "pages" else None,
+                )
+
+            futures = [
+                pool.submit(_fetch_window_pages, client, asset, metrics, w_start, w_end, freq, page_size)
+                for (w_start, w_end) in windows
+            ]
+            # Collect in submission (= time) order, not completion order
+            window_pages = [f.result() for f in futures]
+
+        return _store_window_pages(conn, asset, ts_params, windows, window_pages)
+    except Exception as exc:
+        return _store_timeseries_error(conn, asset, ts_params, exc)
+
+
+def _store_window_pages(conn, asset: str, ts_params: Dict[str, str], windows, window_pages: List[List[dict]]) -> int:
+    """Write the pages of every window as audit rows, then the stitched merged (or manifest) row."""
+    page_index = 0
+    first_page = None
+    page_ids = [] if raw_storage_mode() == "pages" else None
+    for i, pages in enumerate(window_pages):
+        w_params = dict(ts_params, window=i, window_start=windows[i][0], window_end=windows[i][1])
+        for page_json in pages:
+            page_index += 1
+            if first_page is None:
+                first_page = page_json
+            _record_page(conn, asset, w_params, page_index, page_json, page_ids)
+
+    all_data = _stitch_window_data(window_pages)
+    if page_ids is not None:
+        return _store_manifest(conn, asset, ts_params, page_ids, len(all_data))
+    return _store_merged(conn, asset, ts_params, first_page, all_data, page_index)
+
+
+def _asset_windows(start_t: str, end_t: str):
+    """(windows, max_workers) for `CM_WINDOW_SPAN`; windows is empty when the range is not split."""
+    from src.utils.time import split_window
+
+    cm = get_cm_config()
+    span = cm.get("window_span")
+    if not span:
+        return [], 0
+    try:
+        windows = split_window(start_t, end_t, span)
+    except ValueError as exc:
+        logger.warning("Ignoring CM_WINDOW_SPAN: %s", exc)
+        return [], 0
+    if len(windows) < 2:
+        return [], 0
+    return windows, _int_or_none(cm.get("window_concurrency")) or 4
+
+
+def _extract_asset_metrics(client, conn, asset: str, metrics_str: str, start_t: str, end_t: str, freq: str, stream: bool = False) -> int:
+    """Fetch all pages of asset-metrics for one asset and store them.
+
+    Every page is written as a `timeseries/asset-metrics(page)` audit row.
+    By default the merged payload is then written as the official
+    `timeseries/asset-metrics` row. With `stream=True` each page is instead
+    parsed and upserted into processed.metrics_long as soon as it arrives
+    and only a `timeseries/asset-metrics(stream)` summary row is written, so
+    memory stays bounded by one page.
+    When `CM_WINDOW_SPAN` is set and the range spans several windows, the
+    fetch is sharded by time window (see `_extract_asset_metrics_sharded`).
+    On failure an error row is written instead. Returns the inserted id.
+    """
+    page_size = _int_or_none(get_cm_config().get("page_size"))
+    windows, max_workers = _asset_windows(start_t, end_t)
+    if windows:
+        return _extract_asset_metrics_sharded(client, conn, asset, metrics_str, start_t, end_t, freq, windows, page_size, max_workers, stream=stream)
+
+    ts_params = _asset_ts_params(asset, metrics_str, start_t, end_t, freq)
+
+    # Call timeseries endpoint and support pagination (merge pages)
+    try:
+        first_page = None
+        all_data = []
+        total_items = 0
+        total_points = 0
+        page_index = 0
+        page_ids = [] if raw_storage_mode() == "pages" else None
+
+        # Iterate pages: the client follows next_page_url (rate limit, retries, cache)
+        metrics = [m.strip() for m in metrics_str.split(",") if m.strip()]
+        for page_json in client.iter_asset_metrics_pages(asset, metrics, start_t, end_t, freq, page_size=page_size):
+            page_index += 1
+            if first_page is None:
+                first_page = page_json
+            page_data = _record_page(conn, asset, ts_params, page_index, page_json, page_ids)
+            total_items += len(page_data)
+            if stream:
+                total_points += _ingest_page(conn, asset, ts_params, page_index, page_json)
+            elif page_ids is None:
+                all_data.extend(page_data)
+
+        if stream:
+            return _store_stream_summary(conn, asset, ts_params, page_index, total_items, total_points, page_ids=page_ids)
+        if page_ids is not None:
+            return _store_manifest(conn, asset, ts_params, page_ids, total_items)
+        return _store_merged(conn, asset, ts_params, first_page, all_data, page_index)
+    except Exception as exc:
+        return _store_timeseries_error(conn, asset, ts_params, exc)
+
+
+async def _extract_asset_metrics_async(client, conn, asset: str, metrics_str: str, start_t: str, end_t: str, freq: str, stream: bool = False) -> int:
+    """Async counterpart of `_extract_asset_metrics` using `AsyncCoinMetricsClient`.
+
+    The client prefetches page N+1 while page N is written to the DB; the
+    blocking psycopg2 calls run in the default executor so they do not
+    stall the event loop. `CM_WINDOW_SPAN` shards the range as in the sync
+    path (see `_extract_asset_metrics_sharded_async`).
+    """
+    loop = asyncio.get_running_loop()
+    page_size = _int_or_none(get_cm_config().get("page_size"))
+    windows, max_workers = _asset_windows(start_t, end_t)
+    if windows:
+        return await _extract_asset_metrics_sharded_async(client, conn, asset, metrics_str, start_t, end_t, freq, windows, page_size, max_workers, stream=stream)
+
+    ts_params = _asset_ts_params(asset, metrics_str, start_t, end_t, freq)
+    metrics = [m.strip() for m in metrics_str.split(",") if m.strip()]
+
+    try:
+        first_page = None
+        all_data: List[dict] = []
+        total_items = 0
+        total_points = 0
+        page_index = 0
+        page_ids = [] if raw_storage_mode() == "pages" else None
+        async with contextlib.aclosing(client.iter_asset_metrics_pages(asset, metrics, start_t, end_t, freq, page_size=page_size)) as pages:
+            async for page_json in pages:
+                page_index += 1
+                if first_page is None:
+                    first_page = page_json
+                page_data = await loop.run_in_executor(None, _record_page, conn, asset, ts_params, page_index, page_json, page_ids)
+                total_items += len(page_data)
+                if stream:
+                    total_points += await loop.run_in_executor(None, _ingest_page, conn, asset, ts_params, page_index, page_json)
+                elif page_ids is None:
+                    all_data.extend(page_data)
+
+        if stream:
+            return await loop.run_in_executor(None, _store_stream_summary, conn, asset, ts_params, page_index, total_items, total_points, page_ids)
+        if page_ids is not None:
+            return await loop.run_in_executor(None, _store_manifest, conn, asset, ts_params, page_ids, total_items)
+        return await loop.run_in_executor(None, _store_merged, conn, asset, ts_params, first_page, all_data, page_index)
+    except Exception as exc:
+        return await loop.run_in_executor(None, _store_timeseries_error, conn, asset, ts_params, exc)
+
+
+async def _fetch_window_pages_async(client, asset: str, metrics: List[str], w_start: str, w_end: str, freq: str, page_size: Optional[int]) -> List[dict]:
+    """Fetch every page of one sub-window over the shared async client."""
+    async with contextlib.aclosing(client.iter_asset_metrics_pages(asset, metrics, w_start, w_end, freq, page_size=page_size)) as pages:
+        return [page async for page in pages]
+
+
+async def _ingest_window_async(client, asset: str, ts_params: Dict[str, str], metrics: List[str], w_index: int, w_start: str, w_end: str, freq: str, page_size: Optional[int]):
+    """Async counterpart of `_ingest_window`: own DB connection, pages upserted in the executor."""
+    loop = asyncio.get_running_loop()
+    conn = await loop.run_in_executor(None, get_conn)
+    pages = items = points = 0
+    page_ids = [] if raw_storage_mode() == "pages" else None
+    try:
+        w_params = dict(ts_params, window=w_index, window_start=w_start, window_end=w_end)
+        async with contextlib.aclosing(client.iter_asset_metrics_pages(asset, metrics, w_start, w_end, freq, page_size=page_size)) as page_iter:
+            async for page_json in page_iter:
+                pages += 1
+                items += len(await loop.run_in_executor(None, _record_page, conn, asset, w_params, pages, page_json, page_ids))
+                points += await loop.run_in_executor(None, _ingest_page, conn, asset, w_params, pages, page_json)
+        return pages, items, points, page_ids
+    finally:
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+async def _extract_asset_metrics_sharded_async(client, conn, asset: str, metrics_str: str, start_t: str, end_t: str, freq: str, windows, page_size: Optional[int], max_workers: int, stream: bool = False) -> int:
+    """Async counterpart of `_extract_asset_metrics_sharded`.
+
+    At most `max_workers` windows are fetched at once over the shared
+    client session; results are stored in window order.
+    """
+    loop = asyncio.get_running_loop()
+    ts_params = _asset_ts_params(asset, metrics_str, start_t, end_t, freq)
+    ts_params["windows"] = len(windows)
+    metrics = [m.strip() for m in metrics_str.split(",") if m.strip()]
+    max_workers = max(1, min(max_workers, len(windows)))
+    logger.info("asset-metrics asset=%s split into %s windows (workers=%s, page_size=%s)", asset, len(windows), max_workers, page_size)
+    slots = asyncio.Semaphore(max_workers)
+
+    async def bounded(fn, *args):
+        async with slots:
+            return await fn(*args)
+
+    try:
+        if stream:
+            totals = await asyncio.gather(*(
+                bounded(_ingest_window_async, client, asset, ts_params, metrics, i, w_start, w_end, freq, page_size)
+                for i, (w_start, w_end) in enumerate(windows)
+            ))
+            page_ids = [pid for t in totals for pid in t[3]] if raw_storage_mode() == "pages" else None
+            return await loop.run_in_executor(
+                None,
+                _store_stream_summary,
+                conn,
+                asset,
+                ts_params,
+                sum(t[0] for t in totals),
+                sum(t[1] for t in totals),
+                sum(t[2] for t in totals),
+                page_ids,
+            )
 
-    Returns the inserted id.
+        # gather keeps submission (= time) order, not completion order
+        window_pages = await asyncio.gather(*(
+            bounded(_fetch_window_pages_async, client, asset, metrics, w_start, w_end, freq, page_size)
+            for (w_start, w_end) in windows
+        ))
+        return await loop.run_in_executor(None, _store_window_pages, conn, asset, ts_params, windows, list(window_pages))
+    except Exception as exc:
+        return await loop.run_in_executor(None, _store_timeseries_error, conn, asset, ts_params, exc)
+
+
+def _plan_incremental(conn, asset: str, metrics_str: str, start_t: str, end_t: str, freq: str) -> List[tuple]:
+    """Split an asset's request into (metrics_str, start) groups using high-water marks.
+
+    Metrics never loaded for (asset, freq) keep the configured start (full
+    fetch). Metrics already loaded are requested from their oldest
+    max(ts) minus `CM_INCREMENTAL_OVERLAP`, so late revisions are picked up.
+    """
+    from src.db.queries import get_high_water_marks
+    from src.utils.time import format_utc, parse_utc, span_to_timedelta
+
+    metrics = [m.strip() for m in metrics_str.split(",") if m.strip()]
+    overlap = timedelta(0)
+    overlap_s = get_cm_config().get("incremental_overlap")
+    if overlap_s:
+        try:
+            overlap = span_to_timedelta(overlap_s)
+        except ValueError as exc:
+            logger.warning("Invalid CM_INCREMENTAL_OVERLAP, using no overlap: %s", exc)
+
+    hwm = get_high_water_marks(conn, [asset], metrics, freq)
+    unseen = [m for m in metrics if (asset, m) not in hwm]
+    seen = [m for m in metrics if (asset, m) in hwm]
+
+    groups = []
+    if unseen:
+        groups.append((",".join(unseen), start_t))
+    if seen:
+        since = min(hwm[(asset, m)] for m in seen) - overlap
+        start_dt = max(since, parse_utc(start_t))
+        if start_dt <= parse_utc(end_t):
+            groups.append((",".join(seen), format_utc(start_dt)))
+    logger.info("Incremental plan asset=%s freq=%s: %s (high-water marks: %s)", asset, freq, groups, {m: hwm.get((asset, m)) for m in seen})
+    return groups
+
+
+def _apply_availability(availability, asset: str, metrics_str: str, start_t: str, end_t: str, freq: str):
+    """Prune/clamp a request with the catalog index; returns (metrics_str, start, end) or None."""
+    from src.coinmetrics.catalog import plan_asset_request
+
+    if not availability:
+        return metrics_str, start_t, end_t
+    metrics = [m.strip() for m in metrics_str.split(",") if m.strip()]
+    try:
+        planned = plan_asset_request(availability, asset, metrics, freq, start_t, end_t)
+    except ValueError as exc:
+        logger.warning("Could not apply catalog index for %s: %s", asset, exc)
+        return metrics_str, start_t, end_t
+    if planned is None:
+        return None
+    kept, start_t, end_t = planned
+    return ",".join(kept), start_t, end_t
+
+
+def _extract_asset(client, conn, asset: str, metrics_str: str, start_t: str, end_t: str, freq: str, stream: bool = False, incremental: bool = False, availability=None) -> Optional[int]:
+    """Extract one asset, either for the full window or incrementally.
+
+    With an `availability` index the request is first pruned to metrics the
+    asset publishes at `freq` and its start clamped to their first available time.
+    Returns the last inserted raw id (None if there was nothing to fetch).
+    """
+    planned = _apply_availability(availability, asset, metrics_str, start_t, end_t, freq)
+    if planned is None:
+        return None
+    metrics_str, start_t, end_t = planned
+
+    if not incremental:
+        return _extract_asset_metrics(client, conn, asset, metrics_str, start_t, end_t, freq, stream=stream)
+
+    inserted = None
+    for group_metrics, group_start in _plan_incremental(conn, asset, metrics_str, start_t, end_t, freq):
+        inserted = _extract_asset_metrics(client, conn, asset, group_metrics, group_start, end_t, freq, stream=stream)
+    return inserted
+
+
+async def _extract_asset_async(client, conn, asset: str, metrics_str: str, start_t: str, end_t: str, freq: str, stream: bool = False, incremental: bool = False, availability=None) -> Optional[int]:
+    """Async counterpart of `_extract_asset`."""
+    planned = _apply_availability(availability, asset, metrics_str, start_t, end_t, freq)
+    if planned is None:
+        return None
+    metrics_str, start_t, end_t = planned
+
+    if not incremental:
+        return await _extract_asset_metrics_async(client, conn, asset, metrics_str, start_t, end_t, freq, stream=stream)
+
+    loop = asyncio.get_running_loop()
+    groups = await loop.run_in_executor(None, _plan_incremental, conn, asset, metrics_str, start_t, end_t, freq)
+    inserted = None
+    for group_metrics, group_start in groups:
+        inserted = await _extract_asset_metrics_async(client, conn, asset, group_metrics, group_start, end_t, freq, stream=stream)
+    return inserted
+
+
+def _extract_stub(conn, cm: Dict[str, str]) -> int:
+    """Write the simulated stub payload (no API key configured)."""
+    params = {
+        "assets": cm.get("assets"),
+        "metrics": cm.get("metrics"),
+        "start_date": cm.get("start_date"),
+        "end_date": cm.get("end_date"),
+        "frequency": cm.get("frequency"),
+    }
+    payload = {
+        "data": [
+            {
+                "asset": "btc",
+                "metric": "PriceUSD",
+                "time": "2013-01-01T00:00:00Z",
+                "value": 13.5,
+            }
+        ],
+        "meta": {"note": "stub for step2.2"},
+    }
+    inserted = _insert_raw(conn, "timeseries.stub", params, 200, payload)
+    logger.info("Inserted stub raw.api_responses id=%s", inserted)
+    return inserted
+
+
+def run_extract(stream: bool = False, incremental: bool = False) -> int:
+    """Fetch the catalog and the first configured asset into raw.api_responses.
+
+    With `stream=True` pages are loaded into processed.metrics_long as they
+    arrive (see `_extract_asset_metrics`). With `incremental=True` only data
+    after each series' high-water mark is requested (see `_plan_incremental`).
+    Falls back to a simulated stub payload when no API key is configured.
+    Returns the inserted timeseries id.
     """
     cm = get_cm_config()
 
     from src.config import COINMETRICS_API_KEY
-    sql = (
-        "INSERT INTO raw.api_responses (endpoint, params, status_code, payload)"
-        " VALUES (%s, %s, %s, %s) RETURNING id"
-    )
 
-    # Helper to normalize comma-separated params
-    def _normalize_csv(value):
-        if value is None:
-            return None
-        if isinstance(value, (list, tuple)):
-            return ",".join([str(v).strip() for v in value if v is not None])
-        s = str(value)
-        # replace semicolons with commas, remove extra spaces
-        s = s.replace(";", ",")
-        parts = [p.strip() for p in s.split(",") if p.strip()]
-        return ",".join(parts)
+    conn = get_conn()
+    try:
+        if not COINMETRICS_API_KEY:
+            # Stub behavior (no API key)
+            return _extract_stub(conn, cm)
+
+        # Use real API: first write catalog/assets response
+        from src.coinmetrics.client import CoinMetricsClient
+
+        client = CoinMetricsClient(api_key=COINMETRICS_API_KEY)
+        _, catalog_json = _store_catalog(client, conn)
+        availability = _availability_index(conn, catalog_json)
 
+        # Prepare timeseries params
+        assets_str = _normalize_csv(cm.get("assets")) or ""
+        metrics_str = _normalize_csv(cm.get("metrics")) or ""
+        # Use first asset for now
+        first_asset = assets_str.split(",")[0] if assets_str else ""
+        start_t, end_t, freq = _timeseries_window(cm)
+
+        inserted = _extract_asset(client, conn, first_asset, metrics_str, start_t, end_t, freq, stream=stream, incremental=incremental, availability=availability)
+        logger.info("CoinMetrics request stats: %s", client.stats.snapshot())
+        return inserted
+    finally:
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+def _extract_one_asset(asset: str, metrics_str: str, start_t: str, end_t: str, freq: str, stats=None, stream: bool = False, incremental: bool = False, availability=None) -> Optional[int]:
+    """Worker for `run_extract_all`: own client and connection per asset.
+
+    The rate limiter is shared process-wide; `stats` is shared across workers.
+    """
+    from src.config import COINMETRICS_API_KEY
+    from src.coinmetrics.client import CoinMetricsClient
+
+    client = CoinMetricsClient(api_key=COINMETRICS_API_KEY, stats=stats)
     conn = get_conn()
     try:
-        if COINMETRICS_API_KEY:
-            # Use real API: first write catalog/assets response
-            from src.coinmetrics.client import CoinMetricsClient, CoinMetricsError, normalize_time
-            from src.coinmetrics.endpoints import fetch_assets, fetch_asset_metrics
+        return _extract_asset(client, conn, asset, metrics_str, start_t, end_t, freq, stream=stream, incremental=incremental, availability=availability)
+    finally:
+        try:
+            conn.close()
+        except Exception:
+            pass
+        client.session.close()
 
-            client = CoinMetricsClient(api_key=COINMETRICS_API_KEY)
 
-            # Fetch and store catalog/assets (no 'limit' param sent)
-            try:
-                catalog_json = fetch_assets(client)
-                with conn:
-                    with conn.cursor() as cur:
-                        cur.execute(sql, ("catalog/assets", psycopg2.extras.Json({}), 200, psycopg2.extras.Json(catalog_json)))
-                        cid = cur.fetchone()[0]
-                        logger.info("Inserted catalog raw response id=%s status=%s", cid, 200)
-            except Exception as exc:
-                # Capture structured error if available
-                status = 500
-                err_payload = str(exc)
-                try:
-                    from src.coinmetrics.client import CoinMetricsError
+def run_extract_all(max_workers: Optional[int] = None, stream: bool = False, incremental: bool = False) -> Dict[str, int]:
+    """Fetch every asset in `CM_ASSETS` concurrently, one raw row per asset.
 
-                    if isinstance(exc, CoinMetricsError):
-                        status = getattr(exc, "status_code", 500)
-                        err_payload = getattr(exc, "error_payload", str(exc))
-                except Exception:
-                    pass
+    At most `max_workers` assets (default `CM_EXTRACT_CONCURRENCY`) are in
+    flight at once, so wall time follows the slowest asset rather than the
+    sum of all assets. Each worker uses its own HTTP session and DB
+    connection. `stream` and `incremental` behave as in `run_extract`.
+    Returns a mapping asset -> inserted raw id.
+    """
+    cm = get_cm_config()
+
+    from src.config import COINMETRICS_API_KEY
 
-                with conn:
-                    with conn.cursor() as cur:
-                        cur.execute(sql, ("catalog/assets", psycopg2.extras.Json({}), status, psycopg2.extras.Json({"error": err_payload})))
-                        cid = cur.fetchone()[0]
-                        logger.info("Inserted catalog error raw response id=%s status=%s", cid, status)
-
-            # Prepare timeseries params
-            assets_raw = cm.get("assets")
-            metrics_raw = cm.get("metrics")
-            assets_str = _normalize_csv(assets_raw) or ""
-            metrics_str = _normalize_csv(metrics_raw) or ""
-            # Use first asset for now
-            first_asset = assets_str.split(",")[0] if assets_str else ""
-            start = cm.get("start_date")
-            end = cm.get("end_date")
-            # Normalize times for request params (convert YYYY-MM-DD -> ISO8601 UTC)
+    if not COINMETRICS_API_KEY:
+        conn = get_conn()
+        try:
+            return {"stub": _extract_stub(conn, cm)}
+        finally:
             try:
-                start_t = normalize_time(start)
+                conn.close()
             except Exception:
-                start_t = start
+                pass
+
+    from src.coinmetrics.client import CoinMetricsClient
+    from src.coinmetrics.ratelimit import RequestStats
+
+    stats = RequestStats()
+
+    # Catalog is fetched once per run, not per asset
+    conn = get_conn()
+    try:
+        client = CoinMetricsClient(api_key=COINMETRICS_API_KEY, stats=stats)
+        _, catalog_json = _store_catalog(client, conn)
+        availability = _availability_index(conn, catalog_json)
+        catalog_json = None
+        client.session.close()
+    finally:
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    assets = [a for a in (_normalize_csv(cm.get("assets")) or "").split(",") if a]
+    metrics_str = _normalize_csv(cm.get("metrics")) or ""
+    start_t, end_t, freq = _timeseries_window(cm)
+
+    if max_workers is None:
+        try:
+            max_workers = int(cm.get("concurrency") or 4)
+        except ValueError:
+            max_workers = 4
+    max_workers = max(1, min(max_workers, len(assets) or 1))
+    check_pool_size(max_workers)
+
+    logger.info("Extracting %s assets with concurrency=%s", len(assets), max_workers)
+    results: Dict[str, int] = {}
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="extract") as pool:
+        futures = {pool.submit(_extract_one_asset, a, metrics_str, start_t, end_t, freq, stats, stream, incremental, availability): a for a in assets}
+        for fut in as_completed(futures):
+            asset = futures[fut]
             try:
-                end_t = normalize_time(end)
-            except Exception:
-                end_t = end
-            freq = cm.get("frequency")
-
-            ts_params = {
-                "assets": first_asset,
-                "metrics": metrics_str,
-                "frequency": freq,
-                "start_time": start_t,
-                "end_time": end_t,
-            }
+                results[asset] = fut.result()
+            except Exception as exc:
+                # Error rows are written inside the worker; this only catches DB/connection failures
+                logger.error("Extract worker failed for asset %s: %s", asset, exc)
+
+    logger.info("Extract completed for %s/%s assets: %s", len(results), len(assets), results)
+    logger.info("CoinMetrics request stats: %s", stats.snapshot())
+    return results
 
-            # Call timeseries endpoint and support pagination (merge pages)
+
+async def _run_extract_all_async(assets: List[str], metrics_str: str, start_t: str, end_t: str, freq: str, max_workers: int, max_connections_per_host: int, stream: bool = False, incremental: bool = False, availability=None) -> Dict[str, int]:
+    from src.config import COINMETRICS_API_KEY
+    from src.coinmetrics.async_client import AsyncCoinMetricsClient
+
+    sem = asyncio.Semaphore(max_workers)
+    loop = asyncio.get_running_loop()
+    results: Dict[str, int] = {}
+
+    async def _one(asset: str) -> None:
+        async with sem:
+            conn = await loop.run_in_executor(None, get_conn)
             try:
-                # First page using helper (params-based)
-                first_page = fetch_asset_metrics(client, first_asset, [m.strip() for m in metrics_str.split(",") if m.strip()], start_t, end_t, freq)
-
-                all_data = []
-                total_pages = 0
-                total_rows = 0
-
-                page_json = first_page
-                page_index = 1
-
-                # Helper to extract page data list
-                def _page_data(j):
-                    if not isinstance(j, dict):
-                        return []
-                    d = j.get("data")
-                    return d if isinstance(d, list) else []
-
-                next_url = page_json.get("next_page_url") if isinstance(page_json, dict) else None
-
-                # Iterate pages: include first page and follow next_page_url
-                while True:
-                    page_data = _page_data(page_json)
-                    n_rows = len(page_data)
-                    first_time = None
-                    last_time = None
-                    if n_rows:
-                        first_time = page_data[0].get("time") or page_data[0].get("timestamp")
-                        last_time = page_data[-1].get("time") or page_data[-1].get("timestamp")
-
-                    logger.info("asset-metrics page=%s, n_rows=%s, first_time=%s, last_time=%s", page_index, n_rows, first_time, last_time)
-
-                    # Optional audit insert per page
-                    try:
-                        audit_params = dict(ts_params)
-                        audit_params["page"] = page_index
-                        with conn:
-                            with conn.cursor() as cur:
-                                cur.execute(sql, (f"timeseries/asset-metrics(page)", psycopg2.extras.Json(audit_params), 200, psycopg2.extras.Json(page_json)))
-                                _ = cur.fetchone()[0]
-                    except Exception:
-                        logger.debug("Failed to write per-page audit row for page %s", page_index)
-
-                    # Accumulate
-                    all_data.extend(page_data)
-                    total_pages += 1
-                    total_rows += n_rows
-
-                    # Determine next page URL and break if none
-                    if not next_url:
-                        break
-
-                    # Fetch next page (full URL). Use client's session to keep auth headers.
-                    try:
-                        resp = client.session.get(next_url, headers=client._build_headers(), timeout=client.timeout)
-                        if resp.status_code != 200:
-                            # Try to parse error payload
-                            try:
-                                err = resp.json()
-                            except Exception:
-                                err = resp.text[:2000]
-                            raise CoinMetricsError(resp.status_code, next_url, err)
-
-                        page_json = resp.json()
-                        next_url = page_json.get("next_page_url") if isinstance(page_json, dict) else None
-                        page_index += 1
-                        # loop continues
-                    except CoinMetricsError:
-                        raise
-                    except Exception as exc:
-                        # On unexpected fetch error, abort and record what we have
-                        logger.error("Error fetching next page %s: %s", next_url, exc)
-                        raise
-
-                # After collecting all pages, build merged payload
-                merged = dict(first_page) if isinstance(first_page, dict) else {"data": []}
-                merged["data"] = all_data
-                # clear pagination marker to indicate merged completeness
-                merged["next_page_url"] = ""
-                merged["next_page_token"] = None
-
-                logger.info("asset-metrics completed: total_pages=%s, total_rows=%s", total_pages, total_rows)
-
-                # Insert merged record as the official timeseries/asset-metrics row
-                with conn:
-                    with conn.cursor() as cur:
-                        cur.execute(sql, ("timeseries/asset-metrics", psycopg2.extras.Json(ts_params), 200, psycopg2.extras.Json(merged)))
-                        inserted = cur.fetchone()[0]
-                        logger.info("Inserted merged timeseries raw response id=%s (pages=%s rows=%s)", inserted, total_pages, total_rows)
-                        return inserted
-            except CoinMetricsError as cmerr:
-                # Write the error payload into raw.api_responses for diagnostics
-                err_payload = cmerr.error_payload
-                status = getattr(cmerr, "status_code", None) or 500
-                with conn:
-                    with conn.cursor() as cur:
-                        cur.execute(sql, ("timeseries/asset-metrics", psycopg2.extras.Json(ts_params), status, psycopg2.extras.Json({"error": err_payload})))
-                        inserted = cur.fetchone()[0]
-                        logger.info("Inserted timeseries error raw response id=%s status=%s", inserted, status)
-                        return inserted
+                results[asset] = await _extract_asset_async(client, conn, asset, metrics_str, start_t, end_t, freq, stream=stream, incremental=incremental, availability=availability)
             except Exception as exc:
-                logger.error("Unexpected error calling timeseries pagination: %s", exc)
-                # Record a generic failure payload
-                with conn:
-                    with conn.cursor() as cur:
-                        cur.execute(sql, ("timeseries/asset-metrics", psycopg2.extras.Json(ts_params), 500, psycopg2.extras.Json({"error": str(exc)})))
-                        inserted = cur.fetchone()[0]
-                        logger.info("Inserted timeseries error raw response id=%s status=500", inserted)
-                        return inserted
-        else:
-            # Stub behavior (no API key)
-            params = {
-                "assets": cm.get("assets"),
-                "metrics": cm.get("metrics"),
-                "start_date": cm.get("start_date"),
-                "end_date": cm.get("end_date"),
-                "frequency": cm.get("frequency"),
-            }
-            payload = {
-                "data": [
-                    {
-                        "asset": "btc",
-                        "metric": "PriceUSD",
-                        "time": "2013-01-01T00:00:00Z",
-                        "value": 13.5,
-                    }
-                ],
-                "meta": {"note": "stub for step2.2"},
-            }
-            status = 200
-            endpoint = "timeseries.stub"
-            with conn:
-                with conn.cursor() as cur:
-                    cur.execute(sql, (endpoint, psycopg2.extras.Json(params), status, psycopg2.extras.Json(payload)))
-                    inserted = cur.fetchone()[0]
-                    logger.info("Inserted stub raw.api_responses id=%s", inserted)
-                    return inserted
+                logger.error("Async extract failed for asset %s: %s", asset, exc)
+            finally:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+
+    # One client => one shared keep-alive pool for all assets
+    async with AsyncCoinMetricsClient(api_key=COINMETRICS_API_KEY, max_connections_per_host=max_connections_per_host) as client:
+        await asyncio.gather(*(_one(a) for a in assets))
+        logger.info("CoinMetrics request stats: %s", client.stats.snapshot())
+    return results
+
+
+def run_extract_all_async(max_workers: Optional[int] = None, max_connections_per_host: Optional[int] = None, stream: bool = False, incremental: bool = False) -> Dict[str, int]:
+    """Like `run_extract_all` but on asyncio with `AsyncCoinMetricsClient`.
+
+    All assets share one pooled aiohttp session (at most
+    `max_connections_per_host` sockets, default `CM_HTTP_MAX_CONNECTIONS_PER_HOST`)
+    and pages are prefetched while the previous page is being stored.
+    Returns a mapping asset -> inserted raw id.
+    """
+    cm = get_cm_config()
+
+    from src.config import COINMETRICS_API_KEY
+
+    if not COINMETRICS_API_KEY:
+        return run_extract_all(max_workers=max_workers, stream=stream, incremental=incremental)
+
+    from src.coinmetrics.client import CoinMetricsClient
+
+    conn = get_conn()
+    try:
+        client = CoinMetricsClient(api_key=COINMETRICS_API_KEY)
+        _, catalog_json = _store_catalog(client, conn)
+        availability = _availability_index(conn, catalog_json)
+        catalog_json = None
+        client.session.close()
     finally:
         try:
             conn.close()
         except Exception:
             pass
 
+    assets = [a for a in (_normalize_csv(cm.get("assets")) or "").split(",") if a]
+    metrics_str = _normalize_csv(cm.get("metrics")) or ""
+    start_t, end_t, freq = _timeseries_window(cm)
+
+    if max_workers is None:
+        try:
+            max_workers = int(cm.get("concurrency") or 4)
+        except ValueError:
+            max_workers = 4
+    if max_connections_per_host is None:
+        try:
+            max_connections_per_host = int(cm.get("max_connections_per_host") or 10)
+        except ValueError:
+            max_connections_per_host = 10
+
+    check_pool_size(max(1, max_workers))
+
+    logger.info("Async extract of %s assets with concurrency=%s, max_connections_per_host=%s", len(assets), max_workers, max_connections_per_host)
+    results = asyncio.run(_run_extract_all_async(assets, metrics_str, start_t, end_t, freq, max(1, max_workers), max(1, max_connections_per_host), stream, incremental, availability))
+    logger.info("Async extract completed for %s/%s assets: %s", len(results), len(assets), results)
+    return results
+
 
 if __name__ == "__main__":
     _id = run_extract()
@@ -0,0 +1,145 @@
+"""Transform ledger: tracks which raw.api_responses ids were transformed.
+
+Workers claim pending ids by inserting 'processing' rows into
+`raw.transform_ledger`; the primary key on raw_id means an id is never
+transformed twice. Claims are serialized with a transaction-level advisory
+lock, so concurrent workers (threads or processes, on any host) never race
+for the same candidates.
+
+Raw ids of the same series (the request's `assets` param) may overlap, e.g.
+through the incremental overlap window, and must be applied oldest first or
+an older response could overwrite a newer revision. A claim therefore takes
+the oldest pending ids of one series that no worker is currently
+processing; the claiming worker applies them in id order, and other workers
+move on to other series. A worker gets nothing back once every pending id
+belongs to a series in progress elsewhere, and those ids are picked up by
+the worker holding that series.
+
+Claimed ids end up 'done' (with the number of rows written) or 'failed'
+(with the error). A failure stops its series: the worker hands the newer
+ids of its claim back with `release_ids`, and a series with a failed id is
+not claimed again until `release_claims` makes the failed id pending once
+more, so the retry re-applies it before the newer ids rather than after
+them. `release_claims` also frees claims left behind by a dead worker.
+"""
+from __future__ import annotations
+
+from typing import List, Optional, Sequence
+
+# Raw endpoints that hold timeseries payloads (merged responses or page manifests)
+TRANSFORM_ENDPOINTS = ("timeseries/asset-metrics", "timeseries.stub")
+
+# Series a raw row belongs to: its requested asset(s)
+SERIES_KEY_SQL = "COALESCE(r.params->>'assets', r.params->>'asset', '')"
+
+CLAIM_LOCK_SQL = "SELECT pg_advisory_xact_lock(hashtext('raw.transform_ledger claim'))"
+
+CLAIM_SQL = (
+    "WITH pending AS ("
+    " SELECT r.id, " + SERIES_KEY_SQL + " AS series FROM raw.api_responses r"
+    " WHERE r.endpoint = ANY(%(endpoints)s) AND r.status_code = 200"
+    " AND NOT EXISTS (SELECT 1 FROM raw.transform_ledger l WHERE l.raw_id = r.id)),"
+    # Series in progress elsewhere, or stopped by a failed id (see release_claims)
+    " blocked AS ("
+    " SELECT DISTINCT " + SERIES_KEY_SQL + " AS series"
+    " FROM raw.transform_ledger l JOIN raw.api_responses r ON r.id = l.raw_id"
+    " WHERE l.status IN ('processing', 'failed')),"
+    " pick AS ("
+    " SELECT p.series FROM pending p"
+    " WHERE NOT EXISTS (SELECT 1 FROM blocked b WHERE b.series = p.series)"
+    " ORDER BY p.id LIMIT 1)"
+    " INSERT INTO raw.transform_ledger (raw_id, status, worker, claimed_at)"
+    " SELECT p.id, 'processing', %(worker)s, now() FROM pending p JOIN pick USING (series)"
+    " ORDER BY p.id LIMIT %(n)s"
+    " ON CONFLICT (raw_id) DO NOTHING"
+    " RETURNING raw_id"
+)
+
+PENDING_COUNT_SQL = (
+    "SELECT count(*) FROM raw.api_responses r"
+    " WHERE r.endpoint = ANY(%s) AND r.status_code = 200"
+    " AND NOT EXISTS (SELECT 1 FROM raw.transform_ledger l WHERE l.raw_id = r.id)"
+)
+
+
+def claim_pending(conn, worker: str, n: int = 1, endpoints: Sequence[str] = TRANSFORM_ENDPOINTS) -> List[int]:
+    """Claim up to `n` untransformed raw ids of one idle series for `worker`; commits the claim.
+
+    Returns the ids in the order they must be applied (oldest first); an
+    empty list means no idle series has pending ids.
+    """
+    with conn:
+        with conn.cursor() as cur:
+            # Separate statement: the claim's snapshot must see claims committed while we waited
+            cur.execute(CLAIM_LOCK_SQL)
+            cur.execute(CLAIM_SQL, {"worker": worker, "endpoints": list(endpoints), "n": int(n)})
+            return sorted(r[0] for r in cur.fetchall())
+
+
+def mark_done(conn, raw_id: int, n_rows: int) -> None:
+    with conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                "UPDATE raw.transform_ledger SET status='done', finished_at=now(), n_rows=%s, error=NULL WHERE raw_id=%s",
+                (int(n_rows), raw_id),
+            )
+
+
+def mark_failed(conn, raw_id: int, error: str) -> None:
+    with conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                "UPDATE raw.transform_ledger SET status='failed', finished_at=now(), error=%s WHERE raw_id=%s",
+                (str(error)[:2000], raw_id),
+            )
+
+
+def release_ids(conn, raw_ids: Sequence[int]) -> int:
+    """Hand still-'processing' claims of `raw_ids` back to the pending set; returns ids released."""
+    if not raw_ids:
+        return 0
+    with conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                "DELETE FROM raw.transform_ledger WHERE raw_id = ANY(%s) AND status = 'processing'",
+                (list(raw_ids),),
+            )
+            return cur.rowcount
+
+
+def release_claims(conn, failed: bool = True, stale_after: Optional[str] = None) -> int:
+    """Make ids pending again: failed ones and/or 'processing' claims older than `stale_after`.
+
+    `stale_after` is a Postgres interval string such as '1 hour' (a worker
+    that died mid-transform leaves its claim behind). Returns ids released.
+    """
+    clauses = []
+    params: list = []
+    if failed:
+        clauses.append("status = 'failed'")
+    if stale_after:
+        clauses.append("(status = 'processing' AND claimed_at < now() - %s::interval)")
+        params.append(stale_after)
+    if not clauses:
+        return 0
+    with conn:
+        with conn.cursor() as cur:
+            cur.execute("DELETE FROM raw.transform_ledger WHERE " + " OR ".join(clauses), params)
+            return cur.rowcount
+
+
+def pending_count(conn, endpoints: Sequence[str] = TRANSFORM_ENDPOINTS) -> int:
+    with conn.cursor() as cur:
+        cur.execute(PENDING_COUNT_SQL, (list(endpoints),))
+        return int(cur.fetchone()[0])
+
+
+__all__ = [
+    "TRANSFORM_ENDPOINTS",
+    "claim_pending",
+    "mark_done",
+    "mark_failed",
+    "release_claims",
+    "release_ids",
+    "pending_count",
+]
@@ -1,56 +1,555 @@
-"""ETL load step: upsert normalized metric rows into processed.metrics_long."""
+"""ETL load step: upsert normalized metric rows into processed.metrics_long.
+
+Rows are written to `processed.metrics_fact` (the table behind the
+processed.metrics_long view) with asset/metric/freq/endpoint names
+replaced by dimension ids resolved through `src.db.dims`.
+
+Load modes (`ETL_LOAD_MODE` or the `mode` argument):
+- "row":   one INSERT ... ON CONFLICT per row (original behaviour)
+- "copy":  rows are streamed with COPY into a temporary staging table and
+           merged with a single INSERT ... SELECT ... ON CONFLICT
+- "batch": multi-row VALUES statements (`execute_values`) of
+           `ETL_BATCH_SIZE` rows, each committed on its own so a bad batch
+           only loses itself
+- "parallel": rows are sharded by (asset, metric) over `ETL_LOAD_WORKERS`
+           connections, each running the copy path on its shard
+
+`load_columns` takes the typed arrays of `src.etl.columnar.MetricColumns`
+and always goes through COPY.
+
+Every mode counts inserted vs updated rows exactly via `xmax = 0` in
+RETURNING; `load_metrics` returns those stats, `upsert_metrics` keeps
+returning the number of affected input rows (repeated keys included). The same statement folds
+per-series deltas into processed.metrics_summary (the table behind
+analysis.metric_coverage). Yearly partitions of the target
+table are created on demand before a batch is written. With `ETL_LOAD_SKIP_UNCHANGED`
+(opt-in, default off) a conflicting row is only rewritten when its value or
+is_missing changed, so idempotent re-runs write (almost) nothing; skipped
+rows are reported as "unchanged".
+"""
 from __future__ import annotations
 
-from typing import List, Dict, Any
+import io
+from typing import List, Dict, Any, Iterable, Optional
 from datetime import datetime
 
+from src.config import get_load_config
+from src.db.dims import encode_rows, resolve_ids
 from src.db.engine import get_conn
+from src.db.partitions import ensure_partitions, years_of
 from src.utils.logging import logger
 
 
-def upsert_metrics(rows: List[Dict[str, Any]]) -> int:
-    """Upsert a list of metric rows into processed.metrics_long.
+LOAD_MODES = ("row", "copy", "batch", "parallel")
 
-    Each row dict must contain keys: asset, metric, ts (datetime), freq, value, is_missing, source_endpoint
-    Returns the number of rows affected (inserted or updated).
+# Row dict keys (names, as exposed by the processed.metrics_long view)
+COLUMNS = ("asset", "metric", "ts", "freq", "value", "is_missing", "source_endpoint")
+
+# processed.metrics_fact columns (dimension ids, see src.db.dims)
+FACT_COLUMNS = ("asset_id", "metric_id", "ts", "freq_id", "value", "is_missing", "endpoint_id")
+
+INSERT_SQL = "INSERT INTO processed.metrics_fact (" + ", ".join(FACT_COLUMNS) + ", ingested_at)"
+
+ON_CONFLICT_SQL = (
+    " ON CONFLICT (asset_id, metric_id, ts, freq_id) DO UPDATE SET"
+    " value = EXCLUDED.value,"
+    " is_missing = EXCLUDED.is_missing,"
+    " endpoint_id = EXCLUDED.endpoint_id,"
+    " ingested_at = EXCLUDED.ingested_at"
+)
+
+# Leave the existing tuple alone (no new row version, no WAL) when nothing changed
+SKIP_UNCHANGED_SQL = (
+    " WHERE (processed.metrics_fact.value, processed.metrics_fact.is_missing)"
+    " IS DISTINCT FROM (EXCLUDED.value, EXCLUDED.is_missing)"
+)
+
+
+def _on_conflict(skip_unchanged: bool) -> str:
+    return ON_CONFLICT_SQL + (SKIP_UNCHANGED_SQL if skip_unchanged else "")
+
+
+SUMMARY_INSERT_SQL = "INSERT INTO processed.metrics_summary AS t (asset_id, metric_id, freq_id, n_points, n_missing, start_ts, end_ts)"
+
+# The shared advisory lock pairs with processed.refresh_metrics_summary(),
+# which takes it exclusively, so a refresh never drops a concurrent delta
+SUMMARY_LOCK_SQL = " CROSS JOIN (SELECT pg_advisory_xact_lock_shared(hashtext('processed.metrics_summary'))) lk"
+
+SUMMARY_CONFLICT_SQL = (
+    " ON CONFLICT (asset_id, metric_id, freq_id) DO UPDATE SET"
+    " n_points = t.n_points + EXCLUDED.n_points,"
+    " n_missing = t.n_missing + EXCLUDED.n_missing,"
+    " start_ts = LEAST(t.start_ts, EXCLUDED.start_ts),"
+    " end_ts = GREATEST(t.end_ts, EXCLUDED.end_ts),"
+    " updated_at = now()"
+)
+
+# Rows written by `m` joined to their previous version: `o` reads the
+# snapshot taken before the statement, i.e. the old row of an update
+WRITTEN_SQL = (
+    " FROM m LEFT JOIN processed.metrics_fact o"
+    " ON (o.asset_id, o.metric_id, o.ts, o.freq_id) = (m.asset_id, m.metric_id, m.ts, m.freq_id)"
+)
+
+# Per-series deltas of the rows written by `m`, folded into processed.metrics_summary
+SUMMARY_SQL = (
+    " d AS ("
+    "SELECT m.asset_id, m.metric_id, m.freq_id,"
+    " count(*) FILTER (WHERE m.ins) AS n_points,"
+    " sum(m.is_missing::int - COALESCE(o.is_missing::int, 0)) AS n_missing,"
+    " min(m.ts) AS start_ts, max(m.ts) AS end_ts"
+    + WRITTEN_SQL
+    + " GROUP BY m.asset_id, m.metric_id, m.freq_id),"
+    " s AS (" + SUMMARY_INSERT_SQL
+    + " SELECT d.asset_id, d.metric_id, d.freq_id, d.n_points, d.n_missing, d.start_ts, d.end_ts"
+    " FROM d" + SUMMARY_LOCK_SQL
+    + " WHERE d.n_points > 0 OR d.n_missing <> 0"
+    " ORDER BY d.asset_id, d.metric_id, d.freq_id"
+    + SUMMARY_CONFLICT_SQL + ")"
+)
+
+# Client-side accumulated deltas (row mode), applied once per transaction
+SUMMARY_VALUES_SQL = (
+    SUMMARY_INSERT_SQL
+    + " SELECT d.asset_id, d.metric_id, d.freq_id, d.n_points, d.n_missing, d.start_ts, d.end_ts"
+    " FROM (VALUES %s) d (asset_id, metric_id, freq_id, n_points, n_missing, start_ts, end_ts)"
+    + SUMMARY_LOCK_SQL
+    + " ORDER BY d.asset_id, d.metric_id, d.freq_id"
+    + SUMMARY_CONFLICT_SQL
+)
+SUMMARY_VALUES_TEMPLATE = "(%s::int, %s::int, %s::int, %s::bigint, %s::bigint, %s::timestamptz, %s::timestamptz)"
+
+
+def _merge_sql(select_sql: str, skip_unchanged: bool) -> str:
+    return (
+        "WITH src AS MATERIALIZED (" + select_sql + "),"
+        " m AS (" + INSERT_SQL + " SELECT * FROM src" + _on_conflict(skip_unchanged)
+        + " RETURNING asset_id, metric_id, ts, freq_id, is_missing, (xmax = 0) AS ins)"
+    )
+
+
+def upsert_sql(select_sql: str, skip_unchanged: bool) -> str:
+    """Upsert the output of `select_sql` and return one (inserted, updated, unchanged) row.
+
+    `select_sql` must yield the INSERT_SQL columns with at most one row per
+    (asset_id, metric_id, ts, freq_id). xmax = 0 on a returned tuple means it was
+    freshly inserted; input rows that return nothing were left unchanged.
+    The same statement applies the per-series deltas to processed.metrics_summary.
     """
-    if not rows:
-        return 0
-
-    sql = (
-        "INSERT INTO processed.metrics_long (asset, metric, ts, freq, value, is_missing, source_endpoint, ingested_at)"
-        " VALUES (%s, %s, %s, %s, %s, %s, %s, now())"
-        " ON CONFLICT (asset, metric, ts, freq) DO UPDATE SET"
-        " value = EXCLUDED.value,"
-        " is_missing = EXCLUDED.is_missing,"
-        " source_endpoint = EXCLUDED.source_endpoint,"
-        " ingested_at = EXCLUDED.ingested_at"
+    return (
+        _merge_sql(select_sql, skip_unchanged) + ","
+        + SUMMARY_SQL
+        + " SELECT count(*) FILTER (WHERE ins), count(*) FILTER (WHERE NOT ins),"
+        " (SELECT count(*) FROM src) - count(*) FROM m"
+    )
+
+
+VALUES_SELECT_SQL = "SELECT * FROM (VALUES %s) v (" + ", ".join(FACT_COLUMNS) + ", ingested_at)"
+# Casts give the VALUES list column types (all-NULL columns would otherwise be text)
+VALUES_TEMPLATE = "(%s::int, %s::int, %s::timestamptz, %s::int, %s::float8, %s::boolean, %s::int, now())"
+
+# "row" mode: one single-row upsert statement per row. It returns the
+# written row's summary delta (nothing when the row was left unchanged);
+# deltas are summed on the client and applied once per transaction.
+ROW_SELECT_SQL = "SELECT " + VALUES_TEMPLATE[1:-1]
+
+
+def _row_sql(skip_unchanged: bool) -> str:
+    return (
+        _merge_sql(ROW_SELECT_SQL, skip_unchanged)
+        + " SELECT m.asset_id, m.metric_id, m.freq_id, m.ts, m.ins,"
+        " m.is_missing::int - COALESCE(o.is_missing::int, 0)"
+        + WRITTEN_SQL
+    )
+
+
+def _add_delta(deltas: Dict[tuple, list], asset_id: int, metric_id: int, freq_id: int, ts, inserted: bool, d_missing: int) -> None:
+    """Accumulate one written row into per-series [n_points, n_missing, start_ts, end_ts] deltas."""
+    acc = deltas.get((asset_id, metric_id, freq_id))
+    if acc is None:
+        deltas[(asset_id, metric_id, freq_id)] = [int(inserted), d_missing, ts, ts]
+    else:
+        acc[0] += int(inserted)
+        acc[1] += d_missing
+        acc[2] = min(acc[2], ts)
+        acc[3] = max(acc[3], ts)
+
+
+def _apply_summary(cur, deltas: Dict[tuple, list]) -> int:
+    """Fold accumulated deltas into processed.metrics_summary (one statement); returns series touched."""
+    import psycopg2.extras
+
+    values = [key + tuple(acc) for key, acc in sorted(deltas.items()) if acc[0] or acc[1]]
+    if values:
+        psycopg2.extras.execute_values(cur, SUMMARY_VALUES_SQL, values, template=SUMMARY_VALUES_TEMPLATE, page_size=len(values))
+    return len(values)
+
+
+# Staging table lives for the session; rows are cleared at every commit.
+# `seq` follows COPY order so the last duplicate of a key wins, as in row mode.
+STAGE_DDL = (
+    "CREATE TEMP TABLE IF NOT EXISTS metrics_stage ("
+    " seq BIGSERIAL,"
+    " asset_id INT, metric_id INT, ts TIMESTAMPTZ, freq_id INT,"
+    " value DOUBLE PRECISION, is_missing BOOLEAN, endpoint_id INT"
+    ") ON COMMIT DELETE ROWS"
+)
+
+STAGE_SELECT_SQL = (
+    "SELECT DISTINCT ON (asset_id, metric_id, ts, freq_id) " + ", ".join(FACT_COLUMNS) + ", now() AS ingested_at"
+    " FROM metrics_stage"
+    " ORDER BY asset_id, metric_id, ts, freq_id, seq DESC"
+)
+
+COPY_CHUNK_ROWS = 100_000
+
+
+def _copy_text(v: Any) -> str:
+    """Format one value for COPY text format."""
+    if v is None:
+        return "\\N"
+    if isinstance(v, bool):
+        return "t" if v else "f"
+    if isinstance(v, datetime):
+        return v.isoformat()
+    if isinstance(v, float):
+        return repr(v)
+    s = str(v)
+    if any(c in s for c in "\\\t\n\r"):
+        s = s.replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+    return s
+
+
+def _copy_rows(cur, rows: Iterable[tuple], table: str = "metrics_stage") -> int:
+    """COPY encoded rows (FACT_COLUMNS tuples) into `table` in chunks of COPY_CHUNK_ROWS; returns rows copied."""
+    sql = f"COPY {table} ({', '.join(FACT_COLUMNS)}) FROM STDIN"
+    total = 0
+    buf = io.StringIO()
+    n = 0
+    for r in rows:
+        buf.write("\t".join(_copy_text(v) for v in r))
+        buf.write("\n")
+        n += 1
+        if n >= COPY_CHUNK_ROWS:
+            buf.seek(0)
+            cur.copy_expert(sql, buf)
+            total += n
+            buf = io.StringIO()
+            n = 0
+    if n:
+        buf.seek(0)
+        cur.copy_expert(sql, buf)
+        total += n
+    return total
+
+
+def _new_stats(attempted: int = 0) -> Dict[str, int]:
+    return {
+        "attempted": attempted,
+        "inserted": 0,
+        "updated": 0,
+        "unchanged": 0,
+        "duplicates": 0,
+        "batches": 0,
+        "failed_batches": 0,
+        "failed_rows": 0,
+    }
+
+
+def add_stats(total: Dict[str, int], part: Dict[str, int]) -> Dict[str, int]:
+    """Accumulate the counters of load stats `part` into `total` (in place); returns `total`."""
+    for k, v in part.items():
+        if isinstance(v, int):
+            total[k] = total.get(k, 0) + v
+    return total
+
+
+def _dedup_last(rows: List[tuple]) -> List[tuple]:
+    """Keep the last encoded row per (asset_id, metric_id, ts, freq_id): one statement may not update a row twice."""
+    by_key: Dict[tuple, tuple] = {}
+    for r in rows:
+        by_key[r[:4]] = r
+    return list(by_key.values())
+
+
+def _upsert_rowwise(conn, rows: List[tuple], skip_unchanged: bool = False) -> Dict[str, int]:
+    stats = _new_stats(len(rows))
+    sql = _row_sql(skip_unchanged)
+    with conn:
+        with conn.cursor() as cur:
+            deltas: Dict[tuple, list] = {}
+            for r in rows:
+                cur.execute(sql, r)
+                res = cur.fetchone()
+                if res is None:
+                    stats["unchanged"] += 1
+                    continue
+                stats["inserted" if res[4] else "updated"] += 1
+                _add_delta(deltas, *res)
+            _apply_summary(cur, deltas)
+    stats["batches"] = 1
+    return stats
+
+
+def _upsert_copy(conn, rows: List[tuple], skip_unchanged: bool = False) -> Dict[str, int]:
+    """COPY into the staging table, then one merge statement (single transaction)."""
+    stats = _new_stats(len(rows))
+    # The merge keeps one row per key (STAGE_SELECT_SQL); the rest are counted here
+    stats["duplicates"] = len(rows) - len({r[:4] for r in rows})
+    with conn:
+        with conn.cursor() as cur:
+            cur.execute(STAGE_DDL)
+            copied = _copy_rows(cur, rows)
+            cur.execute(upsert_sql(STAGE_SELECT_SQL, skip_unchanged))
+            stats["inserted"], stats["updated"], stats["unchanged"] = cur.fetchone()
+    stats["batches"] = 1
+    logger.info("COPY staged %s rows, merged %s", copied, stats["inserted"] + stats["updated"])
+    return stats
+
+
+def _upsert_batched(conn, rows: List[tuple], batch_size: int, skip_unchanged: bool = False) -> Dict[str, int]:
+    """Multi-row VALUES upserts of `batch_size` rows, one transaction per batch.
+
+    A failing batch is rolled back and counted in failed_batches/failed_rows;
+    loading continues with the next batch.
+    """
+    import psycopg2.extras
+
+    stats = _new_stats(len(rows))
+    sql = upsert_sql(VALUES_SELECT_SQL, skip_unchanged)
+    batch_size = max(1, int(batch_size))
+    for start in range(0, len(rows), batch_size):
+        chunk = rows[start:start + batch_size]
+        batch = _dedup_last(chunk)
+        stats["batches"] += 1
+        try:
+            with conn:
+                with conn.cursor() as cur:
+                    result = psycopg2.extras.execute_values(
+                        cur,
+                        sql,
+                        batch,
+                        template=VALUES_TEMPLATE,
+                        page_size=len(batch),
+                        fetch=True,
+                    )
+                    inserted, updated, unchanged = result[0]
+            stats["inserted"] += inserted
+            stats["updated"] += updated
+            stats["unchanged"] += unchanged
+            stats["duplicates"] += len(chunk) - len(batch)
+        except Exception as exc:
+            stats["failed_batches"] += 1
+            stats["failed_rows"] += len(chunk)
+            logger.error("Load batch %s (rows %s..%s) failed and was rolled back: %s", stats["batches"], start, start + len(chunk) - 1, exc)
+    return stats
+
+
+def shard_by_series(rows: List[tuple], n_shards: int) -> List[List[tuple]]:
+    """Split encoded rows into at most `n_shards` shards, keeping each (asset_id, metric_id) series whole.
+
+    Series are assigned largest-first to the lightest shard, and every shard
+    is sorted by primary key. Shards never share a row, and each one takes
+    its row locks in key order, so concurrent merges cannot deadlock.
+    """
+    series: Dict[tuple, List[tuple]] = {}
+    for r in rows:
+        series.setdefault(r[:2], []).append(r)
+    n_shards = max(1, min(int(n_shards), len(series)))
+    shards: List[List[tuple]] = [[] for _ in range(n_shards)]
+    sizes = [0] * n_shards
+    for key in sorted(series, key=lambda k: len(series[k]), reverse=True):
+        i = sizes.index(min(sizes))
+        shards[i].extend(series[key])
+        sizes[i] += len(series[key])
+    for shard in shards:
+        # Stable sort keeps the input order of duplicate keys (last one still wins)
+        shard.sort(key=lambda r: (r[0], r[1], r[2], r[3]))
+    return [shard for shard in shards if shard]
+
+
+def _upsert_parallel(rows: List[tuple], workers: int, skip_unchanged: bool = False) -> Dict[str, int]:
+    """Run the copy path on each (asset, metric) shard over its own connection; returns summed stats."""
+    from concurrent.futures import ThreadPoolExecutor
+
+    shards = shard_by_series(rows, workers)
+
+    def run(shard: List[tuple]) -> Dict[str, int]:
+        wconn = get_conn()
+        try:
+            return _upsert_copy(wconn, shard, skip_unchanged)
+        except Exception as exc:
+            logger.error("Parallel load shard (%s rows) failed and was rolled back: %s", len(shard), exc)
+            failed = _new_stats(len(shard))
+            failed.update(batches=1, failed_batches=1, failed_rows=len(shard))
+            return failed
+        finally:
+            wconn.close()
+
+    stats = _new_stats(len(rows))
+    # psycopg2 releases the GIL while waiting on the server, so threads are enough
+    with ThreadPoolExecutor(max_workers=len(shards) or 1) as pool:
+        for part in pool.map(run, shards):
+            part.pop("attempted", None)
+            add_stats(stats, part)
+    stats["workers"] = len(shards)
+    return stats
+
+
+def _copy_frame(cur, frame, table: str = "metrics_stage") -> int:
+    """COPY a DataFrame (columns in FACT_COLUMNS order) as CSV; returns rows copied."""
+    total = 0
+    sql = f"COPY {table} ({', '.join(FACT_COLUMNS)}) FROM STDIN WITH (FORMAT csv)"
+    for start in range(0, len(frame), COPY_CHUNK_ROWS):
+        chunk = frame.iloc[start:start + COPY_CHUNK_ROWS]
+        buf = io.StringIO()
+        # Empty unquoted fields are NULL in CSV COPY (NaN values, unknown ids)
+        chunk.to_csv(buf, header=False, index=False, na_rep="", float_format="%.17g")
+        buf.seek(0)
+        cur.copy_expert(sql, buf)
+        total += len(chunk)
+    return total
+
+
+def _fact_frame(conn, cols):
+    """MetricColumns -> DataFrame of FACT_COLUMNS; categorical codes are mapped to ids with one take()."""
+    import numpy as np
+    import pandas as pd
+
+    def codes_to_ids(kind, cat):
+        ids = resolve_ids(conn, kind, cat.categories)
+        lookup = pd.array([ids[str(c)] for c in cat.categories] + [None], dtype="Int32")
+        # code -1 (NaN category) picks the trailing None
+        return lookup.take(np.where(cat.codes < 0, len(cat.categories), cat.codes))
+
+    n = len(cols)
+    freq_id = resolve_ids(conn, "freq", [cols.freq])[cols.freq]
+    endpoint_id = resolve_ids(conn, "endpoint", [cols.source_endpoint])[cols.source_endpoint]
+    return pd.DataFrame(
+        {
+            "asset_id": codes_to_ids("asset", cols.asset),
+            "metric_id": codes_to_ids("metric", cols.metric),
+            "ts": pd.DatetimeIndex(cols.ts).tz_localize("UTC"),
+            "freq_id": np.full(n, freq_id, dtype=np.int32),
+            "value": cols.value,
+            "is_missing": cols.is_missing,
+            "endpoint_id": np.full(n, endpoint_id, dtype=np.int32),
+        }
     )
 
-    conn = get_conn()
-    affected = 0
+
+def load_columns(cols, conn=None, skip_unchanged: Optional[bool] = None) -> Dict[str, int]:
+    """Upsert `src.etl.columnar.MetricColumns` via COPY + merge and return load stats.
+
+    The arrays are written to the staging table without building per-row
+    Python objects. If `conn` is given it is used (and left open).
+    """
+    if cols is None or len(cols) == 0:
+        return _new_stats()
+
+    own_conn = conn is None
+    if own_conn:
+        conn = get_conn()
     try:
+        import numpy as np
+
+        years = np.unique(cols.ts.astype("datetime64[Y]")).astype(np.int64) + 1970
+        ensure_partitions(conn, years.tolist())
+        frame = _fact_frame(conn, cols)
+        stats = _new_stats(len(cols))
+        stats["duplicates"] = int(frame.duplicated(["asset_id", "metric_id", "ts", "freq_id"]).sum())
         with conn:
             with conn.cursor() as cur:
-                for r in rows:
-                    params = (
-                        r.get("asset"),
-                        r.get("metric"),
-                        r.get("ts"),
-                        r.get("freq"),
-                        r.get("value"),
-                        r.get("is_missing", False),
-                        r.get("source_endpoint"),
-                    )
-                    cur.execute(sql, params)
-                    # rowcount is 1 for each insert/update
-                    affected += cur.rowcount if cur.rowcount is not None else 1
+                cur.execute(STAGE_DDL)
+                _copy_frame(cur, frame)
+                cur.execute(upsert_sql(STAGE_SELECT_SQL, skip_unchanged_default(skip_unchanged)))
+                stats["inserted"], stats["updated"], stats["unchanged"] = cur.fetchone()
+        stats["batches"] = 1
     finally:
-        try:
-            conn.close()
-        except Exception:
-            pass
+        if own_conn:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    logger.info("Load summary mode=columns: %s", stats)
+    return stats
+
+
+def skip_unchanged_default(skip_unchanged: Optional[bool] = None) -> bool:
+    """Explicit argument, else `ETL_LOAD_SKIP_UNCHANGED`."""
+    if skip_unchanged is not None:
+        return bool(skip_unchanged)
+    return get_load_config()["skip_unchanged"].strip().lower() in ("1", "true", "yes", "on")
+
+
+def load_metrics(
+    rows: List[Dict[str, Any]],
+    conn=None,
+    mode: Optional[str] = None,
+    batch_size: Optional[int] = None,
+    skip_unchanged: Optional[bool] = None,
+    workers: Optional[int] = None,
+) -> Dict[str, int]:
+    """Upsert rows into processed.metrics_long and return load stats.
 
+    Stats keys: attempted, inserted, updated, unchanged, duplicates,
+    batches, failed_batches, failed_rows. Modes that merge a set of rows in
+    one statement collapse repeated keys first (last row wins); the dropped
+    rows are counted in duplicates, not in inserted/updated. `mode` is one of LOAD_MODES (default
+    `ETL_LOAD_MODE`); `batch_size` applies to "batch" mode (default
+    `ETL_BATCH_SIZE`); `workers` applies to "parallel" mode (default
+    `ETL_LOAD_WORKERS`). With `skip_unchanged` (default
+    `ETL_LOAD_SKIP_UNCHANGED`) existing rows whose value/is_missing are
+    identical are not rewritten and are counted as unchanged.
+    If `conn` is given it is used (and left open); otherwise a new connection is opened.
+    """
+    if not rows:
+        return _new_stats()
+
+    cfg = get_load_config()
+    mode = (mode or cfg["mode"]).lower()
+    skip_unchanged = skip_unchanged_default(skip_unchanged)
+    if mode not in LOAD_MODES:
+        raise ValueError(f"unknown load mode {mode!r}; expected one of {LOAD_MODES}")
+
+    own_conn = conn is None
+    if own_conn:
+        conn = get_conn()
+    try:
+        ensure_partitions(conn, years_of(r.get("ts") for r in rows))
+        encoded = encode_rows(conn, rows)
+        if mode == "copy":
+            stats = _upsert_copy(conn, encoded, skip_unchanged)
+        elif mode == "batch":
+            stats = _upsert_batched(conn, encoded, batch_size or int(cfg["batch_size"]), skip_unchanged)
+        elif mode == "parallel":
+            stats = _upsert_parallel(encoded, workers or int(cfg["workers"]), skip_unchanged)
+        else:
+            stats = _upsert_rowwise(conn, encoded, skip_unchanged)
+    finally:
+        if own_conn:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    logger.info("Load summary mode=%s: %s", mode, stats)
+    return stats
+
+
+def upsert_metrics(rows: List[Dict[str, Any]], conn=None, mode: Optional[str] = None) -> int:
+    """Upsert a list of metric rows into processed.metrics_long.
+
+    Each row dict must contain keys: asset, metric, ts (datetime), freq, value, is_missing, source_endpoint
+    If `conn` is given it is used (and left open); otherwise a new connection is opened.
+    `mode` is one of LOAD_MODES (default `ETL_LOAD_MODE`).
+    Returns the number of rows affected (inserted or updated), counted per
+    input row as in row mode: a repeated key that copy/batch/parallel mode
+    collapsed before merging still counts as affected.
+    """
+    stats = load_metrics(rows, conn=conn, mode=mode)
+    affected = stats["inserted"] + stats["updated"] + stats["duplicates"]
     logger.info("Attempted %s (insert+update)", affected)
     return affected
 
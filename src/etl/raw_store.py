@@ -0,0 +1,119 @@
+"""Compressed, de-duplicated storage of raw API pages.
+
+In `CM_RAW_STORAGE=pages` mode every fetched page is stored exactly once in
+`raw.api_pages` (zlib-compressed JSON, keyed by sha256 of its bytes)
+instead of as a JSONB audit row, and the official
+`timeseries/asset-metrics` row in `raw.api_responses` becomes a small
+manifest:
+
+    {"storage": "pages", "page_ids": [..], "pages": n, "rows": n}
+
+Transform reads through the manifest with `load_manifest_payload`.
+"""
+from __future__ import annotations
+
+import hashlib
+import zlib
+from typing import Any, Dict, List
+
+from src.config import get_cm_config
+from src.utils import jsonlib
+
+
+ENCODING = "zlib+json"
+
+STORE_PAGE_SQL = (
+    "INSERT INTO raw.api_pages (sha256, encoding, n_items, n_bytes, body)"
+    " VALUES (%s, %s, %s, %s, %s)"
+    " ON CONFLICT (sha256) DO NOTHING RETURNING id"
+)
+
+
+def raw_storage_mode() -> str:
+    """Return "pages" (compressed, de-duplicated) or "jsonb" (one JSONB row per page + merged row)."""
+    mode = (get_cm_config().get("raw_storage") or "jsonb").strip().lower()
+    return "pages" if mode == "pages" else "jsonb"
+
+
+def is_manifest(payload: Any) -> bool:
+    return isinstance(payload, dict) and payload.get("storage") == "pages" and isinstance(payload.get("page_ids"), list)
+
+
+def encode_page(page_json: Any):
+    """Return (sha256 hex, uncompressed size, compressed body) for a page."""
+    raw = jsonlib.dumps_bytes(page_json)
+    return hashlib.sha256(raw).hexdigest(), len(raw), zlib.compress(raw, 6)
+
+
+def decode_page(encoding: str, body) -> Any:
+    if encoding != ENCODING:
+        raise ValueError(f"unsupported raw page encoding: {encoding}")
+    return jsonlib.loads(zlib.decompress(bytes(body)))
+
+
+def store_page(conn, page_json: Any) -> int:
+    """Store one page (if not already present) and return its raw.api_pages id."""
+    import psycopg2
+
+    digest, n_bytes, body = encode_page(page_json)
+    data = page_json.get("data") if isinstance(page_json, dict) else None
+    n_items = len(data) if isinstance(data, list) else 0
+    with conn:
+        with conn.cursor() as cur:
+            cur.execute(STORE_PAGE_SQL, (digest, ENCODING, n_items, n_bytes, psycopg2.Binary(body)))
+            row = cur.fetchone()
+            if row is None:
+                # Same content already stored
+                cur.execute("SELECT id FROM raw.api_pages WHERE sha256 = %s", (digest,))
+                row = cur.fetchone()
+            return row[0]
+
+
+def manifest_payload(page_ids: List[int], total_rows: int) -> Dict[str, Any]:
+    return {"storage": "pages", "page_ids": list(page_ids), "pages": len(page_ids), "rows": total_rows}
+
+
+def iter_manifest_pages(conn, manifest: Dict[str, Any]):
+    """Yield the decoded pages referenced by a manifest, in manifest order."""
+    page_ids = [int(i) for i in manifest.get("page_ids") or []]
+    if not page_ids:
+        return
+    with conn.cursor() as cur:
+        cur.execute("SELECT id, encoding, body FROM raw.api_pages WHERE id = ANY(%s)", (page_ids,))
+        found = {r[0]: (r[1], r[2]) for r in cur.fetchall()}
+    for pid in page_ids:
+        if pid not in found:
+            raise KeyError(f"raw.api_pages id={pid} referenced by manifest is missing")
+        encoding, body = found[pid]
+        yield decode_page(encoding, body)
+
+
+def load_manifest_payload(conn, manifest: Dict[str, Any]) -> Dict[str, Any]:
+    """Rebuild the merged payload of a manifest: pages concatenated in order.
+
+    Items repeated across pages (e.g. window boundaries) are kept once.
+    """
+    seen = set()
+    data: List[Any] = []
+    for page in iter_manifest_pages(conn, manifest):
+        items = page.get("data") if isinstance(page, dict) else None
+        for item in items or []:
+            if isinstance(item, dict):
+                key = (item.get("asset"), item.get("metric"), item.get("time") or item.get("timestamp"))
+                if key in seen:
+                    continue
+                seen.add(key)
+            data.append(item)
+    return {"data": data, "next_page_url": "", "next_page_token": None}
+
+
+__all__ = [
+    "raw_storage_mode",
+    "is_manifest",
+    "encode_page",
+    "decode_page",
+    "store_page",
+    "manifest_payload",
+    "iter_manifest_pages",
+    "load_manifest_payload",
+]
@@ -0,0 +1,233 @@
+"""In-database transform: unpivot raw JSONB payloads with set-returning functions.
+
+Instead of fetching `raw.api_responses.payload` into Python, parsing it and
+sending the rows back, `transform_raw_id_sql` runs one
+INSERT ... SELECT ... ON CONFLICT that expands the payload server-side with
+`jsonb_array_elements` (items) and `jsonb_each` (metric columns of a v4
+item), then maps names to dimension ids with small joins. Only the format
+probe, the distinct years/asset/metric names and the insert/update counts
+cross the wire.
+
+Both engines produce the same rows for a payload: format detection mirrors
+`rows_from_payload` (an object carrying `metric` and `value` keys is the
+stub format, anything else is CoinMetrics v4), times are validated with the
+same pattern (`src.etl.transform._TIME_PATTERN`) and fractions truncated to
+microseconds as in Python, values are coerced like float() (numbers,
+booleans, numeric strings including inf/nan), v4 items fall back to
+`timestamp` when `time` is falsy, stub items whose value float() rejects
+are skipped and items without an asset are dropped. Items with a malformed
+time are skipped rather than failing the whole raw id on a cast error.
+Page manifests (compressed raw.api_pages bodies) cannot be decoded in SQL
+and are reported back to the caller, which falls back to the Python engine.
+"""
+from __future__ import annotations
+
+from typing import Dict, Optional
+
+from src.config import get_cm_config
+from src.db.dims import resolve_ids
+from src.db.partitions import ensure_partitions
+from src.etl.load import _new_stats, skip_unchanged_default, upsert_sql
+from src.etl.transform import _TIME_PATTERN
+from src.utils.logging import logger
+
+
+PROBE_SQL = (
+    "SELECT endpoint, params, payload->>'storage',"
+    " CASE WHEN jsonb_typeof(payload->'data') = 'array' THEN jsonb_array_length(payload->'data') > 0 ELSE false END,"
+    " COALESCE(jsonb_typeof(payload->'data'->0) = 'object' AND (payload->'data'->0) ?& array['metric', 'value'], false)"
+    " FROM raw.api_responses WHERE id = %(raw_id)s"
+)
+
+# Postgres aborts the whole statement on one bad cast, so the cast only runs
+# behind the pattern _parse_time checks (plus days-in-month) and items with
+# a malformed time are skipped instead, as in Python.
+_TIME_RE = "'" + _TIME_PATTERN + "'"
+
+# datetime keeps microseconds and truncates the rest; Postgres would round
+_FRACTION_CUT = r"'(\.[0-9]{6})[0-9]+', '\1'"
+
+
+def _time_ok_sql(t: str) -> str:
+    """SQL predicate: the text expression `t` casts cleanly to timestamptz (false when NULL)."""
+    return (
+        f"CASE WHEN ({t}) ~ {_TIME_RE}"
+        f" THEN substr({t}, 9, 2)::int <= extract(day FROM (substr({t}, 1, 7) || '-01')::date + interval '1 month' - interval '1 day')"
+        f" ELSE false END"
+    )
+
+
+def _time_sql(t: str) -> str:
+    """SQL expression turning the text expression `t` into timestamptz (NULL when malformed)."""
+    return f"CASE WHEN {_time_ok_sql(t)} THEN regexp_replace({t}, {_FRACTION_CUT})::timestamptz END"
+
+
+# v4: `item.get("time") or item.get("timestamp")` (JSON values Python treats as false fall back)
+_ITEM_TIME = (
+    "CASE WHEN COALESCE(d.item->'time', 'null') IN ('null', 'false', '0', '\"\"', '[]', '{}')"
+    " THEN d.item->>'timestamp' ELSE d.item->>'time' END"
+)
+_STUB_TIME = "d.item->>'time'"
+
+# Strings float() accepts: decimal/exponent (underscores between digits), inf, infinity, nan
+_DIGITS = "[0-9](_?[0-9])*"
+_NUMERIC_RE = (
+    rf"'^\s*[-+]?((({_DIGITS})(\.({_DIGITS})?)?|\.{_DIGITS})(e[-+]?{_DIGITS})?|inf|infinity|nan)\s*$'"
+)
+
+
+def _value_sql(v: str) -> str:
+    """SQL expression turning the jsonb cell `v` into float8 like float() (NULL when null or not numeric)."""
+    s = f"({v} #>> '{{}}')"
+    return (
+        f"CASE jsonb_typeof({v})"
+        f" WHEN 'number' THEN ({v})::text::float8"
+        f" WHEN 'boolean' THEN CASE WHEN ({v})::text = 'true' THEN 1.0 ELSE 0.0 END::float8"
+        f" WHEN 'string' THEN CASE"
+        f" WHEN {s} ~* {_NUMERIC_RE} THEN"
+        # float8in only takes an unsigned NaN; Python also accepts +nan/-nan
+        f" CASE WHEN {s} ~* 'nan' THEN 'NaN'::float8 ELSE replace({s}, '_', '')::float8 END"
+        f" END"
+        f" END"
+    )
+
+
+def _keys_sql(time_expr: str, item_filter: str) -> str:
+    """UTC years (for partitions) and asset/metric names (for dimension ids) of the items
+    the matching SELECT keeps: (years, assets, v4 metrics, stub metrics)."""
+    return (
+        "WITH items AS ("
+        f" SELECT d.item, {_time_sql(time_expr)} AS ts FROM raw.api_responses r"
+        " CROSS JOIN LATERAL jsonb_array_elements(r.payload->'data') AS d(item)"
+        f" WHERE r.id = %(raw_id)s AND {item_filter}"
+        f" AND {_time_ok_sql(time_expr)})"
+        " SELECT"
+        " ARRAY(SELECT DISTINCT extract(year FROM ts AT TIME ZONE 'UTC')::int FROM items),"
+        " ARRAY(SELECT DISTINCT item->>'asset' FROM items WHERE item->>'asset' IS NOT NULL),"
+        " ARRAY(SELECT DISTINCT k FROM items, jsonb_object_keys(item) AS k WHERE k NOT IN ('time', 'timestamp', 'asset')),"
+        " ARRAY(SELECT DISTINCT item->>'metric' FROM items WHERE item->>'metric' IS NOT NULL)"
+    )
+
+
+_FREQ_SQL = "%(freq)s::text"
+
+_DEDUP_SQL = (
+    "SELECT DISTINCT ON (asset, metric, ts, freq) asset, metric, ts, freq, value, is_missing, source_endpoint, now() AS ingested_at"
+    " FROM ({select}) s"
+    " WHERE asset IS NOT NULL"
+    # Last duplicate of a key wins, as with the row-by-row loader
+    " ORDER BY asset, metric, ts, freq, ord DESC"
+)
+
+# Names -> dimension ids (small hash joins; every name was resolved beforehand)
+_ENCODE_SQL = (
+    "SELECT a.id AS asset_id, m.id AS metric_id, s.ts, q.id AS freq_id, s.value, s.is_missing, e.id AS endpoint_id, s.ingested_at"
+    " FROM ({dedup}) s"
+    " JOIN processed.dim_asset a ON a.name = s.asset"
+    " JOIN processed.dim_metric m ON m.name = s.metric"
+    " JOIN processed.dim_freq q ON q.name = s.freq"
+    " LEFT JOIN processed.dim_endpoint e ON e.name = s.source_endpoint"
+)
+
+V4_SELECT_SQL = (
+    "SELECT COALESCE(d.item->>'asset', %(default_asset)s::text) AS asset,"
+    " kv.key AS metric,"
+    f" {_time_sql(_ITEM_TIME)} AS ts,"
+    f" {_FREQ_SQL} AS freq,"
+    f" {_value_sql('kv.value')} AS value,"
+    " jsonb_typeof(kv.value) = 'null' AS is_missing,"
+    " r.endpoint AS source_endpoint,"
+    " d.ord"
+    " FROM raw.api_responses r"
+    " CROSS JOIN LATERAL jsonb_array_elements(r.payload->'data') WITH ORDINALITY AS d(item, ord)"
+    " CROSS JOIN LATERAL jsonb_each(d.item) AS kv"
+    " WHERE r.id = %(raw_id)s"
+    " AND jsonb_typeof(d.item) = 'object'"
+    f" AND {_time_ok_sql(_ITEM_TIME)}"
+    " AND kv.key NOT IN ('time', 'timestamp', 'asset')"
+)
+
+# Python's stub parser skips the whole item when float() rejects a non-null value
+_STUB_ITEM = (
+    "jsonb_typeof(d.item) = 'object' AND d.item->>'metric' IS NOT NULL"
+    " AND (COALESCE(jsonb_typeof(d.item->'value'), 'null') = 'null' OR "
+    + _value_sql("(d.item->'value')")
+    + " IS NOT NULL)"
+)
+
+STUB_SELECT_SQL = (
+    "SELECT d.item->>'asset' AS asset,"
+    " d.item->>'metric' AS metric,"
+    f" {_time_sql(_STUB_TIME)} AS ts,"
+    f" {_FREQ_SQL} AS freq,"
+    " " + _value_sql("(d.item->'value')") + " AS value,"
+    " COALESCE(jsonb_typeof(d.item->'value'), 'null') = 'null' AS is_missing,"
+    " r.endpoint AS source_endpoint,"
+    " d.ord"
+    " FROM raw.api_responses r"
+    " CROSS JOIN LATERAL jsonb_array_elements(r.payload->'data') WITH ORDINALITY AS d(item, ord)"
+    " WHERE r.id = %(raw_id)s"
+    f" AND {_STUB_ITEM}"
+    f" AND {_time_ok_sql(_STUB_TIME)}"
+)
+
+V4_SOURCE_SQL = _ENCODE_SQL.format(dedup=_DEDUP_SQL.format(select=V4_SELECT_SQL))
+STUB_SOURCE_SQL = _ENCODE_SQL.format(dedup=_DEDUP_SQL.format(select=STUB_SELECT_SQL))
+
+# Keys of exactly the items each SELECT keeps (same time expression and filter)
+V4_KEYS_SQL = _keys_sql(_ITEM_TIME, "jsonb_typeof(d.item) = 'object'")
+STUB_KEYS_SQL = _keys_sql(_STUB_TIME, _STUB_ITEM)
+
+
+class ManifestPayload(Exception):
+    """The raw row is a page manifest; its pages can only be decoded in Python."""
+
+
+def transform_raw_id_sql(conn, raw_id: int, default_freq: Optional[str] = None, skip_unchanged: Optional[bool] = None) -> Dict[str, int]:
+    """Unpivot raw id `raw_id` into processed.metrics_long inside Postgres.
+
+    Returns load stats; attempted counts the distinct keys in the payload.
+    Raises `LookupError` for an unknown id and `ManifestPayload` for page
+    manifests.
+    """
+    stats = _new_stats()
+    with conn:
+        with conn.cursor() as cur:
+            cur.execute(PROBE_SQL, {"raw_id": raw_id})
+            probe = cur.fetchone()
+            if probe is None:
+                raise LookupError(f"raw.api_responses id={raw_id} not found")
+            endpoint, raw_params, storage, has_data, is_stub = probe
+            if storage == "pages":
+                raise ManifestPayload(f"raw id={raw_id} is a page manifest")
+            if not has_data:
+                logger.warning("raw id=%s endpoint=%s has empty or missing payload.data, skipping", raw_id, endpoint)
+                return stats
+            cur.execute(STUB_KEYS_SQL if is_stub else V4_KEYS_SQL, {"raw_id": raw_id})
+            years, assets, v4_metrics, stub_metrics = cur.fetchone()
+
+    # Same frequency / default-asset rules as rows_from_payload
+    raw_params = raw_params if isinstance(raw_params, dict) else {}
+    freq = raw_params.get("frequency") or raw_params.get("freq") or default_freq or get_cm_config().get("frequency", "1d")
+    default_asset = None
+    assets_param = raw_params.get("assets") or raw_params.get("asset")
+    if isinstance(assets_param, str) and assets_param:
+        default_asset = assets_param.split(",")[0].strip() or None
+    params = {"raw_id": raw_id, "freq": freq, "default_asset": default_asset}
+
+    ensure_partitions(conn, years)
+    resolve_ids(conn, "asset", list(assets) + ([default_asset] if default_asset else []))
+    resolve_ids(conn, "metric", stub_metrics if is_stub else v4_metrics)
+    resolve_ids(conn, "freq", [freq])
+    resolve_ids(conn, "endpoint", [endpoint])
+    with conn:
+        with conn.cursor() as cur:
+            cur.execute(upsert_sql(STUB_SOURCE_SQL if is_stub else V4_SOURCE_SQL, skip_unchanged_default(skip_unchanged)), params)
+            stats["inserted"], stats["updated"], stats["unchanged"] = cur.fetchone()
+    stats["attempted"] = stats["inserted"] + stats["updated"] + stats["unchanged"]
+    stats["batches"] = 1
+    logger.info("SQL transform raw id=%s (%s): %s", raw_id, "stub" if is_stub else "v4", stats)
+    return stats
+
+
+__all__ = ["ManifestPayload", "transform_raw_id_sql"]
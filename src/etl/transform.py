@@ -6,24 +6,194 @@ list of metric rows ready for loading into `processed.metrics_long`.
 from __future__ import annotations
 
 import logging
+import re
 from datetime import datetime, timezone
-from typing import Dict, List, Any
+from typing import Dict, Iterator, List, Any, Optional, Sequence
 
 from src.db.engine import get_conn
+from src.etl.raw_store import is_manifest, load_manifest_payload
 from src.utils.logging import logger
 from src.config import get_cm_config
 
 
+# ISO-8601 dates/timestamps accepted as item times: date, optional time with
+# seconds/fraction, optional Z or UTC offset. The in-database engine
+# (src.etl.sql_transform) applies the same pattern before casting, so both
+# engines keep and skip the same items. [0-9] rather than \d: Postgres and
+# Python disagree on which non-ASCII digits \d matches.
+_TIME_PATTERN = (
+    r"^(?!0000)[0-9]{4}-(0[1-9]|1[0-2])-(0[1-9]|[12][0-9]|3[01])"
+    r"([T ]([01][0-9]|2[0-3]):[0-5][0-9](:[0-5][0-9](\.[0-9]+)?)?(Z|[+-](0[0-9]|1[0-5])(:?[0-5][0-9])?)?)?$"
+)
+_TIME_RE = re.compile(_TIME_PATTERN)
+
+
 def _parse_time(t: str) -> datetime:
-    """Parse ISO time strings, accepting a trailing Z for UTC."""
+    """Parse ISO time strings matching `_TIME_PATTERN`, accepting a trailing Z for UTC.
+
+    Fractions beyond microseconds are truncated.
+    """
     if not t:
         raise ValueError("empty time string")
+    if not isinstance(t, str) or not _TIME_RE.match(t):
+        raise ValueError(f"not an ISO-8601 time: {t!r}")
     # Accept Z as UTC
     if t.endswith("Z"):
-        t = t.replace("Z", "+00:00")
+        t = t[:-1] + "+00:00"
     return datetime.fromisoformat(t)
 
 
+def iter_rows_from_payload(payload: Any, params: Any, endpoint: str, rid: Any = None, default_freq: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """Yield the metric rows of one raw payload (merged response or a single page).
+
+    Detects the stub format (one item per asset/metric/time) vs the
+    CoinMetrics v4 format (one item per time with metric columns).
+    `rid` is only used in log messages.
+    """
+    params = params or {}
+
+    data_list = payload.get("data") if isinstance(payload, dict) else None
+    if not data_list:
+        logger.warning("raw id=%s endpoint=%s has empty or missing payload.data, skipping", rid, endpoint)
+        return
+
+    # Determine frequency: from params or env default
+    freq = None
+    try:
+        if isinstance(params, dict):
+            freq = params.get("frequency") or params.get("freq") or params.get("frequency")
+    except Exception:
+        freq = None
+    if not freq:
+        freq = default_freq or get_cm_config().get("frequency", "1d")
+
+    # Heuristic: detect stub format vs CoinMetrics v4 format
+    first_item = data_list[0] if isinstance(data_list, (list, tuple)) and data_list else None
+    is_stub = False
+    if isinstance(first_item, dict):
+        if "metric" in first_item and "value" in first_item:
+            is_stub = True
+
+    if is_stub:
+        # Reuse previous stub-parsing logic
+        for item in data_list:
+            try:
+                asset = item.get("asset")
+                metric = item.get("metric")
+                time_s = item.get("time")
+                value = item.get("value") if "value" in item else None
+
+                if asset is None or metric is None or time_s is None:
+                    raise KeyError("missing asset/metric/time in data item")
+
+                ts = _parse_time(time_s)
+
+                is_missing = value is None
+
+                row = {
+                    "asset": asset,
+                    "metric": metric,
+                    "ts": ts,
+                    "freq": freq,
+                    "value": float(value) if value is not None else None,
+                    "is_missing": bool(is_missing),
+                    "source_endpoint": endpoint,
+                }
+                yield row
+            except Exception as exc:
+                logger.error("Skipping stub data item in raw id=%s due to error: %s", rid, exc)
+                continue
+    else:
+        # Fall back to request params: 'assets' may be comma-separated
+        default_asset = None
+        if isinstance(params, dict):
+            assets_param = params.get("assets") or params.get("asset")
+            if isinstance(assets_param, str):
+                default_asset = assets_param.split(",")[0].strip() if assets_param else None
+
+        # CoinMetrics v4 parser: each element may contain time, asset and many metric columns
+        for item in data_list:
+            if not isinstance(item, dict):
+                logger.debug("Skipping non-dict data item in raw id=%s", rid)
+                continue
+
+            time_s = item.get("time") or item.get("timestamp")
+            if time_s is None:
+                logger.error("Skipping item without time in raw id=%s: %s", rid, item)
+                continue
+
+            try:
+                ts = _parse_time(time_s)
+            except Exception as exc:
+                logger.error("Invalid time in raw id=%s item=%s error=%s", rid, item, exc)
+                continue
+
+            asset = item.get("asset")
+            if asset is None:
+                asset = default_asset
+            if asset is None:
+                # processed.metrics_fact needs an asset; the SQL engine drops these too
+                logger.error("Skipping item without asset in raw id=%s: %s", rid, item)
+                continue
+
+            # Iterate over metric-like keys (everything except time/asset)
+            for k, v in item.items():
+                if k in ("time", "timestamp", "asset"):
+                    continue
+
+                metric = k
+                value = v
+                is_missing = value is None
+
+                # Try numeric coercion
+                coerced_value = None
+                if value is not None:
+                    try:
+                        coerced_value = float(value)
+                    except Exception:
+                        # leave as None (treated missing) but still record presence
+                        coerced_value = None
+
+                row = {
+                    "asset": asset,
+                    "metric": metric,
+                    "ts": ts,
+                    "freq": freq,
+                    "value": coerced_value,
+                    "is_missing": bool(is_missing),
+                    "source_endpoint": endpoint,
+                }
+                yield row
+
+
+def rows_from_payload(payload: Any, params: Any, endpoint: str, rid: Any = None, default_freq: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Convert one raw payload into a list of metric rows (see `iter_rows_from_payload`)."""
+    return list(iter_rows_from_payload(payload, params, endpoint, rid=rid, default_freq=default_freq))
+
+
+def _latest_raw_id(conn) -> Optional[int]:
+    """Id of the newest successful timeseries record (asset-metrics, else stub), or None."""
+    # Look for the newest successful CoinMetrics timeseries record first
+    with conn.cursor() as cur:
+        for endpoint in ("timeseries/asset-metrics", "timeseries.stub"):
+            cur.execute(
+                "SELECT id FROM raw.api_responses WHERE endpoint=%s AND status_code=200 ORDER BY id DESC LIMIT 1",
+                (endpoint,),
+            )
+            found = cur.fetchone()
+            if found:
+                return found[0]
+
+    logger.info("No successful timeseries raw record found (searched asset-metrics then stub)")
+    return None
+
+
+def _latest_raw_record(conn):
+    """Return (id, endpoint, params, payload) of the newest successful timeseries record, or None."""
+    rid = _latest_raw_id(conn)
+    return _raw_record(conn, rid) if rid is not None else None
+
+
 def transform_latest_raw(limit: int = 50) -> List[Dict[str, Any]]:
     """Read latest N raw.api_responses and convert payload->data into rows.
 
@@ -35,140 +205,313 @@ def transform_latest_raw(limit: int = 50) -> List[Dict[str, Any]]:
 
     conn = get_conn()
     try:
-        # Look for the newest successful CoinMetrics timeseries record first
-        with conn.cursor() as cur:
-            cur.execute(
-                "SELECT id, endpoint, params, payload FROM raw.api_responses WHERE endpoint=%s AND status_code=200 ORDER BY id DESC LIMIT 1",
-                ("timeseries/asset-metrics",),
-            )
-            found = cur.fetchone()
+        record = _latest_raw_record(conn)
+        if record is None:
+            return rows
+        rid, endpoint, params, payload = record
+        rows = rows_from_payload(payload, params, endpoint, rid=rid, default_freq=cm_defaults.get("frequency", "1d"))
 
-            if not found:
-                # Fallback to stub timeseries
-                cur.execute(
-                    "SELECT id, endpoint, params, payload FROM raw.api_responses WHERE endpoint=%s AND status_code=200 ORDER BY id DESC LIMIT 1",
-                    ("timeseries.stub",),
-                )
-                found = cur.fetchone()
+    finally:
+        try:
+            conn.close()
+        except Exception:
+            pass
 
-        if not found:
-            logger.info("No successful timeseries raw record found (searched asset-metrics then stub)")
-            return rows
+    return rows
 
-        rid, endpoint, params, payload = found[0], found[1], found[2] or {}, found[3] or {}
 
-        data_list = payload.get("data") if isinstance(payload, dict) else None
-        if not data_list:
-            logger.warning("raw id=%s endpoint=%s has empty or missing payload.data, skipping", rid, endpoint)
-            return rows
+def transform_latest_columns(limit: int = 50):
+    """Columnar variant of `transform_latest_raw`.
 
-        # Determine frequency: from params or env default
-        freq = None
+    Returns `src.etl.columnar.MetricColumns` (typed arrays, see that module)
+    for `src.etl.load.load_columns`, or None when there is nothing to load.
+    Stub payloads are parsed row-wise and then converted.
+    """
+    from src.etl.columnar import columns_from_payload, columns_from_rows
+
+    default_freq = get_cm_config().get("frequency", "1d")
+    conn = get_conn()
+    try:
+        record = _latest_raw_record(conn)
+        if record is None:
+            return None
+        rid, endpoint, params, payload = record
+        cols = columns_from_payload(payload, params, endpoint, rid=rid, default_freq=default_freq)
+        if cols is None:
+            rows = rows_from_payload(payload, params, endpoint, rid=rid, default_freq=default_freq)
+            cols = columns_from_rows(rows) if rows else None
+    finally:
         try:
-            if isinstance(params, dict):
-                freq = params.get("frequency") or params.get("freq") or params.get("frequency")
+            conn.close()
         except Exception:
-            freq = None
-        if not freq:
-            freq = cm_defaults.get("frequency", "1d")
-
-        # Heuristic: detect stub format vs CoinMetrics v4 format
-        first_item = data_list[0] if isinstance(data_list, (list, tuple)) and data_list else None
-        is_stub = False
-        if isinstance(first_item, dict):
-            if "metric" in first_item and "value" in first_item:
-                is_stub = True
-
-        if is_stub:
-            # Reuse previous stub-parsing logic
-            for item in data_list:
-                try:
-                    asset = item.get("asset")
-                    metric = item.get("metric")
-                    time_s = item.get("time")
-                    value = item.get("value") if "value" in item else None
-
-                    if asset is None or metric is None or time_s is None:
-                        raise KeyError("missing asset/metric/time in data item")
-
-                    ts = _parse_time(time_s)
-
-                    is_missing = value is None
-
-                    row = {
-                        "asset": asset,
-                        "metric": metric,
-                        "ts": ts,
-                        "freq": freq,
-                        "value": float(value) if value is not None else None,
-                        "is_missing": bool(is_missing),
-                        "source_endpoint": endpoint,
-                    }
-                    rows.append(row)
-                except Exception as exc:
-                    logger.error("Skipping stub data item in raw id=%s due to error: %s", rid, exc)
-                    continue
-        else:
-            # CoinMetrics v4 parser: each element may contain time, asset and many metric columns
-            for item in data_list:
-                if not isinstance(item, dict):
-                    logger.debug("Skipping non-dict data item in raw id=%s", rid)
-                    continue
+            pass
 
-                time_s = item.get("time") or item.get("timestamp")
-                if time_s is None:
-                    logger.error("Skipping item without time in raw id=%s: %s", rid, item)
-                    continue
+    return cols
 
-                try:
-                    ts = _parse_time(time_s)
-                except Exception as exc:
-                    logger.error("Invalid time in raw id=%s item=%s error=%s", rid, item, exc)
-                    continue
 
-                asset = item.get("asset")
-                # Fall back to request params: 'assets' may be comma-separated
-                if asset is None and isinstance(params, dict):
-                    assets_param = params.get("assets") or params.get("asset")
-                    if isinstance(assets_param, str):
-                        asset = assets_param.split(",")[0].strip() if assets_param else None
-
-                # Iterate over metric-like keys (everything except time/asset)
-                for k, v in item.items():
-                    if k in ("time", "timestamp", "asset"):
-                        continue
-
-                    metric = k
-                    value = v
-                    is_missing = value is None
-
-                    # Try numeric coercion
-                    coerced_value = None
-                    if value is not None:
-                        try:
-                            coerced_value = float(value)
-                        except Exception:
-                            # leave as None (treated missing) but still record presence
-                            coerced_value = None
-
-                    row = {
-                        "asset": asset,
-                        "metric": metric,
-                        "ts": ts,
-                        "freq": freq,
-                        "value": coerced_value,
-                        "is_missing": bool(is_missing),
-                        "source_endpoint": endpoint,
-                    }
-                    rows.append(row)
+TIMESERIES_ENDPOINTS = ("timeseries/asset-metrics", "timeseries.stub")
+
+
+def transform_iter(
+    batch_size: Optional[int] = None,
+    raw_ids: Optional[Sequence[int]] = None,
+    limit: Optional[int] = None,
+) -> Iterator[List[Dict[str, Any]]]:
+    """Yield transformed rows in lists of `batch_size` (default `ETL_TRANSFORM_BATCH_ROWS`).
 
+    Raw payloads are read in id order through a named (server-side)
+    cursor, a few at a time, so neither all raw responses nor all rows are
+    held in memory; batches may span several raw responses (the last one
+    may be shorter). Reads `raw_ids` if given, else the `limit` newest
+    successful timeseries responses (all of them when `limit` is None).
+    """
+    from src.config import get_transform_config
+
+    cfg = get_transform_config()
+    batch_size = max(1, int(batch_size or cfg["batch_rows"]))
+    default_freq = get_cm_config().get("frequency", "1d")
+
+    if raw_ids is not None:
+        sql = "SELECT id, endpoint, params, payload FROM raw.api_responses WHERE id = ANY(%s) ORDER BY id"
+        args: tuple = (list(raw_ids),)
+    else:
+        sql = (
+            "SELECT id, endpoint, params, payload FROM raw.api_responses"
+            " WHERE endpoint = ANY(%s) AND status_code = 200"
+        )
+        args = (list(TIMESERIES_ENDPOINTS),)
+        if limit is not None:
+            sql += " AND id IN (SELECT id FROM raw.api_responses WHERE endpoint = ANY(%s) AND status_code = 200 ORDER BY id DESC LIMIT %s)"
+            args += (list(TIMESERIES_ENDPOINTS), int(limit))
+        sql += " ORDER BY id"
+
+    conn = get_conn()
+    try:
+        batch: List[Dict[str, Any]] = []
+        with conn.cursor(name="transform_iter") as cur:
+            # Payloads can be large: fetch only a few per round-trip
+            cur.itersize = max(1, int(cfg["fetch_payloads"]))
+            cur.execute(sql, args)
+            for rid, endpoint, params, payload in cur:
+                payload = payload or {}
+                if is_manifest(payload):
+                    payload = load_manifest_payload(conn, payload)
+                for row in iter_rows_from_payload(payload, params or {}, endpoint, rid=rid, default_freq=default_freq):
+                    batch.append(row)
+                    if len(batch) >= batch_size:
+                        yield batch
+                        batch = []
+        if batch:
+            yield batch
     finally:
         try:
             conn.close()
         except Exception:
             pass
 
-    return rows
+
+def transform_latest_iter(batch_size: Optional[int] = None) -> Iterator[List[Dict[str, Any]]]:
+    """Streaming variant of `transform_latest_raw`: rows of the newest
+    timeseries record in lists of `batch_size` (see `transform_iter`)."""
+    conn = get_conn()
+    try:
+        rid = _latest_raw_id(conn)
+    finally:
+        try:
+            conn.close()
+        except Exception:
+            pass
+    if rid is None:
+        return
+    yield from transform_iter(batch_size=batch_size, raw_ids=[rid])
+
+
+def _raw_record(conn, raw_id: int):
+    """Return (id, endpoint, params, payload) for one raw id (manifests resolved), or None."""
+    with conn.cursor() as cur:
+        cur.execute("SELECT id, endpoint, params, payload FROM raw.api_responses WHERE id=%s", (raw_id,))
+        found = cur.fetchone()
+    if not found:
+        return None
+    rid, endpoint, params, payload = found[0], found[1], found[2] or {}, found[3] or {}
+    if is_manifest(payload):
+        payload = load_manifest_payload(conn, payload)
+    return rid, endpoint, params, payload
+
+
+def transform_raw_id(conn, raw_id: int, engine: Optional[str] = None, load_mode: Optional[str] = None) -> int:
+    """Transform one raw response and load it into processed.metrics_long.
+
+    Returns the number of rows written (inserted + updated). Raises if the
+    id does not exist or part of the load failed.
+    """
+    from src.config import get_transform_config
+    from src.etl.load import load_columns, load_metrics
+
+    default_freq = get_cm_config().get("frequency", "1d")
+    engine = engine or get_transform_config()["engine"]
+    if engine == "sql":
+        from src.etl.sql_transform import ManifestPayload, transform_raw_id_sql
+
+        try:
+            stats = transform_raw_id_sql(conn, raw_id, default_freq=default_freq)
+            return stats["inserted"] + stats["updated"]
+        except ManifestPayload:
+            logger.info("raw id=%s is a page manifest; using the python engine", raw_id)
+
+    record = _raw_record(conn, raw_id)
+    if record is None:
+        raise LookupError(f"raw.api_responses id={raw_id} not found")
+    rid, endpoint, params, payload = record
+
+    stats = None
+    if engine == "columnar":
+        from src.etl.columnar import columns_from_payload
+
+        cols = columns_from_payload(payload, params, endpoint, rid=rid, default_freq=default_freq)
+        if cols is not None:
+            stats = load_columns(cols, conn=conn)
+    if stats is None:
+        rows = rows_from_payload(payload, params, endpoint, rid=rid, default_freq=default_freq)
+        stats = load_metrics(rows, conn=conn, mode=load_mode)
+    if stats["failed_rows"]:
+        raise RuntimeError(f"{stats['failed_rows']} rows of raw id={rid} failed to load")
+    return stats["inserted"] + stats["updated"]
+
+
+def transform_latest_sql() -> int:
+    """Transform + load the newest timeseries raw record with the in-database engine.
+
+    Falls back to the python engine for page manifests. Returns the number
+    of rows written (inserted + updated).
+    """
+    conn = get_conn()
+    try:
+        rid = _latest_raw_id(conn)
+        if rid is None:
+            return 0
+        return transform_raw_id(conn, rid, engine="sql")
+    finally:
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+def _pending_worker(claim_size: int, engine: Optional[str], load_mode: Optional[str]) -> Dict[str, int]:
+    """Claim and transform pending raw ids until none are left (runs in a worker process).
+
+    Each claim holds ids of one series, applied in id order. When one fails,
+    the newer ids of the claim are released unapplied: the series stays
+    blocked until the failed id is retried (see `src.etl.ledger`). The
+    worker stops when nothing can be claimed: ids still pending then belong
+    to series another worker is processing (that worker claims them next)
+    or to series stopped by a failure.
+    """
+    import os
+    import socket
+
+    from src.etl.ledger import claim_pending, mark_done, mark_failed, release_ids
+
+    worker = f"{socket.gethostname()}:{os.getpid()}"
+    stats = {"raw_ids": 0, "rows": 0, "failed": 0}
+    conn = get_conn()
+    try:
+        while True:
+            ids = claim_pending(conn, worker, claim_size)
+            if not ids:
+                break
+            for i, raw_id in enumerate(ids):
+                try:
+                    n = transform_raw_id(conn, raw_id, engine=engine, load_mode=load_mode)
+                except Exception as exc:
+                    conn.rollback()
+                    logger.error("Transform of raw id=%s failed: %s", raw_id, exc)
+                    mark_failed(conn, raw_id, repr(exc))
+                    stats["failed"] += 1
+                    # Newer ids of the series must not be applied before this one
+                    skipped = ids[i + 1:]
+                    if skipped:
+                        release_ids(conn, skipped)
+                        logger.warning("Released raw ids %s until raw id=%s is retried", skipped, raw_id)
+                    break
+                mark_done(conn, raw_id, n)
+                stats["raw_ids"] += 1
+                stats["rows"] += n
+    finally:
+        try:
+            conn.close()
+        except Exception:
+            pass
+    return stats
+
+
+def transform_pending(
+    max_workers: Optional[int] = None,
+    claim_size: Optional[int] = None,
+    engine: Optional[str] = None,
+    load_mode: Optional[str] = None,
+    retry_failed: bool = False,
+    stale_after: Optional[str] = None,
+) -> Dict[str, int]:
+    """Transform and load every raw response not yet in the transform ledger.
+
+    Runs `max_workers` processes (default `ETL_TRANSFORM_WORKERS`, else one
+    per CPU); each claims `claim_size` ids at a time from
+    `raw.transform_ledger` until nothing is pending. With `retry_failed`,
+    ids that failed in an earlier run (and the series they stopped) are
+    claimed again. `stale_after` (default `ETL_TRANSFORM_STALE_AFTER`, a
+    Postgres interval such as '1 hour') releases 'processing' claims older
+    than that, left behind by workers that died.
+    Returns aggregated stats: raw_ids, rows, failed, workers.
+    """
+    import os
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+
+    from src.config import get_transform_config
+    from src.etl.ledger import pending_count, release_claims
+
+    cfg = get_transform_config()
+    max_workers = max_workers or int(cfg["workers"] or 0) or os.cpu_count() or 1
+    claim_size = claim_size or int(cfg["claim_size"])
+    stale_after = stale_after or cfg["stale_after"] or None
+
+    conn = get_conn()
+    try:
+        if retry_failed or stale_after:
+            released = release_claims(conn, failed=retry_failed, stale_after=stale_after)
+            logger.info("Released %s transform claims (failed=%s, stale_after=%s)", released, retry_failed, stale_after)
+        pending = pending_count(conn)
+    finally:
+        conn.close()
+
+    totals = {"raw_ids": 0, "rows": 0, "failed": 0, "workers": 0}
+    if not pending:
+        logger.info("Transform ledger: nothing pending")
+        return totals
+
+    # No point in more workers than pending ids
+    workers = max(1, min(max_workers, -(-pending // claim_size)))
+    totals["workers"] = workers
+    logger.info("Transforming %s pending raw ids with %s workers (claim_size=%s)", pending, workers, claim_size)
+
+    if workers == 1:
+        results = [_pending_worker(claim_size, engine, load_mode)]
+    else:
+        results = []
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_pending_worker, claim_size, engine, load_mode) for _ in range(workers)]
+            for fut in as_completed(futures):
+                try:
+                    results.append(fut.result())
+                except Exception as exc:
+                    logger.error("Transform worker crashed: %s", exc)
+
+    for r in results:
+        for k in ("raw_ids", "rows", "failed"):
+            totals[k] += r[k]
+    logger.info("Transform ledger run finished: %s", totals)
+    return totals
 
 
 if __name__ == "__main__":
@@ -15,7 +15,7 @@ from typing import Dict, Any
 
 import pandas as pd
 
-from src.db.engine import get_conn
+from src.db.engine import connection
 from src.utils.logging import logger
 
 
@@ -92,18 +92,12 @@ def run_rolling_stability(output_dir: str = "reports/profiling") -> Dict[str, An
     tables_dir = out_dir / "tables"
     tables_dir.mkdir(parents=True, exist_ok=True)
 
-    conn = get_conn()
-    try:
+    with connection() as conn:
         df = compute_rolling_stability(conn)
         path = tables_dir / "rolling_stability.csv"
         df.to_csv(path, index=False, header=True)
         out["rolling_stability_csv"] = str(path)
         out["rows_rolling_stability"] = len(df)
-    finally:
-        try:
-            conn.close()
-        except Exception:
-            pass
 
     logger.info("Rolling stability outputs: %s", out)
     return out
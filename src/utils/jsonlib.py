@@ -0,0 +1,47 @@
+"""JSON encode/decode helpers with an optional fast backend.
+
+Uses `orjson` when it is installed and falls back to the stdlib `json`
+module otherwise. The same backend is used for decoding API responses and
+for encoding JSONB parameters sent to Postgres (`pg_json`).
+"""
+import json
+from typing import Any, Union
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+
+BACKEND = "orjson" if orjson is not None else "json"
+
+
+def loads(data: Union[bytes, bytearray, memoryview, str]) -> Any:
+    """Decode JSON from bytes or str."""
+    if orjson is not None:
+        return orjson.loads(data)
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        data = bytes(data).decode("utf-8")
+    return json.loads(data)
+
+
+def dumps_bytes(obj: Any) -> bytes:
+    """Encode to UTF-8 JSON bytes (compact)."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+
+
+def dumps(obj: Any) -> str:
+    """Encode to a JSON str (compact)."""
+    return dumps_bytes(obj).decode("utf-8")
+
+
+def pg_json(obj: Any):
+    """Wrap `obj` for a JSONB parameter, serialized with the fast backend."""
+    import psycopg2.extras
+
+    return psycopg2.extras.Json(obj, dumps=dumps)
+
+
+__all__ = ["BACKEND", "loads", "dumps", "dumps_bytes", "pg_json"]
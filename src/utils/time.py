@@ -1,7 +1,91 @@
-"""Time utilities (placeholder)."""
+"""Time utilities: date parsing and splitting long request windows."""
 
-from datetime import datetime
+import re
+from datetime import datetime, timedelta, timezone
+from typing import List, Tuple
 
 
 def parse_date(s):
     return datetime.fromisoformat(s)
+
+
+_FRACTION_RE = re.compile(r"(\.\d+)")
+
+
+def parse_utc(s: str) -> datetime:
+    """Parse 'YYYY-MM-DD' or ISO8601 (trailing Z allowed) into an aware UTC datetime."""
+    s = str(s).strip()
+    if s.endswith("Z"):
+        s = s[:-1] + "+00:00"
+    # CoinMetrics uses nanosecond fractions; datetime only keeps microseconds
+    s = _FRACTION_RE.sub(lambda m: m.group(1)[:7], s)
+    dt = datetime.fromisoformat(s)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc)
+
+
+def format_utc(dt: datetime) -> str:
+    """Format an aware datetime as ISO8601 UTC with a trailing Z (no microseconds)."""
+    return dt.astimezone(timezone.utc).replace(microsecond=0).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+_SPAN_RE = re.compile(r"^\s*(\d+)\s*([hdwy])\s*$", re.IGNORECASE)
+
+
+def parse_span(span: str) -> Tuple[int, str]:
+    """Parse a window span like '1y', '90d', '2w' or '12h' into (count, unit)."""
+    m = _SPAN_RE.match(str(span or ""))
+    if not m:
+        raise ValueError(f"invalid window span: {span!r} (expected e.g. 1y, 90d, 2w, 12h)")
+    n = int(m.group(1))
+    if n <= 0:
+        raise ValueError(f"window span must be positive: {span!r}")
+    return n, m.group(2).lower()
+
+
+def _advance(dt: datetime, n: int, unit: str) -> datetime:
+    if unit == "y":
+        # Calendar years: next window starts on Jan 1st
+        return dt.replace(year=dt.year + n, month=1, day=1, hour=0, minute=0, second=0, microsecond=0)
+    if unit == "w":
+        return dt + timedelta(weeks=n)
+    if unit == "d":
+        return dt + timedelta(days=n)
+    return dt + timedelta(hours=n)
+
+
+def span_to_timedelta(span: str) -> timedelta:
+    """Convert a fixed-size span ('3d', '2w', '12h') into a timedelta ('y' is not fixed-size)."""
+    n, unit = parse_span(span)
+    if unit == "y":
+        raise ValueError(f"span must be in hours, days or weeks: {span!r}")
+    if unit == "w":
+        return timedelta(weeks=n)
+    if unit == "d":
+        return timedelta(days=n)
+    return timedelta(hours=n)
+
+
+def split_window(start: str, end: str, span: str) -> List[Tuple[str, str]]:
+    """Split [start, end] into consecutive sub-windows of at most `span`.
+
+    Windows share their boundary timestamp (end of window i == start of
+    window i+1) because the API treats both bounds as inclusive; callers
+    dedup the boundary point when stitching. Years are aligned to calendar
+    years, other units are fixed-size from `start`.
+    Returns a list of (start, end) ISO8601 UTC strings in order.
+    """
+    n, unit = parse_span(span)
+    start_dt = parse_utc(start)
+    end_dt = parse_utc(end)
+    if end_dt <= start_dt:
+        return [(format_utc(start_dt), format_utc(end_dt))]
+
+    windows: List[Tuple[str, str]] = []
+    cur = start_dt
+    while cur < end_dt:
+        nxt = min(_advance(cur, n, unit), end_dt)
+        windows.append((format_utc(cur), format_utc(nxt)))
+        cur = nxt
+    return windows
@@ -0,0 +1,133 @@
+"""Shared test helpers: a fake psycopg2 connection (no database needed) and a script loader.
+
+`FakeConn` answers each `execute` either from a queue of scripted results
+or from a `handler(sql, params)` callback that emulates the tables a test
+cares about. It records every statement, COPY payload, commit, rollback
+and named (server-side) cursor, and supports `with conn:` transactions.
+`load_script` imports one of the numbered scripts/ entry points. Test
+modules import them with `from conftest import FakeConn, load_script`.
+"""
+import importlib.util
+import pathlib
+
+SCRIPTS = pathlib.Path(__file__).resolve().parent.parent / "scripts"
+
+# psycopg2.extensions.TRANSACTION_STATUS_IDLE (psycopg2 may not be installed)
+IDLE = 0
+
+
+class FakeCursor:
+    def __init__(self, conn, name=None):
+        self.conn = conn
+        self.name = name
+        self.itersize = 2000
+        self.rowcount = -1
+        self._rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        self.conn.executed.append((sql, params))
+        result = self.conn.respond(sql, params)
+        if isinstance(result, int):
+            self.rowcount, self._rows = result, []
+        else:
+            self._rows = list(result or [])
+            self.rowcount = len(self._rows)
+
+    def fetchone(self):
+        return self._rows.pop(0) if self._rows else None
+
+    def fetchall(self):
+        rows, self._rows = self._rows, []
+        return rows
+
+    def __iter__(self):
+        while self._rows:
+            self.conn.fetched += 1
+            yield self._rows.pop(0)
+
+    def copy_expert(self, sql, buf):
+        data = buf.read()
+        self.conn.copied.append(data)
+        if self.conn.handler is not None:
+            self.conn.handler(sql, data)
+
+
+class FakeConn:
+    """Fake psycopg2 connection.
+
+    `results`: one entry per executed statement (a list of row tuples, a
+    rowcount int, or an exception to raise), used when no `handler` is set.
+    `handler(sql, params)`: returns the rows (or a rowcount) for a
+    statement; COPY payloads are passed to it as `params`.
+    """
+
+    def __init__(self, results=(), handler=None, status=IDLE):
+        self.results = list(results)
+        self.handler = handler
+        self.status = status
+        self.executed = []
+        self.copied = []
+        self.cursors = []
+        self.fetched = 0
+        self.commits = 0
+        self.rollbacks = 0
+        self.autocommit = False
+        # psycopg2 reports closed as an int (0 = open)
+        self.closed = 0
+
+    def respond(self, sql, params):
+        if self.handler is not None:
+            return self.handler(sql, params)
+        if not self.results:
+            return []
+        result = self.results.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    @property
+    def statements(self):
+        return [sql for sql, _ in self.executed]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.rollback()
+        return False
+
+    def cursor(self, name=None):
+        cur = FakeCursor(self, name)
+        self.cursors.append(cur)
+        return cur
+
+    def commit(self):
+        self.commits += 1
+        self.status = IDLE
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.status = IDLE
+
+    def get_transaction_status(self):
+        return self.status
+
+    def close(self):
+        self.closed = 1
+
+
+def load_script(filename):
+    """Import scripts/<filename> as a module (names like 10_etl_run.py are not importable)."""
+    spec = importlib.util.spec_from_file_location(pathlib.Path(filename).stem, SCRIPTS / filename)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
@@ -0,0 +1,104 @@
+"""Tests for AsyncCoinMetricsClient pagination (HTTP mocked, no network)."""
+import asyncio
+import contextlib
+import threading
+
+import pytest
+
+pytest.importorskip("aiohttp")
+
+from src.coinmetrics.async_client import AsyncCoinMetricsClient
+
+
+def _client(monkeypatch, pages, calls, block=None):
+    client = AsyncCoinMetricsClient(use_cache=False)
+
+    async def fake_request_json(path, params=None, cache_ttl=None):
+        calls.append(path)
+        if path == block:
+            try:
+                await asyncio.Event().wait()
+            except asyncio.CancelledError:
+                calls.append("cancelled")
+                raise
+        return pages[path]
+
+    monkeypatch.setattr(client, "request_json", fake_request_json)
+    return client
+
+
+PAGES = {
+    "/timeseries/asset-metrics": {"data": [{"time": "t1"}], "next_page_url": "https://x/p2"},
+    "https://x/p2": {"data": [{"time": "t2"}], "next_page_url": "https://x/p3"},
+    "https://x/p3": {"data": [{"time": "t3"}], "next_page_url": None},
+}
+
+
+def test_iter_pages_prefetches_next_page_and_keeps_order(monkeypatch):
+    calls = []
+    client = _client(monkeypatch, PAGES, calls)
+
+    async def consume():
+        seen = []
+        async for page in client.iter_asset_metrics_pages("btc", ["PriceUSD"], "2020-01-01", "2020-01-03"):
+            # Give the prefetch task a chance to start while we "process" the page
+            await asyncio.sleep(0)
+            seen.append((page["data"][0]["time"], len(calls)))
+        return seen
+
+    seen = asyncio.run(consume())
+    # Page N+1 was already requested while page N was being handled
+    assert seen == [("t1", 2), ("t2", 3), ("t3", 3)]
+    assert calls == ["/timeseries/asset-metrics", "https://x/p2", "https://x/p3"]
+
+
+def test_iter_pages_cancels_prefetch_when_caller_stops(monkeypatch):
+    calls = []
+    client = _client(monkeypatch, PAGES, calls, block="https://x/p2")
+
+    async def first_only():
+        pages = client.iter_pages("/timeseries/asset-metrics")
+        page = await pages.__anext__()
+        await asyncio.sleep(0)
+        await pages.aclose()
+        await asyncio.sleep(0)
+        return page
+
+    assert asyncio.run(first_only())["data"] == [{"time": "t1"}]
+    assert calls == ["/timeseries/asset-metrics", "https://x/p2", "cancelled"]
+
+
+def test_iter_pages_cancels_prefetch_when_loop_body_raises(monkeypatch):
+    calls = []
+    client = _client(monkeypatch, PAGES, calls, block="https://x/p2")
+
+    async def failing_body():
+        async with contextlib.aclosing(client.iter_pages("/timeseries/asset-metrics")) as pages:
+            async for page in pages:
+                await asyncio.sleep(0)
+                raise ValueError("bad page")
+
+    with pytest.raises(ValueError):
+        asyncio.run(failing_body())
+    # The in-flight request was cancelled and awaited before the error propagated
+    assert calls == ["/timeseries/asset-metrics", "https://x/p2", "cancelled"]
+
+
+def test_cache_io_runs_off_the_event_loop():
+    class RecordingCache:
+        def __init__(self):
+            self.threads = []
+
+        def get(self, key):
+            self.threads.append(threading.get_ident())
+            return {"data": [], "cached": True}
+
+    cache = RecordingCache()
+    client = AsyncCoinMetricsClient(cache=cache)
+
+    async def fetch():
+        return await client.request_json("/catalog/assets", cache_ttl=60), threading.get_ident()
+
+    body, loop_thread = asyncio.run(fetch())
+    assert body["cached"] and client.stats.snapshot()["cache_hits"] == 1
+    assert cache.threads and loop_thread not in cache.threads
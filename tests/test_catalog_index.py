@@ -0,0 +1,67 @@
+"""Tests for the catalog-derived availability index."""
+from src.coinmetrics.catalog import build_availability_index, plan_asset_request
+
+
+CATALOG = {
+    "data": [
+        {
+            "asset": "btc",
+            "full_name": "Bitcoin",
+            "metrics": [
+                {
+                    "metric": "PriceUSD",
+                    "frequencies": [
+                        {"frequency": "1d", "min_time": "2010-07-18T00:00:00.000000000Z", "max_time": "2024-06-01T00:00:00.000000000Z"},
+                    ],
+                },
+                {
+                    "metric": "TxCnt",
+                    "frequencies": [
+                        {"frequency": "1b", "min_time": "2009-01-03T18:15:05.000000000Z", "max_time": "2024-06-01T00:00:00.000000000Z"},
+                        {"frequency": "1d", "min_time": "2009-01-03T00:00:00.000000000Z", "max_time": "2024-06-01T00:00:00.000000000Z"},
+                    ],
+                },
+            ],
+        },
+        {"asset": "eth", "metrics": [{"metric": "TxCnt", "frequencies": [{"frequency": "1d", "min_time": "2015-07-30T00:00:00Z", "max_time": "2024-06-01T00:00:00Z"}]}]},
+    ]
+}
+
+
+def test_build_index_shape():
+    index = build_availability_index(CATALOG)
+    assert set(index) == {"btc", "eth"}
+    assert set(index["btc"]["TxCnt"]) == {"1b", "1d"}
+    assert build_availability_index({"error": "x"}) == {}
+
+
+def test_plan_prunes_and_clamps_start():
+    index = build_availability_index(CATALOG)
+    metrics, start, end = plan_asset_request(index, "eth", ["PriceUSD", "TxCnt"], "1d", "2013-01-01T00:00:00Z", "2015-12-31T00:00:00Z")
+    assert metrics == ["TxCnt"]
+    assert start == "2015-07-30T00:00:00Z"
+    assert end == "2015-12-31T00:00:00Z"
+
+
+def test_plan_uses_earliest_start_of_kept_metrics():
+    index = build_availability_index(CATALOG)
+    metrics, start, _ = plan_asset_request(index, "btc", ["PriceUSD", "TxCnt"], "1d", "2008-01-01", "2015-12-31")
+    assert metrics == ["PriceUSD", "TxCnt"]
+    assert start == "2009-01-03T00:00:00Z"
+
+
+def test_plan_skips_impossible_requests():
+    index = build_availability_index(CATALOG)
+    assert plan_asset_request(index, "doge", ["TxCnt"], "1d", "2013-01-01", "2015-12-31") is None
+    assert plan_asset_request(index, "eth", ["TxCnt"], "1h", "2013-01-01", "2015-12-31") is None
+    assert plan_asset_request(index, "eth", ["TxCnt"], "1d", "2013-01-01", "2014-12-31") is None
+    # empty index = unknown catalog, request unchanged
+    assert plan_asset_request({}, "doge", ["TxCnt"], "1d", "a", "b") == (["TxCnt"], "a", "b")
+
+
+def test_plan_never_clamps_the_end_to_a_stale_max_time():
+    index = build_availability_index(CATALOG)
+    # The cached catalog says eth TxCnt ends 2024-06-01; newer points may exist by now
+    metrics, start, end = plan_asset_request(index, "eth", ["TxCnt"], "1d", "2024-05-01", "2024-07-01")
+    assert metrics == ["TxCnt"]
+    assert (start, end) == ("2024-05-01T00:00:00Z", "2024-07-01T00:00:00Z")
@@ -3,3 +3,46 @@
 def test_client_import():
     from src.coinmetrics import client
     assert hasattr(client, 'noop') or True
+
+
+class FakeResponse:
+    def __init__(self, body):
+        import json
+
+        self.status_code = 200
+        self.content = json.dumps(body).encode()
+        self.headers = {}
+
+
+class FakeSession:
+    def __init__(self, bodies):
+        self.bodies = bodies
+        self.calls = []
+
+    def get(self, url, params=None, headers=None, timeout=None):
+        self.calls.append((url, params))
+        return FakeResponse(self.bodies[url])
+
+    def close(self):
+        pass
+
+
+def test_iter_pages_follows_next_page_url():
+    from src.coinmetrics.client import CoinMetricsClient
+    from src.coinmetrics.ratelimit import TokenBucket
+
+    base = "https://api.example/v4"
+    client = CoinMetricsClient(base_url=base, rate_limiter=TokenBucket(rate=1e6, capacity=1e6), use_cache=False)
+    client.session = FakeSession({
+        base + "/timeseries/asset-metrics": {"data": [1, 2], "next_page_url": "https://api.example/v4/next?token=a"},
+        "https://api.example/v4/next?token=a": {"data": [3], "next_page_url": ""},
+    })
+
+    pages = list(client.iter_asset_metrics_pages("btc", ["PriceUSD", "TxCnt"], "2020-01-01", "2020-01-02", page_size=2))
+
+    assert [p["data"] for p in pages] == [[1, 2], [3]]
+    (first_url, params), (next_url, next_params) = client.session.calls
+    assert params["assets"] == "btc" and params["metrics"] == "PriceUSD,TxCnt" and params["page_size"] == 2
+    # The continuation URL already carries the query; no params are re-sent
+    assert next_url.endswith("token=a") and next_params is None
+    assert client.stats.snapshot()["requests"] == 2
@@ -0,0 +1,36 @@
+"""Tests for the columnar v4 transform."""
+import pytest
+
+np = pytest.importorskip("numpy")
+pd = pytest.importorskip("pandas")
+
+from src.etl.columnar import columns_from_payload
+
+
+def test_unpivot_order_types_and_missing():
+    payload = {
+        "data": [
+            {"asset": "btc", "time": "2020-01-01T00:00:00.000000000Z", "PriceUSD": "7200.5", "TxCnt": None},
+            {"asset": "btc", "time": "2020-01-02T00:00:00.000000000Z", "PriceUSD": "n/a", "TxCnt": "300000"},
+        ]
+    }
+    cols = columns_from_payload(payload, {"frequency": "1d"}, "timeseries/asset-metrics")
+
+    assert len(cols) == 4
+    assert list(cols.metric) == ["PriceUSD", "TxCnt", "PriceUSD", "TxCnt"]
+    assert list(cols.asset) == ["btc"] * 4
+    assert cols.ts.dtype == np.dtype("datetime64[ns]")
+    assert cols.ts[2] == np.datetime64("2020-01-02T00:00:00")
+    assert cols.value[0] == 7200.5 and cols.value[3] == 300000.0
+    # null -> missing; non-numeric -> NaN but not missing (same as the row transform)
+    assert list(cols.is_missing) == [False, True, False, False]
+    assert np.isnan(cols.value[2])
+
+    row = next(cols.iter_rows())
+    assert row["ts"].isoformat() == "2020-01-01T00:00:00+00:00"
+    assert row["freq"] == "1d"
+
+
+def test_stub_payload_is_not_columnar():
+    payload = {"data": [{"asset": "btc", "metric": "PriceUSD", "time": "2020-01-01T00:00:00Z", "value": 1}]}
+    assert columns_from_payload(payload, {}, "timeseries.stub") is None
@@ -0,0 +1,86 @@
+"""Tests for the connection pool (fake connections, no database needed)."""
+import threading
+
+import pytest
+
+pytest.importorskip("psycopg2")
+
+import psycopg2.extensions
+
+from conftest import FakeConn
+from src.db.engine import ConnectionPool, PooledConnection, PoolTimeout, default_pool_max
+
+
+def test_pool_reuses_connections_and_counts():
+    pool = ConnectionPool(minconn=1, maxconn=2, connect=FakeConn)
+    with pool.connection() as a:
+        pass
+    with pool.connection() as b:
+        assert b is a
+    stats = pool.stats()
+    assert stats["created"] == 1
+    assert stats["acquired"] == 2
+    assert stats["in_use"] == 0
+    assert stats["idle"] == 1
+
+
+def test_release_rolls_back_open_transaction_and_discards_closed():
+    pool = ConnectionPool(minconn=0, maxconn=2, connect=FakeConn)
+    conn = pool.acquire()
+    conn.status = psycopg2.extensions.TRANSACTION_STATUS_INTRANS
+    conn.autocommit = True
+    pool.release(conn)
+    assert conn.rollbacks == 1 and conn.autocommit is False
+
+    conn = pool.acquire()
+    conn.close()
+    pool.release(conn)
+    assert pool.stats()["idle"] == 0
+    assert pool.acquire() is not conn
+
+
+def test_acquire_times_out_when_exhausted():
+    pool = ConnectionPool(minconn=0, maxconn=1, timeout=0.05, connect=FakeConn)
+    held = pool.acquire()
+    with pytest.raises(PoolTimeout):
+        pool.acquire()
+    assert pool.stats()["timeouts"] == 1
+
+    # A waiter is served as soon as the connection comes back
+    got = []
+    t = threading.Thread(target=lambda: got.append(pool.acquire()))
+    pool.timeout = 5
+    t.start()
+    pool.release(held)
+    t.join(5)
+    assert got == [held]
+    assert pool.stats()["peak_in_use"] == 1
+
+
+def test_pooled_connection_close_returns_to_pool():
+    pool = ConnectionPool(minconn=0, maxconn=1, connect=FakeConn)
+    proxy = PooledConnection(pool, pool.acquire())
+    proxy.autocommit = True
+    raw = proxy._conn
+    assert raw.autocommit is True
+    proxy.close()
+    proxy.close()
+    assert proxy.closed and not raw.closed
+    assert pool.stats()["in_use"] == 0
+
+
+def test_default_pool_max_covers_nested_borrowers(monkeypatch):
+    for name in ("CM_EXTRACT_CONCURRENCY", "CM_WINDOW_SPAN", "CM_WINDOW_CONCURRENCY", "ETL_LOAD_MODE", "ETL_LOAD_WORKERS"):
+        monkeypatch.delenv(name, raising=False)
+    # Plain row loads: one connection per extract worker, the old floor wins
+    assert default_pool_max() == 20
+
+    monkeypatch.setenv("CM_WINDOW_SPAN", "1y")
+    monkeypatch.setenv("ETL_LOAD_MODE", "parallel")
+    # 4 assets x (1 + 4 windows x (1 + 4 loaders)) + 1
+    assert default_pool_max() == 85
+    assert default_pool_max(extract_concurrency=1) == 22
+
+    monkeypatch.delenv("CM_WINDOW_SPAN")
+    monkeypatch.setenv("CM_EXTRACT_CONCURRENCY", "8")
+    assert default_pool_max() == 41
@@ -0,0 +1,66 @@
+"""Tests for dimension id resolution (fake connection, no database needed)."""
+import pytest
+
+pytest.importorskip("psycopg2")
+
+import psycopg2.extensions
+
+from conftest import FakeConn
+from src.db import dims
+
+
+def _table_conn(table, **kw):
+    """FakeConn backed by one dimension table {name: id}."""
+
+    def handler(sql, params):
+        names = params[0]
+        if sql.startswith("INSERT"):
+            for n in names:
+                table.setdefault(n, len(table) + 1)
+            return []
+        return [(n, table[n]) for n in names if n in table]
+
+    return FakeConn(handler=handler, **kw)
+
+
+def _ops(conn):
+    return [(sql.split()[0], list(params[0])) for sql, params in conn.executed]
+
+
+@pytest.fixture(autouse=True)
+def _fresh_cache():
+    dims.reset_cache()
+    yield
+    dims.reset_cache()
+
+
+def test_existing_names_are_not_inserted():
+    conn = _table_conn({"btc": 1, "eth": 2})
+    assert dims.resolve_ids(conn, "asset", ["eth", "btc", None]) == {"btc": 1, "eth": 2}
+    # Only a lookup: INSERT ... ON CONFLICT would burn identity values
+    assert [op for op, _ in _ops(conn)] == ["SELECT"]
+
+
+def test_only_missing_names_are_inserted_and_cached():
+    conn = _table_conn({"btc": 1})
+    assert dims.resolve_ids(conn, "asset", ["sol", "btc", "ada"]) == {"btc": 1, "ada": 2, "sol": 3}
+    assert _ops(conn) == [("SELECT", ["ada", "btc", "sol"]), ("INSERT", ["ada", "sol"]), ("SELECT", ["ada", "sol"])]
+    assert conn.commits == 1
+
+    conn.executed.clear()
+    assert dims.resolve_ids(conn, "asset", ["sol"]) == {"sol": 3}
+    assert conn.executed == []
+
+
+def test_open_transaction_of_the_caller_is_left_alone(monkeypatch):
+    table = {"btc": 1}
+    caller = _table_conn(table, status=psycopg2.extensions.TRANSACTION_STATUS_INTRANS)
+    own = _table_conn(table)
+    monkeypatch.setattr(dims, "get_conn", lambda: own)
+
+    assert dims.resolve_ids(caller, "metric", ["btc", "eth"]) == {"btc": 1, "eth": 2}
+
+    # Nothing ran (or was committed) on the caller's transaction
+    assert caller.executed == [] and caller.commits == 0 and caller.rollbacks == 0
+    # The new name was committed on a separate connection before being cached
+    assert own.commits == 1 and own.closed
@@ -0,0 +1,66 @@
+"""Tests for concurrent multi-asset extraction (no DB, no HTTP)."""
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("psycopg2")
+
+from conftest import FakeConn
+import src.config
+import src.coinmetrics.client as cm_client
+from src.etl import extract
+
+
+class FakeClient:
+    def __init__(self, *args, **kwargs):
+        self.session = self
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def fanout(monkeypatch):
+    monkeypatch.setattr(src.config, "COINMETRICS_API_KEY", "key")
+    monkeypatch.setenv("CM_ASSETS", "btc, eth,sol,ada,xrp")
+    monkeypatch.setattr(cm_client, "CoinMetricsClient", FakeClient)
+    monkeypatch.setattr(extract, "get_conn", FakeConn)
+    monkeypatch.setattr(extract, "check_pool_size", lambda n: None)
+    monkeypatch.setattr(extract, "_store_catalog", lambda client, conn: (1, {"data": []}))
+    monkeypatch.setattr(extract, "_availability_index", lambda conn, catalog: {"catalog": True})
+
+    state = {"active": 0, "peak": 0, "calls": []}
+    lock = threading.Lock()
+
+    def fake_one(asset, metrics_str, start_t, end_t, freq, stats=None, stream=False, incremental=False, availability=None):
+        with lock:
+            state["active"] += 1
+            state["peak"] = max(state["peak"], state["active"])
+            state["calls"].append((asset, stream, incremental, availability))
+        time.sleep(0.02)
+        with lock:
+            state["active"] -= 1
+        if asset == "sol":
+            raise RuntimeError("connection lost")
+        return len(asset)
+
+    monkeypatch.setattr(extract, "_extract_one_asset", fake_one)
+    return state
+
+
+def test_run_extract_all_bounds_concurrency_and_skips_failed_assets(fanout):
+    results = extract.run_extract_all(max_workers=2, stream=True, incremental=True)
+
+    # The failed worker is logged and left out; every other asset maps to its raw id
+    assert results == {"btc": 3, "eth": 3, "ada": 3, "xrp": 3}
+    assert fanout["peak"] <= 2
+    assert sorted(c[0] for c in fanout["calls"]) == ["ada", "btc", "eth", "sol", "xrp"]
+    # Flags and the catalog availability index reach every worker
+    assert all(c[1:] == (True, True, {"catalog": True}) for c in fanout["calls"])
+
+
+def test_run_extract_all_defaults_to_configured_concurrency(fanout, monkeypatch):
+    monkeypatch.setenv("CM_EXTRACT_CONCURRENCY", "1")
+    extract.run_extract_all()
+    assert fanout["peak"] == 1
@@ -0,0 +1,74 @@
+"""Tests for incremental extract planning and `_extract_asset` dispatch (no DB, no HTTP)."""
+from datetime import datetime, timezone
+
+import pytest
+
+pytest.importorskip("psycopg2")
+
+import src.db.queries as queries
+from src.etl import extract
+
+
+def _record_calls(monkeypatch):
+    calls = []
+
+    def fake_metrics(client, conn, asset, metrics_str, start_t, end_t, freq, stream=False):
+        calls.append((asset, metrics_str, start_t, end_t, freq, stream))
+        return len(calls)
+
+    monkeypatch.setattr(extract, "_extract_asset_metrics", fake_metrics)
+    return calls
+
+
+def test_extract_asset_full_window(monkeypatch):
+    calls = _record_calls(monkeypatch)
+    monkeypatch.setattr(extract, "_plan_incremental", lambda *a: pytest.fail("full extract must not plan"))
+
+    rid = extract._extract_asset(None, None, "btc", "PriceUSD,TxCnt", "2020-01-01T00:00:00Z", "2020-12-31T00:00:00Z", "1d", stream=True)
+
+    assert rid == 1
+    assert calls == [("btc", "PriceUSD,TxCnt", "2020-01-01T00:00:00Z", "2020-12-31T00:00:00Z", "1d", True)]
+
+
+def test_extract_asset_incremental_fetches_each_group(monkeypatch):
+    calls = _record_calls(monkeypatch)
+    monkeypatch.setattr(
+        extract,
+        "_plan_incremental",
+        lambda conn, asset, metrics_str, start_t, end_t, freq: [("TxCnt", start_t), ("PriceUSD", "2020-06-01T00:00:00Z")],
+    )
+
+    rid = extract._extract_asset(None, None, "btc", "PriceUSD,TxCnt", "2020-01-01T00:00:00Z", "2020-12-31T00:00:00Z", "1d", incremental=True)
+
+    assert rid == 2
+    assert [(c[1], c[2]) for c in calls] == [("TxCnt", "2020-01-01T00:00:00Z"), ("PriceUSD", "2020-06-01T00:00:00Z")]
+
+
+def test_extract_asset_skips_unavailable(monkeypatch):
+    calls = _record_calls(monkeypatch)
+    monkeypatch.setattr(extract, "_apply_availability", lambda *a: None)
+    assert extract._extract_asset(None, None, "btc", "PriceUSD", "2020-01-01", "2020-02-01", "1d", availability={"x": 1}) is None
+    assert calls == []
+
+
+def _hwm(monkeypatch, marks):
+    monkeypatch.setattr(queries, "get_high_water_marks", lambda conn, assets, metrics, freq: marks)
+    monkeypatch.setenv("CM_INCREMENTAL_OVERLAP", "3d")
+
+
+def test_plan_incremental_splits_unseen_and_seen(monkeypatch):
+    _hwm(monkeypatch, {("btc", "PriceUSD"): datetime(2020, 6, 10, tzinfo=timezone.utc)})
+    groups = extract._plan_incremental(None, "btc", "PriceUSD,TxCnt", "2020-01-01T00:00:00Z", "2020-12-31T00:00:00Z", "1d")
+    # Never-loaded metrics keep the full window; loaded ones restart at max(ts) - overlap
+    assert groups == [("TxCnt", "2020-01-01T00:00:00Z"), ("PriceUSD", "2020-06-07T00:00:00Z")]
+
+
+def test_plan_incremental_up_to_date_and_clamped(monkeypatch):
+    _hwm(monkeypatch, {("btc", "PriceUSD"): datetime(2021, 3, 1, tzinfo=timezone.utc)})
+    assert extract._plan_incremental(None, "btc", "PriceUSD", "2020-01-01T00:00:00Z", "2020-12-31T00:00:00Z", "1d") == []
+
+    # The restart point never moves before the configured start
+    _hwm(monkeypatch, {("btc", "PriceUSD"): datetime(2020, 1, 2, tzinfo=timezone.utc)})
+    assert extract._plan_incremental(None, "btc", "PriceUSD", "2020-01-01T00:00:00Z", "2020-12-31T00:00:00Z", "1d") == [
+        ("PriceUSD", "2020-01-01T00:00:00Z")
+    ]
@@ -0,0 +1,190 @@
+"""Tests for page handling in asset-metrics extraction (fake client and DB writes)."""
+import pytest
+
+pytest.importorskip("psycopg2")
+
+from src.etl import extract
+
+
+PAGES = [
+    {"data": [{"asset": "btc", "time": "2020-01-01T00:00:00Z", "PriceUSD": "1"}], "next_page_url": "https://x/p2"},
+    {"data": [{"asset": "btc", "time": "2020-01-02T00:00:00Z", "PriceUSD": "2"}], "next_page_url": "https://x/p3"},
+    {"data": [{"asset": "btc", "time": "2020-01-03T00:00:00Z", "PriceUSD": None}], "next_page_url": None},
+]
+
+
+class FakeClient:
+    def __init__(self, pages, fail_after=None):
+        self.pages = pages
+        self.fail_after = fail_after
+        self.requests = []
+
+    def iter_asset_metrics_pages(self, asset, metrics, start, end, frequency="1d", page_size=None):
+        self.requests.append((asset, metrics, start, end, frequency, page_size))
+        for i, page in enumerate(self.pages):
+            if i == self.fail_after:
+                raise RuntimeError("connection reset")
+            yield page
+
+
+@pytest.fixture
+def raw_rows(monkeypatch):
+    rows = []
+
+    def fake_insert(conn, endpoint, params, status, payload):
+        rows.append((endpoint, dict(params), status, payload))
+        return len(rows)
+
+    monkeypatch.setattr(extract, "_insert_raw", fake_insert)
+    monkeypatch.setenv("CM_WINDOW_SPAN", "")
+    monkeypatch.setenv("CM_RAW_STORAGE", "jsonb")
+    monkeypatch.setenv("CM_PAGE_SIZE", "2")
+    return rows
+
+
+def _run(client, stream):
+    return extract._extract_asset_metrics(client, None, "btc", "PriceUSD", "2020-01-01T00:00:00Z", "2020-01-03T00:00:00Z", "1d", stream=stream)
+
+
+def test_pages_are_audited_and_merged_in_order(raw_rows):
+    client = FakeClient(PAGES)
+    rid = _run(client, stream=False)
+
+    assert client.requests == [("btc", ["PriceUSD"], "2020-01-01T00:00:00Z", "2020-01-03T00:00:00Z", "1d", 2)]
+    endpoints = [r[0] for r in raw_rows]
+    assert endpoints == ["timeseries/asset-metrics(page)"] * 3 + ["timeseries/asset-metrics"]
+    assert [r[1]["page"] for r in raw_rows[:3]] == [1, 2, 3]
+    merged = raw_rows[-1][3]
+    assert rid == 4
+    assert [item["time"][:10] for item in merged["data"]] == ["2020-01-01", "2020-01-02", "2020-01-03"]
+    assert merged["next_page_url"] == "" and merged["next_page_token"] is None
+
+
+def test_stream_upserts_each_page_and_writes_summary_only(raw_rows, monkeypatch):
+    ingested = []
+
+    def fake_ingest(conn, asset, ts_params, page_index, page_json):
+        # The page is audited before it is loaded
+        assert raw_rows[-1][1]["page"] == page_index
+        ingested.append(page_index)
+        return len(page_json["data"]) * 2
+
+    monkeypatch.setattr(extract, "_ingest_page", fake_ingest)
+    rid = _run(FakeClient(PAGES), stream=True)
+
+    assert ingested == [1, 2, 3]
+    assert [r[0] for r in raw_rows] == ["timeseries/asset-metrics(page)"] * 3 + ["timeseries/asset-metrics(stream)"]
+    assert raw_rows[-1][3] == {"pages": 3, "rows": 3, "points_upserted": 6}
+    assert rid == 4
+
+
+def test_stream_failure_writes_error_row(raw_rows, monkeypatch):
+    monkeypatch.setattr(extract, "_ingest_page", lambda *a: 1)
+    _run(FakeClient(PAGES, fail_after=1), stream=True)
+
+    assert [r[0] for r in raw_rows] == ["timeseries/asset-metrics(page)", "timeseries/asset-metrics"]
+    endpoint, params, status, payload = raw_rows[-1]
+    assert "error" in payload and status != 200
+    assert params["assets"] == "btc"
+
+
+def test_ingest_page_upserts_parsed_rows(monkeypatch):
+    import src.etl.load as load
+
+    seen = []
+    monkeypatch.setenv("ETL_TRANSFORM_ENGINE", "python")
+    monkeypatch.setattr(load, "upsert_metrics", lambda rows, conn=None: seen.append((rows, conn)) or len(rows))
+
+    params = extract._asset_ts_params("btc", "PriceUSD", "2020-01-01T00:00:00Z", "2020-01-03T00:00:00Z", "1d")
+    assert extract._ingest_page("conn", "btc", params, 1, PAGES[2]) == 1
+    (rows, conn), = seen
+    assert conn == "conn"
+    assert rows[0]["asset"] == "btc" and rows[0]["metric"] == "PriceUSD" and rows[0]["is_missing"]
+
+
+class FakeWindowClient:
+    """Serves one item per day in [start, end]; earlier windows answer slower."""
+
+    def __init__(self):
+        self.session = self
+
+    def close(self):
+        pass
+
+    def iter_asset_metrics_pages(self, asset, metrics, start, end, frequency="1d", page_size=None):
+        import time
+        from datetime import timedelta
+
+        from src.utils.time import format_utc, parse_utc
+
+        first, last = parse_utc(start), parse_utc(end)
+        time.sleep(0.01 * (5 - first.day))
+        days = [format_utc(first + timedelta(days=i)) for i in range((last - first).days + 1)]
+        yield {"data": [{"asset": asset, "time": t, "PriceUSD": t[8:10]} for t in days], "next_page_url": None}
+
+
+def test_sharded_windows_are_stitched_in_time_order(raw_rows, monkeypatch):
+    monkeypatch.setenv("CM_WINDOW_SPAN", "1d")
+    monkeypatch.setenv("CM_WINDOW_CONCURRENCY", "3")
+    monkeypatch.setattr(extract, "_window_client", lambda client: FakeWindowClient())
+
+    rid = extract._extract_asset_metrics(None, None, "btc", "PriceUSD", "2020-01-01T00:00:00Z", "2020-01-04T00:00:00Z", "1d")
+
+    pages = [r for r in raw_rows if r[0] == "timeseries/asset-metrics(page)"]
+    assert [(r[1]["page"], r[1]["window"]) for r in pages] == [(1, 0), (2, 1), (3, 2)]
+    endpoint, params, status, merged = raw_rows[-1]
+    assert (endpoint, status, rid, params["windows"]) == ("timeseries/asset-metrics", 200, 4, 3)
+    # Shared window boundaries appear once, in time order, whatever finished first
+    assert [item["PriceUSD"] for item in merged["data"]] == ["01", "02", "03", "04"]
+
+
+def test_stitch_window_data_keeps_first_copy_of_boundary_items():
+    w1 = [{"data": [{"asset": "btc", "time": "t1", "v": 1}, {"asset": "btc", "time": "t2", "v": 2}]}]
+    w2 = [{"data": [{"asset": "btc", "time": "t2", "v": 99}]}, {"data": [{"asset": "eth", "time": "t2", "v": 3}, "raw"]}]
+    assert extract._stitch_window_data([w1, w2]) == [
+        {"asset": "btc", "time": "t1", "v": 1},
+        {"asset": "btc", "time": "t2", "v": 2},
+        {"asset": "eth", "time": "t2", "v": 3},
+        "raw",
+    ]
+
+
+class FakeAsyncWindowClient:
+    """Async twin of FakeWindowClient; records how many windows are in flight at once."""
+
+    def __init__(self):
+        self.active = self.peak = 0
+
+    async def iter_asset_metrics_pages(self, asset, metrics, start, end, frequency="1d", page_size=None):
+        import asyncio
+        from datetime import timedelta
+
+        from src.utils.time import format_utc, parse_utc
+
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            first, last = parse_utc(start), parse_utc(end)
+            await asyncio.sleep(0.01 * (5 - first.day))
+            days = [format_utc(first + timedelta(days=i)) for i in range((last - first).days + 1)]
+            yield {"data": [{"asset": asset, "time": t, "PriceUSD": t[8:10]} for t in days], "next_page_url": None}
+        finally:
+            self.active -= 1
+
+
+def test_async_path_shards_windows_like_the_sync_path(raw_rows, monkeypatch):
+    import asyncio
+
+    monkeypatch.setenv("CM_WINDOW_SPAN", "1d")
+    monkeypatch.setenv("CM_WINDOW_CONCURRENCY", "2")
+    client = FakeAsyncWindowClient()
+
+    rid = asyncio.run(extract._extract_asset_metrics_async(client, None, "btc", "PriceUSD", "2020-01-01T00:00:00Z", "2020-01-04T00:00:00Z", "1d"))
+
+    pages = [r for r in raw_rows if r[0] == "timeseries/asset-metrics(page)"]
+    assert [r[1]["window"] for r in pages] == [0, 1, 2]
+    endpoint, params, status, merged = raw_rows[-1]
+    assert (endpoint, status, rid, params["windows"]) == ("timeseries/asset-metrics", 200, 4, 3)
+    assert [item["PriceUSD"] for item in merged["data"]] == ["01", "02", "03", "04"]
+    # CM_WINDOW_CONCURRENCY bounds the windows fetched at once
+    assert client.peak == 2
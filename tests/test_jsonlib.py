@@ -0,0 +1,9 @@
+"""Tests for the JSON backend helpers."""
+from src.utils import jsonlib
+
+
+def test_roundtrip_bytes_and_str():
+    obj = {"data": [{"time": "2013-01-01T00:00:00Z", "PriceUSD": "13.5", "TxCnt": None}]}
+    assert jsonlib.loads(jsonlib.dumps_bytes(obj)) == obj
+    assert jsonlib.loads(jsonlib.dumps(obj)) == obj
+    assert jsonlib.BACKEND in ("orjson", "json")
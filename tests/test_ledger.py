@@ -0,0 +1,93 @@
+"""Tests for transform ledger claims and the pending worker loop (no database needed)."""
+import pytest
+
+pytest.importorskip("psycopg2")
+
+from conftest import FakeConn
+from src.etl import ledger, transform
+
+
+def test_claim_takes_lock_then_returns_ids_in_apply_order():
+    conn = FakeConn([[], [(7,), (3,), (5,)]])
+    assert ledger.claim_pending(conn, "w1", 3) == [3, 5, 7]
+    (lock_sql, _), (claim_sql, params) = conn.executed
+    assert lock_sql == ledger.CLAIM_LOCK_SQL
+    assert claim_sql == ledger.CLAIM_SQL
+    assert params == {"worker": "w1", "endpoints": list(ledger.TRANSFORM_ENDPOINTS), "n": 3}
+    assert conn.commits == 1
+
+
+def test_release_ids_only_touches_given_claims():
+    conn = FakeConn([2])
+    assert ledger.release_ids(conn, [4, 5]) == 2
+    (sql, params), = conn.executed
+    assert params == ([4, 5],) and conn.commits == 1
+    assert ledger.release_ids(conn, []) == 0
+    assert len(conn.executed) == 1
+
+
+@pytest.fixture
+def worker_env(monkeypatch):
+    conn = FakeConn()
+    log = {"done": [], "failed": [], "released": []}
+    monkeypatch.setattr(transform, "get_conn", lambda: conn)
+    monkeypatch.setattr(ledger, "mark_done", lambda c, raw_id, n: log["done"].append((raw_id, n)))
+    monkeypatch.setattr(ledger, "mark_failed", lambda c, raw_id, err: log["failed"].append(raw_id))
+    monkeypatch.setattr(ledger, "release_ids", lambda c, ids: log["released"].append(list(ids)))
+    return conn, log
+
+
+def test_pending_worker_runs_until_nothing_claimable(monkeypatch, worker_env):
+    conn, log = worker_env
+    claims = [[1, 2], [3], []]
+    monkeypatch.setattr(ledger, "claim_pending", lambda c, worker, n: claims.pop(0))
+    monkeypatch.setattr(transform, "transform_raw_id", lambda c, raw_id, engine=None, load_mode=None: raw_id * 10)
+
+    stats = transform._pending_worker(2, None, None)
+
+    assert stats == {"raw_ids": 3, "rows": 60, "failed": 0}
+    assert log["done"] == [(1, 10), (2, 20), (3, 30)]
+    assert claims == [] and conn.closed
+
+
+def test_failure_stops_the_series_and_releases_newer_ids(monkeypatch, worker_env):
+    conn, log = worker_env
+    claims = [[1, 2, 3], [4], []]
+    applied = []
+
+    def fake_transform(c, raw_id, engine=None, load_mode=None):
+        if raw_id == 2:
+            raise ValueError("bad payload")
+        applied.append(raw_id)
+        return 1
+
+    monkeypatch.setattr(ledger, "claim_pending", lambda c, worker, n: claims.pop(0))
+    monkeypatch.setattr(transform, "transform_raw_id", fake_transform)
+
+    stats = transform._pending_worker(3, None, None)
+
+    # 3 is newer than the failed 2 of the same series: never applied, handed back
+    assert applied == [1, 4]
+    assert log["failed"] == [2] and log["released"] == [[3]]
+    assert stats == {"raw_ids": 2, "rows": 2, "failed": 1}
+    assert conn.rollbacks == 1
+
+
+@pytest.mark.parametrize(
+    "kwargs, env, expected",
+    [
+        ({}, "", None),
+        ({"retry_failed": True}, "", (True, None)),
+        ({}, "1 hour", (False, "1 hour")),
+        ({"stale_after": "10 minutes"}, "1 hour", (False, "10 minutes")),
+    ],
+)
+def test_transform_pending_releases_failed_and_stale_claims(monkeypatch, kwargs, env, expected):
+    released = []
+    monkeypatch.setenv("ETL_TRANSFORM_STALE_AFTER", env)
+    monkeypatch.setattr(transform, "get_conn", lambda: FakeConn())
+    monkeypatch.setattr(ledger, "release_claims", lambda c, failed, stale_after: released.append((failed, stale_after)) or 0)
+    monkeypatch.setattr(ledger, "pending_count", lambda c: 0)
+
+    assert transform.transform_pending(**kwargs)["workers"] == 0
+    assert released == ([expected] if expected else [])
@@ -0,0 +1,29 @@
+"""Tests for sharding rows across parallel load connections."""
+import pytest
+
+pytest.importorskip("psycopg2")
+
+from src.etl.load import shard_by_series
+
+
+def _row(asset_id, metric_id, ts, value=0.0):
+    return (asset_id, metric_id, ts, 1, value, False, 1)
+
+
+def test_series_stay_whole_and_shards_are_key_ordered():
+    rows = [_row(a, m, t) for a in (1, 2) for m in (1, 2, 3) for t in range(a * m)]
+    shards = shard_by_series(rows, 2)
+
+    assert len(shards) == 2
+    assert sum(len(s) for s in shards) == len(rows)
+    series = [{r[:2] for r in s} for s in shards]
+    assert not series[0] & series[1]
+    for s in shards:
+        assert s == sorted(s, key=lambda r: r[:4])
+
+
+def test_duplicate_keys_keep_input_order_and_shard_count_is_capped():
+    rows = [_row(1, 1, 0, 1.0), _row(1, 1, 0, 2.0)]
+    shards = shard_by_series(rows, 8)
+    assert len(shards) == 1
+    assert [r[4] for r in shards[0]] == [1.0, 2.0]
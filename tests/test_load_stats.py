@@ -0,0 +1,227 @@
+"""Tests for load stats and summary deltas (in-memory fake of the fact and summary tables)."""
+from datetime import datetime, timezone
+
+import pytest
+
+pytest.importorskip("psycopg2")
+
+import psycopg2.extras
+
+from conftest import FakeConn
+from src.etl import load
+
+
+def _ts(day):
+    return datetime(2020, 1, day, tzinfo=timezone.utc)
+
+
+def _copy_value(field, cast):
+    return None if field == "\\N" else cast(field)
+
+
+class FactStore:
+    """processed.metrics_fact + processed.metrics_summary, answering the load statements."""
+
+    def __init__(self):
+        self.fact = {}
+        self.summary = {}
+        self.stage = []
+        self.summary_statements = 0
+        self.fail_keys = set()
+
+    def write(self, row, skip_unchanged):
+        """Upsert one row; returns None when left unchanged, else (inserted, missing delta)."""
+        key = row[:4]
+        old = self.fact.get(key)
+        if old is not None and skip_unchanged and old[:2] == (row[4], row[5]):
+            return None
+        self.fact[key] = (row[4], row[5], row[6])
+        return old is None, int(row[5]) - (int(old[1]) if old else 0)
+
+    def add_summary(self, values):
+        self.summary_statements += 1
+        for asset_id, metric_id, freq_id, n_points, n_missing, start_ts, end_ts in values:
+            acc = self.summary.setdefault((asset_id, metric_id, freq_id), [0, 0, start_ts, end_ts])
+            acc[0] += n_points
+            acc[1] += n_missing
+            acc[2], acc[3] = min(acc[2], start_ts), max(acc[3], end_ts)
+
+    def merge(self, rows, skip_unchanged):
+        """One INSERT ... SELECT ... ON CONFLICT over `rows` (with its summary deltas)."""
+        keys = [r[:4] for r in rows]
+        if len(set(keys)) != len(keys):
+            raise RuntimeError("ON CONFLICT DO UPDATE command cannot affect row a second time")
+        if self.fail_keys & set(keys):
+            raise RuntimeError("deadlock detected")
+        counts = [0, 0, 0]
+        deltas = {}
+        for r in rows:
+            written = self.write(r, skip_unchanged)
+            if written is None:
+                counts[2] += 1
+                continue
+            inserted, d_missing = written
+            counts[0 if inserted else 1] += 1
+            acc = deltas.setdefault((r[0], r[1], r[3]), [0, 0, r[2], r[2]])
+            acc[0] += int(inserted)
+            acc[1] += d_missing
+            acc[2], acc[3] = min(acc[2], r[2]), max(acc[3], r[2])
+        values = [key + tuple(acc) for key, acc in deltas.items() if acc[0] or acc[1]]
+        if values:
+            self.add_summary(values)
+        return [tuple(counts)]
+
+    def handler(self, sql, params):
+        if sql.startswith("COPY"):
+            for line in params.splitlines():
+                a, m, ts, f, value, missing, e = line.split("\t")
+                self.stage.append((int(a), int(m), datetime.fromisoformat(ts), int(f), _copy_value(value, float), missing == "t", _copy_value(e, int)))
+            return []
+        if sql == load.STAGE_DDL:
+            return []
+        for skip in (False, True):
+            if sql == load.upsert_sql(load.STAGE_SELECT_SQL, skip):
+                # DISTINCT ON ... ORDER BY seq DESC: the last staged row of a key
+                rows = list({r[:4]: r for r in self.stage}.values())
+                self.stage = []
+                return self.merge(rows, skip)
+            if sql == load._row_sql(skip):
+                written = self.write(params, skip)
+                if written is None:
+                    return []
+                return [(params[0], params[1], params[3], params[2], written[0], written[1])]
+        raise AssertionError(f"unexpected statement: {sql[:80]}")
+
+    def execute_values(self, cur, sql, values, template=None, page_size=None, fetch=False):
+        values = list(values)
+        if sql == load.SUMMARY_VALUES_SQL:
+            self.add_summary(values)
+            return None
+        return self.merge(values, sql == load.upsert_sql(load.VALUES_SELECT_SQL, True))
+
+
+@pytest.fixture
+def store(monkeypatch):
+    store = FactStore()
+    monkeypatch.setattr(psycopg2.extras, "execute_values", store.execute_values)
+    monkeypatch.setattr(load, "get_conn", lambda: FakeConn(handler=store.handler))
+    monkeypatch.setattr(load, "ensure_partitions", lambda conn, years: 0)
+    names = {"btc": 1, "eth": 2, "PriceUSD": 1, "TxCnt": 2, "1d": 1, "x": 1}
+    monkeypatch.setattr(load, "encode_rows", lambda conn, rows: [
+        (names[r["asset"]], names[r["metric"]], r["ts"], names[r["freq"]], r["value"], r["is_missing"], names[r["source_endpoint"]])
+        for r in rows
+    ])
+    monkeypatch.delenv("ETL_LOAD_SKIP_UNCHANGED", raising=False)
+    return store
+
+
+def _row(day, value=1.0, asset="btc", metric="PriceUSD"):
+    return {"asset": asset, "metric": metric, "ts": _ts(day), "freq": "1d", "value": value, "is_missing": value is None, "source_endpoint": "x"}
+
+
+def _load(store, rows, mode, **kw):
+    return load.load_metrics(rows, conn=FakeConn(handler=store.handler), mode=mode, **kw)
+
+
+MODES = ["row", "copy", "batch", "parallel"]
+
+
+def test_row_mode_summary_deltas_for_insert_update_unchanged(store):
+    stats = _load(store, [_row(1), _row(2, None), _row(3)], "row", skip_unchanged=True)
+    assert (stats["inserted"], stats["updated"], stats["unchanged"]) == (3, 0, 0)
+    assert store.summary == {(1, 1, 1): [3, 1, _ts(1), _ts(3)]}
+
+    # Day 2 gets its value (update, one missing point less), day 1 is identical, day 4 is new
+    stats = _load(store, [_row(1), _row(2, 5.0), _row(4)], "row", skip_unchanged=True)
+    assert (stats["inserted"], stats["updated"], stats["unchanged"]) == (1, 1, 1)
+    assert store.summary == {(1, 1, 1): [4, 0, _ts(1), _ts(4)]}
+    # Deltas are accumulated client-side and applied once per load
+    assert store.summary_statements == 2
+
+    # Nothing written, nothing to fold into the summary
+    stats = _load(store, [_row(1), _row(4)], "row", skip_unchanged=True)
+    assert stats["unchanged"] == 2 and store.summary_statements == 2
+
+
+@pytest.mark.parametrize("mode", MODES)
+def test_duplicate_keys_last_row_wins_and_count_as_affected(store, mode):
+    rows = [_row(1, 1.0), _row(2), _row(1, 7.0), _row(1, 9.0, metric="TxCnt")]
+
+    assert load.upsert_metrics(rows, conn=FakeConn(handler=store.handler), mode=mode) == len(rows)
+    assert store.fact[(1, 1, _ts(1), 1)][0] == 7.0
+    assert len(store.fact) == 3
+
+
+@pytest.mark.parametrize("mode", ["copy", "batch", "parallel"])
+def test_collapsed_duplicates_are_reported(store, mode):
+    stats = _load(store, [_row(1, 1.0), _row(1, 2.0), _row(1, 3.0), _row(2)], mode)
+    assert (stats["attempted"], stats["inserted"], stats["updated"], stats["duplicates"]) == (4, 2, 0, 2)
+
+
+def test_row_mode_applies_duplicates_one_by_one(store):
+    stats = _load(store, [_row(1, 1.0), _row(1, 2.0)], "row")
+    assert (stats["inserted"], stats["updated"], stats["duplicates"]) == (1, 1, 0)
+
+
+@pytest.mark.parametrize("mode", MODES)
+def test_skip_unchanged_rerun_writes_nothing(store, mode):
+    rows = [_row(1), _row(2, None), _row(3, asset="eth")]
+    _load(store, rows, mode)
+
+    stats = _load(store, rows, mode, skip_unchanged=True)
+    assert (stats["inserted"], stats["updated"], stats["unchanged"]) == (0, 0, 3)
+    assert load.upsert_metrics(rows, conn=FakeConn(handler=store.handler), mode=mode) == 3
+
+
+@pytest.mark.parametrize("mode", MODES)
+def test_rerun_rewrites_every_row_by_default(store, mode):
+    rows = [_row(1), _row(2, None)]
+    _load(store, rows, mode)
+
+    # ETL_LOAD_SKIP_UNCHANGED is opt-in: a plain re-run updates (and re-stamps) every row
+    stats = _load(store, rows, mode)
+    assert (stats["inserted"], stats["updated"], stats["unchanged"]) == (0, 2, 0)
+
+
+def test_skip_unchanged_from_env(store, monkeypatch):
+    rows = [_row(1), _row(2)]
+    _load(store, rows, "copy")
+    monkeypatch.setenv("ETL_LOAD_SKIP_UNCHANGED", "1")
+    assert _load(store, rows, "copy")["unchanged"] == 2
+    assert _load(store, rows, "copy", skip_unchanged=False)["updated"] == 2
+
+
+@pytest.mark.parametrize("env, explicit, expected", [(None, None, False), ("1", None, True), ("0", None, False), ("1", False, False), ("off", True, True)])
+def test_skip_unchanged_default(monkeypatch, env, explicit, expected):
+    if env is None:
+        monkeypatch.delenv("ETL_LOAD_SKIP_UNCHANGED", raising=False)
+    else:
+        monkeypatch.setenv("ETL_LOAD_SKIP_UNCHANGED", env)
+    assert load.skip_unchanged_default(explicit) is expected
+
+
+def test_failed_batch_is_rolled_back_and_loading_continues(store):
+    store.fail_keys = {(2, 1, _ts(1), 1)}
+    rows = [_row(1), _row(2), _row(1, asset="eth"), _row(2, asset="eth"), _row(3), _row(3, 9.0)]
+
+    stats = _load(store, rows, "batch", batch_size=2)
+
+    assert (stats["batches"], stats["failed_batches"], stats["failed_rows"]) == (3, 1, 2)
+    assert (stats["inserted"], stats["updated"], stats["duplicates"]) == (3, 0, 1)
+    assert not any(key[0] == 2 for key in store.fact)
+    assert store.fact[(1, 1, _ts(3), 1)][0] == 9.0
+
+
+def test_copy_rows_are_sent_in_chunks(monkeypatch):
+    monkeypatch.setattr(load, "COPY_CHUNK_ROWS", 2)
+    conn = FakeConn()
+    rows = [(1, 1, _ts(d), 1, float(d), False, 1) for d in range(1, 6)]
+    with conn.cursor() as cur:
+        assert load._copy_rows(cur, rows) == 5
+    assert [chunk.count("\n") for chunk in conn.copied] == [2, 2, 1]
+    assert load._copy_text("a\tb\\c") == "a\\tb\\\\c"
+
+
+def test_dedup_last_keeps_last_row_per_key():
+    a1, b, a2 = (1, 1, _ts(1), 1, 1.0), (1, 1, _ts(2), 1, 1.0), (1, 1, _ts(1), 1, 2.0)
+    assert load._dedup_last([a1, b, a2]) == [a2, b]
@@ -0,0 +1,72 @@
+"""Tests for the processed-store migration (fake connection, no database needed)."""
+import pytest
+
+from conftest import FakeConn
+from src.db import migrate
+
+
+def _conn(relkinds, smallint=()):
+    def handler(sql, params):
+        if sql == migrate.RELKIND_SQL:
+            kind = relkinds.get(params[0])
+            return [(kind,)] if kind else []
+        if sql == migrate.SMALLINT_SQL:
+            return list(smallint)
+        if sql.startswith("SELECT pg_get_serial_sequence"):
+            return [(f"{params[0]}_id_seq",)]
+        if sql.startswith("SELECT DISTINCT extract(year"):
+            return [(2019,), (2020,)]
+        if sql.startswith("INSERT INTO processed.metrics_fact"):
+            return 42
+        return []
+
+    return FakeConn(handler=handler)
+
+
+def _ddl_positions(executed):
+    return [i for i, sql in enumerate(executed) if "CREATE" in sql]
+
+
+def test_legacy_table_is_renamed_copied_and_dropped():
+    conn = _conn({"metrics_long": "r"})
+    stats = migrate.migrate_processed(conn)
+
+    assert stats == {"legacy": "table", "widened": [], "rows": 42, "years": [2019, 2020]}
+    sql = conn.statements
+    rename = sql.index(f"ALTER TABLE processed.metrics_long RENAME TO {migrate.LEGACY_TABLE}")
+    ddl = _ddl_positions(sql)
+    # Dependent views go first; the new DDL only runs once the name is free
+    assert sql.index("DROP VIEW IF EXISTS analysis.metric_coverage") < rename < ddl[0]
+    fill = [s for s in sql if s.startswith("INSERT INTO processed.dim_")]
+    assert len(fill) == 4
+    copy = next(i for i, s in enumerate(sql) if s.startswith("INSERT INTO processed.metrics_fact"))
+    assert sql.index("SELECT processed.ensure_metrics_partition(%s)") < copy
+    assert sql[-2:] == ["SELECT processed.refresh_metrics_summary()", f"DROP TABLE processed.{migrate.LEGACY_TABLE}"]
+    assert conn.commits == 1
+
+
+def test_keep_legacy_and_partitioned_table():
+    conn = _conn({"metrics_long": "p"})
+    stats = migrate.migrate_processed(conn, keep_legacy=True)
+    assert stats["legacy"] == "partitioned"
+    assert not any(s.startswith("DROP TABLE") for s in conn.statements)
+
+
+def test_smallint_ids_are_widened_before_ddl():
+    conn = _conn({"metrics_long": "v"}, smallint=[("metrics_fact", "asset_id"), ("dim_asset", "id")])
+    stats = migrate.migrate_processed(conn)
+
+    assert stats == {"legacy": None, "widened": ["metrics_fact.asset_id", "dim_asset.id"], "rows": 0, "years": []}
+    sql = conn.statements
+    assert "DROP VIEW processed.metrics_long" in sql
+    alter = sql.index("ALTER TABLE processed.dim_asset ALTER COLUMN id TYPE INT")
+    assert sql[alter + 2] == "ALTER SEQUENCE processed.dim_asset_id_seq AS INT"
+    assert alter < _ddl_positions(sql)[0]
+    assert not any("metrics_fact (asset_id" in s and s.startswith("INSERT") for s in sql)
+
+
+def test_refuses_to_overwrite_leftover_legacy_table():
+    conn = _conn({"metrics_long": "r", migrate.LEGACY_TABLE: "r"})
+    with pytest.raises(RuntimeError):
+        migrate.migrate_processed(conn)
+    assert conn.commits == 0
@@ -0,0 +1,15 @@
+"""Tests for partition-year helpers."""
+from datetime import datetime, timedelta, timezone
+
+from src.db.partitions import years_of
+
+
+def test_years_of_uses_utc_calendar_year():
+    plus2 = timezone(timedelta(hours=2))
+    stamps = [
+        datetime(2020, 6, 1, tzinfo=timezone.utc),
+        # Jan 1st 01:00 at UTC+2 is still Dec 31st in UTC
+        datetime(2021, 1, 1, 1, 0, tzinfo=plus2),
+        None,
+    ]
+    assert years_of(stamps) == {2020}
@@ -0,0 +1,78 @@
+"""Tests for the SQL-side profiling queries (fake cursor, no database needed)."""
+import pytest
+
+pytest.importorskip("matplotlib")
+
+from conftest import FakeConn
+from src.analysis import profiling
+
+
+def test_metric_scale_aggregates_per_series_in_sql():
+    sql = profiling.METRIC_SCALE_SQL
+    assert "GROUP BY asset_id, metric_id, freq_id" in sql
+    assert "stddev_samp(value)" in sql and "value <> 'NaN'::float8" in sql
+    # Names are joined after aggregation, on one row per series
+    assert sql.index("GROUP BY") < sql.index("JOIN processed.dim_asset")
+
+    conn = FakeConn([[
+        ("btc", "PriceUSD", "1d", 3, 1.0, 300.0, 101.0, 150.0, 2, 1.485),
+        ("btc", "Zero", "1d", 2, 0.0, 0.0, 0.0, 0.0, None, None),
+    ]])
+    df = profiling.compute_metric_scale(conn)
+
+    assert conn.executed == [(sql, None)]
+    assert list(df.columns) == [
+        "asset", "metric", "freq", "n_values", "min_value", "max_value", "mean_value", "std_value",
+        "magnitude_order", "coefficient_of_variation",
+    ]
+    assert str(df["magnitude_order"].dtype) == "Int64"
+    assert df["magnitude_order"].tolist()[0] == 2 and df["magnitude_order"].isna().tolist() == [False, True]
+
+
+def test_time_regularity_uses_lag_and_freq_spacing():
+    sql = profiling.TIME_REGULARITY_SQL
+    assert "lag(ts) OVER (PARTITION BY asset_id, metric_id, freq_id ORDER BY ts)" in sql
+    assert "WHEN 'd' THEN 86400" in sql and "WHEN 'h' THEN 3600" in sql
+    # Frequencies without a fixed spacing report NULL instead of a bogus count
+    assert "CASE WHEN agg.expected_s IS NOT NULL THEN agg.n_irregular END AS n_non_1d" in sql
+
+    conn = FakeConn([[
+        ("btc", "PriceUSD", "1d", 9, 1, 3.0, 1 / 9, 1.0),
+        ("btc", "BlkCnt", "1b", 4, None, 0.01, None, None),
+    ]])
+    df = profiling.compute_time_regularity(conn)
+
+    assert list(df.columns) == ["asset", "metric", "freq", "n_intervals", "n_non_1d", "max_gap_days", "gap_ratio", "expected_gap_days"]
+    assert str(df["n_non_1d"].dtype) == "Int64"
+    assert df["n_non_1d"].tolist()[0] == 1 and df["n_non_1d"].isna().tolist() == [False, True]
+
+
+def test_histogram_sql_global_and_per_series():
+    linear = profiling._histogram_sql(log=False, per_series=False)
+    assert "width_bucket(v.x, b.lo, b.hi, %(bins)s)" in linear
+    assert "CROSS JOIN b" in linear and "dim_asset" not in linear
+    assert "value > '-Infinity'::float8" in linear
+
+    log = profiling._histogram_sql(log=True, per_series=False)
+    assert "log(value) AS x" in log and "value > 0" in log
+    # Edges are converted back to value units
+    assert "power(10, b.lo + (b.hi - b.lo) * (h.bin - 1) / %(bins)s) AS bin_lo" in log
+
+    series = profiling._histogram_sql(log=False, per_series=True)
+    assert "GROUP BY asset_id, metric_id, freq_id" in series
+    assert "JOIN b USING (asset_id, metric_id, freq_id)" in series
+    assert series.endswith("ORDER BY asset, metric, freq, h.bin")
+
+
+def test_compute_value_histogram_passes_bins_and_names_columns():
+    conn = FakeConn([[("btc", "PriceUSD", "1d", 1, 1.0, 10.0, 5)]])
+    df = profiling.compute_value_histogram(conn, bins=20, scale="log", per_series=True)
+
+    (sql, params), = conn.executed
+    assert sql == profiling._histogram_sql(True, True) and params == {"bins": 20}
+    assert list(df.columns) == ["asset", "metric", "freq", "bin", "bin_lo", "bin_hi", "count"]
+
+    with pytest.raises(ValueError):
+        profiling.compute_value_histogram(conn, scale="sqrt")
+    with pytest.raises(ValueError):
+        profiling.compute_value_histogram(conn, bins=0)
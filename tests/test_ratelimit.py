@@ -0,0 +1,76 @@
+"""Tests for the client-side rate limiter and retry policy."""
+import random
+from datetime import datetime, timezone
+
+from src.coinmetrics.ratelimit import RequestStats, RetryPolicy, TokenBucket, client_tier, parse_retry_after
+
+
+class FakeClock:
+    def __init__(self):
+        self.t = 0.0
+
+    def __call__(self):
+        return self.t
+
+
+def test_token_bucket_burst_then_rate():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=2.0, capacity=3, clock=clock)
+    assert [bucket.reserve() for _ in range(3)] == [0.0, 0.0, 0.0]
+    # 4th and 5th callers queue behind each other at 1/rate spacing
+    assert bucket.reserve() == 0.5
+    assert bucket.reserve() == 1.0
+    clock.t = 10.0
+    assert bucket.reserve() == 0.0
+
+
+def test_token_bucket_pause_blocks_callers():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=100.0, capacity=10, clock=clock)
+    bucket.pause(5)
+    assert bucket.reserve() == 5.0
+    clock.t = 6.0
+    assert bucket.reserve() == 0.0
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("7") == 7.0
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("garbage") is None
+    now = datetime(2024, 1, 1, 0, 0, 0, tzinfo=timezone.utc)
+    assert parse_retry_after("Mon, 01 Jan 2024 00:00:30 GMT", now=now) == 30.0
+
+
+def test_retry_policy_honors_retry_after_and_cap():
+    policy = RetryPolicy(max_retries=3, base_delay=1.0, max_delay=4.0, rng=random.Random(0))
+    for attempt in range(10):
+        assert 0.0 <= policy.delay(attempt) <= 4.0
+    assert policy.delay(0, retry_after=30.0) == 30.0
+    assert policy.should_retry(429, 0)
+    assert policy.should_retry(None, 2)
+    assert not policy.should_retry(400, 0)
+    assert not policy.should_retry(503, 3)
+
+
+def test_request_stats_snapshot():
+    stats = RequestStats()
+    stats.incr("requests", 3)
+    stats.incr("throttled")
+    stats.add_wait(0.25)
+    snap = stats.snapshot()
+    assert snap["requests"] == 3
+    assert snap["throttled"] == 1
+    assert snap["limited"] == 1
+    assert snap["wait_seconds"] == 0.25
+
+
+def test_client_tier_follows_env_then_host(monkeypatch):
+    monkeypatch.delenv("CM_API_TIER", raising=False)
+    community = "https://community-api.coinmetrics.io/v4"
+    assert client_tier(None, "https://api.coinmetrics.io/v4") == "community"
+    # A key does not buy the key budget on the community host
+    assert client_tier("k", community) == "community"
+    assert client_tier("k", "https://api.coinmetrics.io/v4") == "key"
+
+    monkeypatch.setenv("CM_API_TIER", "community")
+    assert client_tier("k", "https://api.coinmetrics.io/v4") == "community"
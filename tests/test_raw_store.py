@@ -0,0 +1,75 @@
+"""Tests for compressed raw page storage and manifests (in-memory fake of raw.api_pages)."""
+import pytest
+
+pytest.importorskip("psycopg2")
+
+from conftest import FakeConn
+from src.etl import raw_store
+
+
+class FakeDB:
+    def __init__(self):
+        self.pages = {}
+        self.by_sha = {}
+
+    def handler(self, sql, params):
+        if sql == raw_store.STORE_PAGE_SQL:
+            digest, encoding, n_items, n_bytes, body = params
+            if digest in self.by_sha:
+                return []
+            pid = len(self.pages) + 1
+            self.by_sha[digest] = pid
+            self.pages[pid] = (encoding, bytes(body.adapted), n_items, n_bytes)
+            return [(pid,)]
+        if "WHERE sha256" in sql:
+            return [(self.by_sha[params[0]],)]
+        return [(pid, *self.pages[pid][:2]) for pid in params[0] if pid in self.pages]
+
+
+def _db():
+    db = FakeDB()
+    return db, FakeConn(handler=db.handler)
+
+
+PAGE_1 = {"data": [{"asset": "btc", "time": "2020-01-01", "PriceUSD": "1"}, {"asset": "btc", "time": "2020-01-02", "PriceUSD": "2"}]}
+PAGE_2 = {"data": [{"asset": "btc", "time": "2020-01-02", "PriceUSD": "2"}, {"asset": "btc", "time": "2020-01-03", "PriceUSD": None}]}
+
+
+def test_encode_decode_round_trip():
+    digest, n_bytes, body = raw_store.encode_page(PAGE_1)
+    assert len(digest) == 64 and n_bytes > len(body) > 0
+    assert raw_store.decode_page(raw_store.ENCODING, body) == PAGE_1
+    with pytest.raises(ValueError):
+        raw_store.decode_page("gzip+json", body)
+
+
+def test_identical_pages_are_stored_once():
+    db, conn = _db()
+    first = raw_store.store_page(conn, PAGE_1)
+    again = raw_store.store_page(conn, dict(PAGE_1))
+    other = raw_store.store_page(conn, PAGE_2)
+    assert first == again != other
+    assert db.pages[first][2] == 2
+
+
+def test_manifest_round_trip_rebuilds_merged_payload():
+    db, conn = _db()
+    ids = [raw_store.store_page(conn, p) for p in (PAGE_1, PAGE_2, PAGE_1)]
+    manifest = raw_store.manifest_payload(ids, total_rows=4)
+
+    assert raw_store.is_manifest(manifest)
+    assert manifest == {"storage": "pages", "page_ids": [1, 2, 1], "pages": 3, "rows": 4}
+    # Pages come back in manifest order, repeated ones included
+    assert list(raw_store.iter_manifest_pages(conn, manifest)) == [PAGE_1, PAGE_2, PAGE_1]
+    merged = raw_store.load_manifest_payload(conn, manifest)
+    # Items repeated across pages are kept once, in first-seen order
+    assert [item["time"] for item in merged["data"]] == ["2020-01-01", "2020-01-02", "2020-01-03"]
+    assert merged["next_page_url"] == "" and merged["next_page_token"] is None
+
+
+def test_manifest_with_missing_page_fails_loudly():
+    db, conn = _db()
+    manifest = raw_store.manifest_payload([raw_store.store_page(conn, PAGE_1), 99], total_rows=2)
+    with pytest.raises(KeyError):
+        raw_store.load_manifest_payload(conn, manifest)
+    assert not raw_store.is_manifest({"data": []})
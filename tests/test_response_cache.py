@@ -0,0 +1,52 @@
+"""Tests for the on-disk API response cache."""
+import os
+from datetime import datetime, timedelta, timezone
+
+from src.coinmetrics.cache import IMMUTABLE, ResponseCache, is_closed_window, make_key
+
+
+class FakeClock:
+    def __init__(self, t=1000.0):
+        self.t = t
+
+    def __call__(self):
+        return self.t
+
+
+def test_make_key_ignores_param_order():
+    a = make_key("/timeseries/asset-metrics", {"assets": "btc", "metrics": "PriceUSD"})
+    b = make_key("/timeseries/asset-metrics", {"metrics": "PriceUSD", "assets": "btc"})
+    assert a == b
+    assert a != make_key("/timeseries/asset-metrics", {"assets": "eth", "metrics": "PriceUSD"})
+
+
+def test_ttl_and_immutable_entries(tmp_path):
+    clock = FakeClock()
+    cache = ResponseCache(str(tmp_path), clock=clock)
+    cache.put("aa11", {"data": [1]}, ttl=60)
+    cache.put("bb22", {"data": [2]}, ttl=IMMUTABLE)
+    assert cache.get("aa11") == {"data": [1]}
+    clock.t += 61
+    assert cache.get("aa11") is None
+    clock.t += 10 ** 9
+    assert cache.get("bb22") == {"data": [2]}
+
+
+def test_size_based_eviction_drops_least_recently_used(tmp_path):
+    cache = ResponseCache(str(tmp_path), max_bytes=10 ** 9)
+    body = {"data": [os.urandom(64).hex() for _ in range(50)]}
+    for i, key in enumerate(["aa01", "aa02", "aa03"]):
+        cache.put(key, body, ttl=IMMUTABLE)
+        # make mtimes strictly ordered: aa01 oldest
+        os.utime(cache._path(key), (1000 + i, 1000 + i))
+    cache.max_bytes = cache.size_bytes - 1
+    cache.evict()
+    assert cache.get("aa01") is None
+    assert cache.get("aa03") == body
+
+
+def test_is_closed_window():
+    now = datetime(2024, 6, 1, tzinfo=timezone.utc)
+    assert is_closed_window("2015-12-31", timedelta(days=2), now=now)
+    assert not is_closed_window("2024-05-31T00:00:00Z", timedelta(days=2), now=now)
+    assert not is_closed_window(None, timedelta(days=2), now=now)
@@ -0,0 +1,157 @@
+"""Tests for the in-database transform: parity with the Python parser, SQL guards and the runner."""
+import calendar
+import json
+import math
+import re
+from datetime import timezone
+
+import pytest
+
+psycopg2 = pytest.importorskip("psycopg2")
+
+from conftest import load_script
+from src.config import get_db_dsn
+from src.etl import sql_transform, transform
+
+
+def _time_re():
+    return re.compile(sql_transform._TIME_RE.strip("'"))
+
+
+def _sql_time_ok(value):
+    """Python rendition of `_time_ok_sql`: the pattern plus the days-in-month check."""
+    if not _time_re().match(value):
+        return False
+    return int(value[8:10]) <= calendar.monthrange(int(value[:4]), int(value[5:7]))[1]
+
+
+TIMES = [
+    "2020-01-01", "2020-01-01T00:00:00Z", "2020-01-01T00:00:00.000000000Z", "2020-02-29 12:30", "2020-01-01T00:00:00+05:30",
+    "2020-01-01T00:00:00-0800", "2020-01-01T00:00+15", "2021-02-29", "2020-04-31", "", "now", "bogus", "0000-01-01",
+    "2020-13-01", "2020-01-32", "2020-01-01T24:00:00Z", "1577836800", "20200101", "2020-W01", "2020-01-01T00:00:00+16:00",
+    "2020-01-01T00:00:00 Z", "2020-01-01T00:00:00.Z", "٢020-01-01", "2020-01-01T12", "2020-01-01T00:00:60",
+]
+
+
+@pytest.mark.parametrize("value", TIMES)
+def test_time_guard_matches_python_parser(value):
+    try:
+        transform._parse_time(value)
+        parsed = True
+    except ValueError:
+        parsed = False
+    assert parsed is _sql_time_ok(value)
+
+
+NUMBERS = [
+    "1", "-2.5", "+3.", ".5", "1e5", "1E-5", "1.e5", " 7 ", "1_000", "1_000.000_1", "inf", "-Infinity", "NaN", "-nan", "+inf",
+    "", " ", "abc", "1__0", "_1", "1_", "1e", "e5", ".", "infinit", "0x10", "1,5", "--1", "nan1", "1 2", "1e5.0",
+]
+
+
+@pytest.mark.parametrize("value", NUMBERS)
+def test_numeric_guard_matches_float(value):
+    try:
+        float(value)
+        coerced = True
+    except ValueError:
+        coerced = False
+    assert coerced is bool(re.match(sql_transform._NUMERIC_RE.strip("'"), value, re.IGNORECASE))
+
+
+def test_every_timestamptz_cast_is_guarded():
+    for name in ("V4_KEYS_SQL", "STUB_KEYS_SQL", "V4_SELECT_SQL", "STUB_SELECT_SQL"):
+        sql = getattr(sql_transform, name)
+        n_casts = sql.count("::timestamptz")
+        assert n_casts >= 1
+        # Each cast sits in the THEN branch of the validity check
+        assert sql.count(")::timestamptz END") == n_casts, name
+        assert sql_transform._TIME_RE in sql.split("WHERE", 1)[1], name
+
+
+PARAMS = {"frequency": "1d", "assets": "btc"}
+
+V4_PAYLOAD = {"data": [
+    {"asset": "btc", "time": "2020-01-01T00:00:00.000000000Z", "PriceUSD": "7200.5", "TxCnt": 100, "Flag": True},
+    {"time": "2020-01-02T00:00:00.1234567Z", "PriceUSD": " 1_000 ", "TxCnt": None, "Notes": "n/a", "Nested": [1]},
+    {"asset": "eth", "time": "", "timestamp": "2020-01-03T05:30:00+05:30", "PriceUSD": "inf", "TxCnt": "-nan"},
+    {"asset": "eth", "time": 0, "timestamp": "2020-01-04", "PriceUSD": 1.5e300},
+    {"asset": "btc", "time": "2020-02-30T00:00:00Z", "PriceUSD": "1"},
+    {"asset": "btc", "time": "now", "PriceUSD": "1"},
+    {"asset": "btc", "PriceUSD": "1"},
+    "not-an-item",
+    {"asset": "btc", "time": "2020-01-01T00:00:00Z", "PriceUSD": "7300"},
+]}
+
+STUB_PAYLOAD = {"data": [
+    {"asset": "btc", "metric": "PriceUSD", "time": "2020-01-01T00:00:00Z", "value": "7200"},
+    {"asset": "btc", "metric": "PriceUSD", "time": "2020-01-02T00:00:00Z", "value": None},
+    {"asset": "btc", "metric": "PriceUSD", "time": "2020-01-03T00:00:00Z", "value": "abc"},
+    {"asset": "btc", "metric": "TxCnt", "time": "2020-01-03T00:00:00Z", "value": False},
+    {"metric": "PriceUSD", "time": "2020-01-04T00:00:00Z", "value": "1"},
+    {"asset": "btc", "metric": "PriceUSD", "time": "2020-13-01", "value": "1"},
+    {"asset": "btc", "metric": "PriceUSD", "time": "2020-01-01T00:00:00Z", "value": "7300"},
+]}
+
+
+def _key(row):
+    asset, metric, ts, freq, value, is_missing, endpoint = row
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    # NaN != NaN; compare it by name
+    value = "nan" if value is not None and math.isnan(value) else value
+    return asset, metric, ts.astimezone(timezone.utc), freq, value, is_missing, endpoint
+
+
+def _python_rows(payload):
+    rows = transform.rows_from_payload(payload, PARAMS, "timeseries/asset-metrics")
+    # The loader keeps the last row of a repeated key
+    last = {}
+    for r in rows:
+        last[(r["asset"], r["metric"], r["ts"], r["freq"])] = r
+    return sorted(_key(tuple(r.values())) for r in last.values())
+
+
+@pytest.fixture
+def pg():
+    try:
+        conn = psycopg2.connect(get_db_dsn(), connect_timeout=2)
+    except psycopg2.OperationalError as exc:
+        pytest.skip(f"Postgres not reachable: {exc}")
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SET LOCAL TimeZone = 'UTC'")
+        yield conn
+    finally:
+        conn.rollback()
+        conn.close()
+
+
+@pytest.mark.parametrize("payload, stub", [(V4_PAYLOAD, False), (STUB_PAYLOAD, True)])
+def test_sql_unpivot_produces_the_python_rows(pg, payload, stub):
+    with pg.cursor() as cur:
+        cur.execute(
+            "INSERT INTO raw.api_responses (endpoint, params, status_code, payload) VALUES (%s, %s, 200, %s) RETURNING id",
+            ("timeseries/asset-metrics", json.dumps(PARAMS), json.dumps(payload)),
+        )
+        raw_id = cur.fetchone()[0]
+        cur.execute(sql_transform.PROBE_SQL, {"raw_id": raw_id})
+        assert cur.fetchone()[4] is stub
+        select = sql_transform.STUB_SELECT_SQL if stub else sql_transform.V4_SELECT_SQL
+        cur.execute(sql_transform._DEDUP_SQL.format(select=select), {"raw_id": raw_id, "freq": "1d", "default_asset": "btc"})
+        sql_rows = sorted(_key(row[:7]) for row in cur.fetchall())
+
+    assert sql_rows == _python_rows(payload)
+
+
+def test_transform_stage_with_sql_engine_only_previews(monkeypatch, capsys):
+    monkeypatch.setattr(transform, "transform_latest_sql", lambda: pytest.fail("transform stage must not load"))
+    monkeypatch.setattr(transform, "transform_latest_iter", lambda batch_size=None: iter([[{"asset": "btc"}]]))
+
+    assert load_script("10_etl_run.py").main(["--stage", "transform", "--transform-engine", "sql"]) == 0
+    assert capsys.readouterr().out.splitlines()[-1] == "1"
+
+
+def test_transform_stage_rejects_pending():
+    with pytest.raises(SystemExit):
+        load_script("10_etl_run.py").main(["--stage", "transform", "--pending"])
@@ -0,0 +1,42 @@
+"""Tests for splitting long request windows into sub-windows."""
+import pytest
+
+from src.utils.time import parse_span, split_window
+
+
+def test_split_window_calendar_years_share_boundaries():
+    windows = split_window("2013-06-01", "2015-12-31", "1y")
+    assert windows == [
+        ("2013-06-01T00:00:00Z", "2014-01-01T00:00:00Z"),
+        ("2014-01-01T00:00:00Z", "2015-01-01T00:00:00Z"),
+        ("2015-01-01T00:00:00Z", "2015-12-31T00:00:00Z"),
+    ]
+
+
+def test_split_window_fixed_days():
+    windows = split_window("2020-01-01T00:00:00Z", "2020-01-10T00:00:00Z", "4d")
+    assert [w[0] for w in windows] == ["2020-01-01T00:00:00Z", "2020-01-05T00:00:00Z", "2020-01-09T00:00:00Z"]
+    assert windows[-1][1] == "2020-01-10T00:00:00Z"
+
+
+def test_split_window_single_window_when_span_covers_range():
+    assert split_window("2020-01-01", "2020-02-01", "90d") == [("2020-01-01T00:00:00Z", "2020-02-01T00:00:00Z")]
+
+
+def test_parse_span_rejects_garbage():
+    assert parse_span("12h") == (12, "h")
+    with pytest.raises(ValueError):
+        parse_span("1 fortnight")
+    with pytest.raises(ValueError):
+        parse_span("0d")
+
+
+def test_span_to_timedelta():
+    from datetime import timedelta
+
+    from src.utils.time import span_to_timedelta
+
+    assert span_to_timedelta("3d") == timedelta(days=3)
+    assert span_to_timedelta("6h") == timedelta(hours=6)
+    with pytest.raises(ValueError):
+        span_to_timedelta("1y")
@@ -0,0 +1,82 @@
+"""Tests for the batch-yielding transform iterator (fake server-side cursor, no database)."""
+import pytest
+
+pytest.importorskip("psycopg2")
+
+from conftest import FakeConn, load_script
+from src.etl import transform
+
+
+def _payload(day0, n, asset="btc"):
+    return {"data": [{"asset": asset, "time": f"2020-01-{day0 + i:02d}T00:00:00Z", "PriceUSD": str(i)} for i in range(n)]}
+
+
+ENDPOINT = "timeseries/asset-metrics"
+
+
+@pytest.fixture
+def fake_conn(monkeypatch):
+    records = [
+        (1, ENDPOINT, {"frequency": "1d"}, _payload(1, 3)),
+        (2, ENDPOINT, {"frequency": "1d"}, {"storage": "pages", "page_ids": [7]}),
+        (3, ENDPOINT, None, None),
+    ]
+    conn = FakeConn(handler=lambda sql, params: list(records))
+    monkeypatch.setattr(transform, "get_conn", lambda: conn)
+    monkeypatch.setattr(transform, "load_manifest_payload", lambda c, manifest: _payload(10, 3, asset="eth"))
+    monkeypatch.setenv("ETL_TRANSFORM_FETCH_PAYLOADS", "2")
+    return conn
+
+
+def test_batches_span_raw_responses_and_resolve_manifests(fake_conn):
+    batches = list(transform.transform_iter(batch_size=4))
+
+    assert [len(b) for b in batches] == [4, 2]
+    assert [r["asset"] for b in batches for r in b] == ["btc"] * 3 + ["eth"] * 3
+    cur, = fake_conn.cursors
+    (sql, _), = fake_conn.executed
+    # Named cursor => server-side; only a few payloads per round-trip
+    assert cur.name == "transform_iter" and cur.itersize == 2
+    assert "ORDER BY id" in sql and "LIMIT" not in sql
+    assert fake_conn.closed
+
+
+def test_raw_ids_and_limit_select_the_requested_rows(fake_conn):
+    list(transform.transform_iter(batch_size=10, raw_ids=[3, 1]))
+    list(transform.transform_iter(batch_size=10, limit=5))
+
+    (by_ids, ids_args), (newest, newest_args) = fake_conn.executed
+    assert "id = ANY(%s)" in by_ids and ids_args == ([3, 1],)
+    assert newest.endswith("ORDER BY id DESC LIMIT %s) ORDER BY id") and newest_args[-1] == 5
+
+
+def test_stopping_early_reads_no_further_payloads(fake_conn):
+    it = transform.transform_iter(batch_size=2)
+    first = next(it)
+    it.close()
+
+    assert len(first) == 2
+    assert fake_conn.fetched == 1 and fake_conn.closed
+
+
+def test_runner_streams_batches_into_the_loader_by_default(monkeypatch, capsys):
+    import src.db.engine as engine
+    import src.etl.load as load
+
+    conn = FakeConn()
+    loaded = []
+    monkeypatch.setenv("ETL_TRANSFORM_ENGINE", "python")
+    monkeypatch.setattr(engine, "get_conn", lambda: conn)
+    monkeypatch.setattr(transform, "transform_latest_raw", lambda limit=50: pytest.fail("whole response must not be materialized"))
+    monkeypatch.setattr(transform, "transform_latest_iter", lambda batch_size=None: iter([[{"asset": "btc"}] * 3, [{"asset": "eth"}] * 2]))
+
+    def fake_load(batch, conn=None, **kw):
+        loaded.append((len(batch), conn))
+        return {"attempted": len(batch), "inserted": len(batch), "updated": 0}
+
+    monkeypatch.setattr(load, "load_metrics", fake_load)
+
+    assert load_script("10_etl_run.py").main(["--stage", "load"]) == 0
+    # Each batch is loaded over one connection before the next is parsed
+    assert loaded == [(3, conn), (2, conn)]
+    assert conn.closed and capsys.readouterr().out.splitlines()[-1] == "5"